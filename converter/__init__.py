@@ -0,0 +1,44 @@
+"""Conversion engine for Modern File Converter.
+
+Importable without tkinter, Pillow or pandas; those are loaded only when a
+conversion that needs them runs.
+"""
+
+from .admission import AdmissionController
+from .cache import ConversionCache
+from .engine import (
+    CATEGORIES,
+    FORMATS,
+    INPUT_EXTENSIONS,
+    category_for_format,
+    category_for_input,
+    convert,
+    is_multi_output,
+    output_path_for,
+    run_conversion_job,
+)
+from .executor import ConversionExecutor, default_worker_count
+from .journal import JobJournal
+from .sync import DirectorySync
+from .workqueue import JobQueue, QueueRunner, QueueWorker
+
+__all__ = [
+    "AdmissionController",
+    "CATEGORIES",
+    "FORMATS",
+    "INPUT_EXTENSIONS",
+    "ConversionCache",
+    "ConversionExecutor",
+    "DirectorySync",
+    "JobJournal",
+    "JobQueue",
+    "QueueRunner",
+    "QueueWorker",
+    "category_for_format",
+    "category_for_input",
+    "convert",
+    "default_worker_count",
+    "is_multi_output",
+    "output_path_for",
+    "run_conversion_job",
+]
@@ -0,0 +1,282 @@
+import os
+import threading
+
+from .excel import EXCEL_INPUTS
+from .ffmpeg import cpu_count, probe_media
+from .largeimage import large_image_memory, large_image_size
+from .streaming import stream_chunk_size
+
+MB = 1024 * 1024
+
+# Share of the detected memory limit that conversions may use; the rest is
+# left for the interpreter, the GUI and the page cache
+DEFAULT_MEMORY_FRACTION = 0.75
+
+# Memory a job needs beyond its data: interpreter, codec and library state
+JOB_OVERHEAD = 32 * MB
+MEDIA_OVERHEAD = 96 * MB
+
+# Rough in-memory size of a DataFrame relative to the bytes on disk
+DOCUMENT_EXPANSION = {
+    '.csv': 6,
+    '.txt': 6,
+    '.json': 8,
+    '.jsonl': 8,
+    '.xlsx': 12,
+    '.xls': 12,
+    '.parquet': 8,
+    '.feather': 4,
+    '.arrow': 4,
+}
+
+# Bytes read to estimate the row size of text inputs
+ROW_SAMPLE_BYTES = 64 * 1024
+
+# Decoded frames an FFmpeg video job holds: decoder and encoder queues plus
+# a few per encoder thread
+VIDEO_FRAMES_IN_FLIGHT = 16
+VIDEO_FRAMES_PER_THREAD = 2
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def memory_limit():
+    # The tightest of the container's cgroup limit and the memory currently
+    # available, in bytes, or None when neither can be read
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = _read_int(path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit and limit < 1 << 60:
+            usage = _read_int('/sys/fs/cgroup/memory.current') or _read_int(
+                '/sys/fs/cgroup/memory/memory.usage_in_bytes') or 0
+            limits.append(max(0, limit - usage))
+            break
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    limits.append(int(line.split()[1]) * 1024)
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return min(limits) if limits else None
+
+
+def cpu_limit():
+    # CPUs available to this process, honouring a cgroup v2 CPU quota
+    cpus = cpu_count()
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0)) or cpus
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def default_memory_budget():
+    limit = memory_limit()
+    if limit is None:
+        return None
+    return int(limit * DEFAULT_MEMORY_FRACTION)
+
+
+class JobCost:
+    # Estimated peak memory in bytes, CPU threads, and a measure of the work
+    # involved used to start the largest jobs first. Work is only compared
+    # within one category, so its units vary (pixels, bytes, pixel-seconds).
+    def __init__(self, memory, cpu=1, work=0):
+        self.memory = int(memory)
+        self.cpu = cpu
+        self.work = work
+
+    def __repr__(self):
+        return f"JobCost(memory={self.memory / MB:.0f}MB, cpu={self.cpu}, work={self.work})"
+
+
+def _image_cost(input_file, options):
+    # Only the header is read; Image.open does not decode pixel data
+    from PIL import Image
+
+    large = large_image_size(input_file)
+    if large is not None:
+        # Converted a band at a time, one output after another
+        if options.get('renditions'):
+            outputs = [(rendition['format'], rendition.get('dimensions')) for rendition in options['renditions']]
+        else:
+            outputs = [(options.get('format'), options.get('dimensions') if options.get('resize') else None)]
+        memory = max(large_image_memory(format, (int(size[0]), int(size[1])) if size else large)
+                     for format, size in outputs)
+        return JobCost(JOB_OVERHEAD + memory, 1, large[0] * large[1])
+
+    try:
+        with Image.open(input_file) as img:
+            width, height = img.size
+            bands = len(img.getbands())
+            depth = 4 if img.mode in ('I', 'F', 'I;16', 'I;16B', 'I;16L') else 1
+            is_jpeg = img.format == 'JPEG'
+    except Exception:
+        size = os.path.getsize(input_file)
+        return JobCost(JOB_OVERHEAD + size * 10, 1, size)
+
+    pixel_bytes = bands * depth
+    targets = []
+    if options.get('renditions'):
+        targets = [rendition.get('dimensions') for rendition in options['renditions']]
+    elif options.get('resize') and options.get('dimensions'):
+        targets = [options['dimensions']]
+    targets = [(int(t[0]), int(t[1])) for t in targets if t]
+
+    decoded = width * height
+    every_output_resized = targets and len(targets) == len(options.get('renditions') or targets)
+    if is_jpeg and options.get('fast_resize') and every_output_resized:
+        # draft() decodes at up to 1/8 scale when every output is smaller
+        largest = max(targets, key=lambda t: t[0] * t[1])
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= largest[0] and height // (scale * 2) >= largest[1]:
+            scale *= 2
+        decoded //= scale * scale
+
+    # The decoded image, a converted copy (e.g. RGBA to RGB for JPEG) and
+    # each resized output can be alive at once
+    memory = decoded * pixel_bytes * 2 + sum(w * h * pixel_bytes for w, h in targets)
+    return JobCost(JOB_OVERHEAD + memory, 1, width * height)
+
+
+def _sample_row_bytes(input_file):
+    try:
+        with open(input_file, 'rb') as f:
+            sample = f.read(ROW_SAMPLE_BYTES)
+    except OSError:
+        return None
+    rows = sample.count(b'\n')
+    return len(sample) / rows if rows else None
+
+
+def _document_cost(input_file, options):
+    size = os.path.getsize(input_file)
+    ext = os.path.splitext(input_file)[1].lower()
+    memory = size * DOCUMENT_EXPANSION.get(ext, 6)
+
+    chunk_size = stream_chunk_size(input_file, options.get('format'), options.get('chunk_size'))
+    if chunk_size:
+        if ext in EXCEL_INPUTS or ext in ('.parquet', '.feather', '.arrow'):
+            # Rows are read lazily; the chunk is a fraction of an unknown
+            # row count, so assume modest rows
+            memory = min(memory, int(chunk_size) * 512 * 4)
+        else:
+            row_bytes = _sample_row_bytes(input_file)
+            if row_bytes:
+                memory = min(memory, int(chunk_size * row_bytes * DOCUMENT_EXPANSION.get(ext, 6)))
+            elif ext == '.json':
+                # A JSON array on one line has no rows to sample
+                memory = min(memory, int(chunk_size) * 512 * 4)
+    return JobCost(JOB_OVERHEAD + memory, 1, size)
+
+
+def _media_cost(category, input_file, options):
+    threads = options.get('threads') or 1
+    size = os.path.getsize(input_file)
+    info = probe_media(input_file)
+    if info is None:
+        memory = MEDIA_OVERHEAD + (128 * MB if category == "Video" else 0)
+        return JobCost(memory, threads, size)
+
+    try:
+        duration = float(info.get('format', {}).get('duration') or 0)
+    except ValueError:
+        duration = 0
+    pixels = 0
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == 'video':
+            pixels = max(pixels, int(stream.get('width') or 0) * int(stream.get('height') or 0))
+
+    memory = MEDIA_OVERHEAD
+    if category == "Video" and pixels:
+        # YUV 4:2:0 frames are 1.5 bytes per pixel
+        frames = VIDEO_FRAMES_IN_FLIGHT + VIDEO_FRAMES_PER_THREAD * threads
+        memory += int(pixels * 1.5 * frames)
+    work = duration * max(pixels, 1) if duration else size
+    return JobCost(memory, threads, work)
+
+
+def estimate_cost(category, input_file, options):
+    if category == "Images":
+        return _image_cost(input_file, options)
+    if category == "Documents":
+        return _document_cost(input_file, options)
+    if category in ["Audio", "Video"]:
+        return _media_cost(category, input_file, options)
+    raise ValueError(f"Unsupported category: {category}")
+
+
+class AdmissionController:
+    # Admits jobs while their estimated memory and CPU fit the budgets.
+    # A job larger than the whole budget still runs, but alone, so nothing
+    # waits forever. None for a budget means no limit on that resource.
+    def __init__(self, memory_budget=None, cpu_budget=None):
+        self.memory_budget = memory_budget
+        self.cpu_budget = cpu_budget
+        self.memory_used = 0
+        self.cpu_used = 0
+        self.running = 0
+        self.peak_memory = 0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_environment(cls, memory_budget=None, cpu_budget=None):
+        # Fills in budgets from the container or machine limits
+        if memory_budget is None:
+            memory_budget = default_memory_budget()
+        if cpu_budget is None:
+            cpu_budget = cpu_limit()
+        return cls(memory_budget, cpu_budget)
+
+    def fits(self, cost):
+        if self.running == 0:
+            return True
+        if self.memory_budget is not None and self.memory_used + cost.memory > self.memory_budget:
+            return False
+        if self.cpu_budget is not None and self.cpu_used + cost.cpu > self.cpu_budget:
+            return False
+        return True
+
+    def acquire(self, cost):
+        with self._condition:
+            self._condition.wait_for(lambda: self.fits(cost))
+            self.memory_used += cost.memory
+            self.cpu_used += cost.cpu
+            self.running += 1
+            self.peak_memory = max(self.peak_memory, self.memory_used)
+
+    def release(self, cost):
+        with self._condition:
+            self.memory_used -= cost.memory
+            self.cpu_used -= cost.cpu
+            self.running -= 1
+            self._condition.notify_all()
+
+    def order(self, category, jobs, options):
+        # Returns [(job, cost)] with the largest jobs first, so the long
+        # ones start early and the batch does not end on a single straggler
+        costed = []
+        for job in jobs:
+            try:
+                cost = estimate_cost(category, job[0], options)
+            except (OSError, ValueError):
+                # The job itself will report the problem
+                cost = JobCost(JOB_OVERHEAD)
+            costed.append((job, cost))
+        costed.sort(key=lambda item: item[1].work, reverse=True)
+        return costed
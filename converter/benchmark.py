@@ -0,0 +1,365 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .engine import run_conversion_job
+from .executor import ConversionExecutor
+from .ffmpeg import FFMPEG
+from .metrics import peak_rss_mb, run_instrumented
+
+RESULTS_VERSION = 1
+
+# Fixture sizes per suite
+SUITES = {
+    "quick": {
+        'image_sizes': [(640, 480), (1920, 1080)],
+        'rows': [1000, 20000],
+        'xlsx_rows': [1000],
+        'media_seconds': [5],
+        'video_size': (640, 360),
+    },
+    "full": {
+        'image_sizes': [(640, 480), (1920, 1080), (4000, 3000), (6000, 4000)],
+        'rows': [10000, 200000, 1000000],
+        'xlsx_rows': [10000, 100000],
+        'media_seconds': [30, 120],
+        'video_size': (1280, 720),
+    },
+}
+
+CATEGORY_NAMES = {"images": "Images", "documents": "Documents", "audio": "Audio", "video": "Video"}
+
+
+def ffmpeg_available():
+    return shutil.which(FFMPEG) is not None
+
+
+def generate_images(directory, sizes):
+    from PIL import Image
+
+    fixtures = {'png': [], 'jpg': [], 'rgba': []}
+    for width, height in sizes:
+        # A Mandelbrot set over colour gradients compresses like a photo
+        # rather than like flat colour or pure noise, and is deterministic
+        detail = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 0.8, 1.2), 64)
+        horizontal = Image.linear_gradient('L').resize((width, height))
+        vertical = Image.linear_gradient('L').rotate(90).resize((width, height))
+        rgb = Image.merge('RGB', (detail, horizontal, vertical))
+
+        name = f"image_{width}x{height}"
+        png = os.path.join(directory, f"{name}.png")
+        jpg = os.path.join(directory, f"{name}.jpg")
+        rgba = os.path.join(directory, f"{name}_rgba.png")
+        rgb.save(png)
+        rgb.save(jpg, quality=92)
+        rgb.convert('RGBA').save(rgba)
+        fixtures['png'].append(png)
+        fixtures['jpg'].append(jpg)
+        fixtures['rgba'].append(rgba)
+    return fixtures
+
+
+def write_rows_csv(path, rows):
+    categories = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "category", "value", "ratio", "created"])
+        for i in range(rows):
+            writer.writerow([
+                i,
+                f"item-{i:08d}",
+                categories[i % len(categories)],
+                (i * 7919) % 100000,
+                round((i % 997) / 997, 6),
+                f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+            ])
+
+
+def generate_documents(directory, row_counts, xlsx_row_counts):
+    import pandas as pd
+
+    fixtures = {'csv': [], 'json': [], 'xlsx': []}
+    for rows in row_counts:
+        path = os.path.join(directory, f"table_{rows}.csv")
+        write_rows_csv(path, rows)
+        fixtures['csv'].append(path)
+
+        json_path = os.path.join(directory, f"table_{rows}.json")
+        pd.read_csv(path).to_json(json_path, orient='records')
+        fixtures['json'].append(json_path)
+    for rows in xlsx_row_counts:
+        path = os.path.join(directory, f"table_{rows}.csv")
+        if not os.path.exists(path):
+            write_rows_csv(path, rows)
+        xlsx_path = os.path.join(directory, f"table_{rows}.xlsx")
+        pd.read_csv(path).to_excel(xlsx_path, index=False)
+        fixtures['xlsx'].append(xlsx_path)
+    return fixtures
+
+
+def generate_media(directory, durations, video_size):
+    fixtures = {'wav': [], 'video': []}
+    for seconds in durations:
+        wav = os.path.join(directory, f"tone_{seconds}s.wav")
+        subprocess.run(
+            [FFMPEG, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error',
+             '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+             '-ac', '2', wav],
+            check=True
+        )
+        fixtures['wav'].append(wav)
+
+        video = os.path.join(directory, f"pattern_{seconds}s.mkv")
+        subprocess.run(
+            [FFMPEG, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error',
+             '-f', 'lavfi', '-i', f"testsrc2=size={video_size[0]}x{video_size[1]}:rate=30",
+             '-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}",
+             '-t', str(seconds), '-shortest', video],
+            check=True
+        )
+        fixtures['video'].append(video)
+    return fixtures
+
+
+def build_cases(fixtures):
+    # (name, category, inputs, options)
+    cases = []
+    images = fixtures.get('images')
+    if images:
+        cases += [
+            ("image-png-to-jpg", "Images", images['png'], {'format': 'jpg', 'quality': 85}),
+            ("image-rgba-to-webp", "Images", images['rgba'], {'format': 'webp', 'quality': 80}),
+            ("image-jpg-to-png", "Images", images['jpg'], {'format': 'png'}),
+            ("image-thumbnail", "Images", images['jpg'],
+             {'format': 'jpg', 'quality': 85, 'resize': True, 'dimensions': (320, 240)}),
+            ("image-thumbnail-fast", "Images", images['jpg'],
+             {'format': 'jpg', 'quality': 85, 'resize': True, 'dimensions': (320, 240),
+              'fast_resize': True, 'resample': 'auto'}),
+        ]
+    documents = fixtures.get('documents')
+    if documents:
+        cases += [
+            ("csv-to-json", "Documents", documents['csv'], {'format': 'json', 'headers': True}),
+            ("csv-to-jsonl-streamed", "Documents", documents['csv'],
+             {'format': 'jsonl', 'headers': True, 'chunk_size': 50000}),
+            ("csv-to-xlsx", "Documents", documents['csv'][:1], {'format': 'xlsx', 'headers': True}),
+            ("json-to-csv", "Documents", documents['json'], {'format': 'csv', 'headers': True}),
+            ("xlsx-to-csv", "Documents", documents['xlsx'], {'format': 'csv', 'headers': True}),
+        ]
+    media = fixtures.get('media')
+    if media:
+        cases += [
+            ("wav-to-mp3", "Audio", media['wav'], {'format': 'mp3', 'bitrate': '192k'}),
+            ("wav-to-flac", "Audio", media['wav'], {'format': 'flac'}),
+            ("video-to-mp4", "Video", media['video'], {'format': 'mp4', 'bitrate': '2M'}),
+        ]
+    return cases
+
+
+def peak_child_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(category, inputs, options, output_dir, repeats, workers):
+    # Runs in its own process so peak RSS belongs to this case alone
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        (path, os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}.{options['format']}"))
+        for path in inputs
+    ]
+    bytes_in = sum(os.path.getsize(path) for path in inputs)
+
+    # One untimed pass warms imports and the page cache
+    for input_file, output_file in jobs:
+        run_conversion_job(category, input_file, output_file, options)
+
+    stages = {}
+    latencies = []
+    wall_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        if workers > 1:
+            executor = ConversionExecutor(max_workers=workers)
+            for _, _, error in executor.run(category, jobs, options):
+                if error is not None:
+                    raise error
+        else:
+            for input_file, output_file in jobs:
+                _, record, error = run_instrumented(
+                    run_conversion_job, (category, input_file, output_file, options), category, input_file
+                )
+                if error is not None:
+                    raise error
+                latencies.append(record['duration'])
+                for stage, seconds in record['stages'].items():
+                    stages.setdefault(stage, []).append(seconds)
+        wall_times.append(time.perf_counter() - start)
+
+    seconds = sorted(wall_times)[len(wall_times) // 2]
+    bytes_out = sum(os.path.getsize(output) for _, output in jobs if os.path.exists(output))
+
+    return {
+        'category': category,
+        'files': len(jobs),
+        'repeats': repeats,
+        'workers': workers,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'seconds': seconds,
+        'files_per_sec': len(jobs) / seconds if seconds else None,
+        'mb_per_sec': bytes_in / seconds / (1024 * 1024) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_child_rss_mb': peak_child_rss_mb(),
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_max': max(latencies) if latencies else None,
+        # Mean seconds per file spent in each stage
+        'stages': {stage: sum(times) / len(times) for stage, times in stages.items() if times},
+    }
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    for module in ('PIL', 'pandas', 'numpy', 'openpyxl'):
+        try:
+            info[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            pass
+    if ffmpeg_available():
+        result = subprocess.run([FFMPEG, '-version'], capture_output=True, text=True)
+        info['ffmpeg'] = result.stdout.split('\n', 1)[0]
+    return info
+
+
+def compare(results, baseline, threshold):
+    # Returns the names of cases whose throughput fell by more than
+    # threshold (a fraction) against the baseline
+    regressions = []
+    print(f"{'case':<26} {'baseline f/s':>12} {'current f/s':>12} {'change':>8}", file=sys.stderr)
+    for name, case in results['cases'].items():
+        old = baseline.get('cases', {}).get(name)
+        if not old or not old.get('files_per_sec') or not case.get('files_per_sec'):
+            print(f"{name:<26} {'-':>12} {case.get('files_per_sec') or 0:>12.2f} {'new':>8}", file=sys.stderr)
+            continue
+        change = case['files_per_sec'] / old['files_per_sec'] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<26} {old['files_per_sec']:>12.2f} {case['files_per_sec']:>12.2f} {change:>+8.1%}{flag}",
+              file=sys.stderr)
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m converter.benchmark",
+        description="Measure conversion throughput on generated fixtures and compare against a baseline."
+    )
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick", help="Fixture sizes (default: quick)")
+    parser.add_argument("--only", default="images,documents,audio,video",
+                        help="Comma-separated categories to run (default: all)")
+    parser.add_argument("--case", action="append", dest="cases", metavar="NAME", help="Run only the named case(s)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes per case; the median is kept (default: 3)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Run each case through a worker pool of this size; per-file latency and stage "
+                             "timings are only recorded with 1 (default: 1)")
+    parser.add_argument("--fixtures-dir", help="Where to generate fixtures (default: a temporary directory)")
+    parser.add_argument("-o", "--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Fail when files/sec drops by more than this fraction (default: 0.10)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    selected = {name.strip().lower() for name in args.only.split(',') if name.strip()}
+
+    work_dir = args.fixtures_dir or tempfile.mkdtemp(prefix="converter-bench-")
+    fixtures_dir = os.path.join(work_dir, "fixtures")
+    os.makedirs(fixtures_dir, exist_ok=True)
+    suite = SUITES[args.suite]
+
+    print(f"Generating {args.suite} fixtures in {fixtures_dir}", file=sys.stderr)
+    fixtures = {}
+    if "images" in selected:
+        fixtures['images'] = generate_images(fixtures_dir, suite['image_sizes'])
+    if "documents" in selected:
+        fixtures['documents'] = generate_documents(fixtures_dir, suite['rows'], suite['xlsx_rows'])
+    if selected & {"audio", "video"}:
+        if ffmpeg_available():
+            fixtures['media'] = generate_media(fixtures_dir, suite['media_seconds'], suite['video_size'])
+        else:
+            print("FFmpeg not found; skipping audio and video cases", file=sys.stderr)
+
+    cases = [
+        case for case in build_cases(fixtures)
+        if case[1] in {CATEGORY_NAMES[name] for name in selected if name in CATEGORY_NAMES}
+        and (not args.cases or case[0] in args.cases)
+    ]
+
+    results = {'version': RESULTS_VERSION, 'suite': args.suite, 'environment': environment(), 'cases': {}}
+    context = multiprocessing.get_context("spawn")
+    for name, category, inputs, options in cases:
+        output_dir = os.path.join(work_dir, "output", name)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            case = pool.submit(run_case, category, inputs, options, output_dir,
+                               max(1, args.repeats), max(1, args.workers)).result()
+        results['cases'][name] = case
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in case['stages'].items())
+        print(f"{name:<26} {case['files_per_sec']:>8.2f} files/s {case['mb_per_sec']:>8.2f} MB/s "
+              f"peak {case['peak_rss_mb'] or 0:>7.1f} MB  {stages}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if not args.fixtures_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Throughput regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "modern-file-converter")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Bump when a change to the conversion code would make cached outputs stale
+CACHE_VERSION = 1
+
+# Options that affect the bytes written for each category. Anything else
+# (worker counts, output paths) is left out of the cache key.
+CACHE_KEY_OPTIONS = {
+    "Images": ['format', 'quality', 'resize', 'dimensions', 'fast_resize', 'resample', 'fast_path'],
+    "Documents": ['format', 'encoding', 'headers', 'chunk_size', 'csv_engine', 'sheet', 'excel_engine',
+                  'schema_cache', 'flatten_json'],
+    "Audio": ['format', 'codec', 'bitrate', 'fast_path'],
+    "Video": ['format', 'codec', 'bitrate', 'fast_path'],
+}
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Linux ioctl that makes a file share another's blocks copy-on-write
+FICLONE = 0x40049409
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clone_file(source, target):
+    # Copies source to target, as a copy-on-write reflink where the
+    # filesystem supports them (Btrfs, XFS), which shares the blocks until
+    # either file changes, and byte for byte otherwise
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    if fcntl is not None and sys.platform.startswith('linux'):
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(source, target)
+
+
+def normalize_options(category, options):
+    normalized = {'category': category, 'version': CACHE_VERSION}
+    for name in CACHE_KEY_OPTIONS.get(category, sorted(options)):
+        value = options.get(name)
+        if isinstance(value, tuple):
+            value = list(value)
+        if name == 'format' and value:
+            value = value.lower()
+        if name == 'codec' and value == "default":
+            value = None
+        if (name, value) in [('csv_engine', "pandas"), ('excel_engine', "auto")]:
+            value = None
+        if name == 'fast_path' and value is not False:
+            value = None
+        if name in ['schema_cache', 'flatten_json'] and not value:
+            value = None
+        normalized[name] = value
+    if 'resize' in normalized and not normalized['resize']:
+        # Resize settings are ignored when resizing is off
+        normalized['resize'] = False
+        for name in ('dimensions', 'fast_resize', 'resample'):
+            normalized.pop(name, None)
+    return normalized
+
+
+class ConversionCache:
+    # Content-addressed store of conversion outputs. Entries are keyed by
+    # the SHA-256 of the input bytes plus the normalized options and are
+    # evicted least-recently-used once the store exceeds max_bytes.
+    #
+    # Only paths are held on the instance so it can be pickled into worker
+    # processes; every operation opens its own SQLite connection.
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None else DEFAULT_MAX_BYTES)
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.index_path = os.path.join(self.cache_dir, "index.sqlite")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def _object_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def _count(self, db, name):
+        db.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+
+    def key_for(self, category, input_file, options):
+        payload = json.dumps(normalize_options(category, options), sort_keys=True, default=str)
+        digest = hashlib.sha256()
+        digest.update(hash_file(input_file).encode('ascii'))
+        digest.update(b'\0')
+        digest.update(payload.encode('utf-8'))
+        return digest.hexdigest()
+
+    def fetch(self, key, output_file):
+        # Materialize a cached output at output_file. Returns True on a hit.
+        object_path = self._object_path(key)
+        with self._connect() as db:
+            row = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(object_path):
+                if row is not None:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count(db, 'misses')
+                return False
+            db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count(db, 'hits')
+        
+        # Write under a temporary name first so a concurrent reader never
+        # sees a half-copied output. A copy, not a link: an edit to the
+        # delivered output must not reach the cached object.
+        temp_file = f"{output_file}.{uuid.uuid4().hex}.tmp"
+        try:
+            clone_file(object_path, temp_file)
+            os.replace(temp_file, output_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        return True
+
+    def store(self, key, output_file):
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        
+        # Copy rather than link so later edits to the output cannot
+        # corrupt the cached object
+        temp_file = f"{object_path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(output_file, temp_file)
+        os.replace(temp_file, object_path)
+        
+        size = os.path.getsize(object_path)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, size, now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        with self._connect() as db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._object_path(key))
+                except FileNotFoundError:
+                    pass
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM entries")
+            db.execute("UPDATE counters SET value = 0")
+        shutil.rmtree(self.objects_dir, ignore_errors=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def stats(self):
+        with self._connect() as db:
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,555 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+from .admission import MB, AdmissionController
+from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ConversionCache
+from .columnar import CSV_ENGINES
+from .excel import ALL_SHEETS, EXCEL_ENGINES
+from .engine import CATEGORIES, FORMATS, category_for_format, is_multi_output, output_path_for
+from .ffmpeg import FFmpegScheduler
+from .images import RESAMPLE_FILTERS, parse_rendition
+from .journal import DEFAULT_JOURNAL_PATH, JobJournal
+from .media import parse_variant
+from .metrics import MetricsCollector
+from .pipeline import DEFAULT_READERS, DEFAULT_WRITERS, ConversionPipeline
+from .progress import BatchProgress, format_progress
+from .service import DEFAULT_HOST, DEFAULT_MAX_UPLOAD, DEFAULT_PORT, DEFAULT_RESULT_TTL, parse_address, serve
+from .sync import DEFAULT_SETTLE_SECONDS, DirectorySync
+from .workqueue import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, JobQueue, QueueRunner, QueueWorker
+from .executor import ConversionExecutor, default_worker_count
+
+
+def expand_inputs(patterns):
+    # Globs are expanded here because cron and batch schedulers often run
+    # without a shell to do it for us
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.expanduser(pattern), recursive=True))
+        if not matches and os.path.exists(pattern):
+            matches = [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+def parse_dimensions(value):
+    try:
+        width, height = value.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid dimensions '{value}', expected WIDTHxHEIGHT")
+
+
+def parse_budget(value):
+    if value == "auto":
+        return value
+    try:
+        megabytes = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid memory budget '{value}', expected megabytes or 'auto'")
+    if megabytes < 1:
+        raise argparse.ArgumentTypeError("The memory budget must be at least 1 MB")
+    return megabytes
+
+
+def parse_address_arg(value):
+    try:
+        return parse_address(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_limit(value):
+    category, _, limit = value.partition('=')
+    if category not in CATEGORIES or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(f"Invalid limit '{value}', expected CATEGORY=N with a category of "
+                                         f"{', '.join(CATEGORIES)}")
+    return category, int(limit)
+
+
+def parse_rendition_arg(value):
+    try:
+        return parse_rendition(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_variant_arg(value):
+    try:
+        return parse_variant(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    all_formats = sorted({fmt for formats in FORMATS.values() for fmt in formats})
+    
+    parser = argparse.ArgumentParser(
+        prog="python -m converter",
+        description="Convert files between formats without the desktop interface."
+    )
+    parser.add_argument("inputs", nargs="*",
+                        help="Input files or glob patterns (quote them to use ** recursion); with --sync, one directory")
+    parser.add_argument("-f", "--format", choices=all_formats, help="Target format (required unless --rendition is used)")
+    parser.add_argument("-o", "--output-dir", default=".", help="Directory to write converted files to")
+    parser.add_argument("--category", choices=CATEGORIES, help="Override the category inferred from the format")
+    parser.add_argument("-j", "--workers", type=int,
+                        help=f"Number of parallel workers (default: {default_worker_count()} for images and "
+                             "documents; audio and video use --audio-workers/--video-workers)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only report errors")
+    parser.add_argument("--progress", type=float, nargs="?", const=5.0, metavar="SECONDS",
+                        help="Report overall progress, throughput and ETA every SECONDS (default: 5)")
+    
+    admission = parser.add_argument_group("resource options")
+    admission.add_argument("--memory-budget", type=parse_budget, metavar="MB",
+                           help="Start jobs, largest first, only while their estimated memory fits in MB; "
+                                "'auto' uses 75%% of the container or machine's available memory")
+    admission.add_argument("--cpu-budget", type=int, metavar="THREADS",
+                           help="Start jobs only while their threads fit in THREADS (default with "
+                                "--memory-budget: the CPUs available to this process)")
+    
+    journal = parser.add_argument_group("journal options")
+    journal.add_argument("--journal", nargs="?", const=DEFAULT_JOURNAL_PATH, metavar="PATH",
+                         help=f"Record each file's state so an interrupted batch can be resumed "
+                              f"(default path: {DEFAULT_JOURNAL_PATH})")
+    journal.add_argument("--resume", nargs="?", const="latest", metavar="BATCH",
+                         help="Finish an interrupted batch from the journal, by id or the latest one; "
+                              "its inputs and conversion options are taken from the journal")
+    journal.add_argument("--retry-failed", action="store_true", help="With --resume, also rerun files that failed")
+    journal.add_argument("--list-batches", action="store_true", help="List unfinished batches in the journal and exit")
+    
+    sync = parser.add_argument_group("sync options")
+    sync.add_argument("--sync", action="store_true",
+                      help="Mirror the input directory tree into --output-dir, converting only new or changed files")
+    sync.add_argument("--watch", type=float, nargs="?", const=2.0, metavar="SECONDS",
+                      help="Keep running after the first pass and convert files as they change; uses watchdog "
+                           "when installed and otherwise rescans every SECONDS (default: 2)")
+    sync.add_argument("--prune", action="store_true", help="Delete outputs whose source file has been removed")
+    sync.add_argument("--manifest", metavar="PATH",
+                      help="Where the record of converted files is kept (default: inside --output-dir)")
+    sync.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS, metavar="SECONDS",
+                      help="Skip files modified within the last SECONDS, as they may still be being written "
+                           "(default: %(default)s)")
+    
+    service = parser.add_argument_group("service options")
+    service.add_argument("--serve", dest="serve", action="append", type=parse_address_arg, metavar="ADDRESS",
+                         help=f"Run as a conversion service instead of converting INPUTS; ADDRESS is HOST:PORT "
+                              f"(default {DEFAULT_HOST}:{DEFAULT_PORT} when given as ':PORT') or unix:PATH; repeat to "
+                              f"listen on several")
+    service.add_argument("--service-dir", metavar="PATH",
+                         help="Where uploads and results are kept (default: a temporary directory removed on exit)")
+    service.add_argument("--category-limit", dest="category_limits", action="append", type=parse_limit,
+                         metavar="CATEGORY=N", help="Run at most N jobs of CATEGORY at once (default: the workers "
+                                                    "for that category)")
+    service.add_argument("--max-upload", type=int, metavar="MB", default=DEFAULT_MAX_UPLOAD // MB,
+                         help="Largest accepted upload (default: %(default)s)")
+    service.add_argument("--result-ttl", type=float, metavar="SECONDS", default=DEFAULT_RESULT_TTL,
+                         help="How long finished jobs and their files are kept (default: %(default)s)")
+    
+    queue = parser.add_argument_group("queue options")
+    queue.add_argument("--queue", metavar="PATH",
+                       help="Submit the batch to the shared job queue at PATH (a SQLite file on storage every host "
+                            "can reach) and wait while --worker processes convert it")
+    queue.add_argument("--worker", action="store_true",
+                       help="Convert jobs from --queue until interrupted instead of converting INPUTS; run any "
+                            "number, on this host or others")
+    queue.add_argument("--worker-category", dest="worker_categories", action="append", choices=CATEGORIES,
+                       help="Only take jobs of this category; repeat for several (default: all)")
+    queue.add_argument("--exit-when-idle", action="store_true",
+                       help="Stop the worker once the queue has no jobs left for it")
+    queue.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, metavar="SECONDS",
+                       help="Requeue a job whose worker has not checked in for SECONDS (default: %(default)s)")
+    queue.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, metavar="N",
+                       help="Fail a job after N workers have died or stalled on it (default: %(default)s)")
+    queue.add_argument("--queue-status", action="store_true", help="List the batches in --queue and exit")
+    
+    pipeline = parser.add_argument_group("pipeline options")
+    pipeline.add_argument("--pipeline", action="store_true",
+                          help="Prefetch inputs and write outputs on background threads, overlapping I/O with conversion")
+    pipeline.add_argument("--readers", type=int, default=DEFAULT_READERS,
+                          help="Input prefetch threads (default: %(default)s)")
+    pipeline.add_argument("--writers", type=int, default=DEFAULT_WRITERS,
+                          help="Output writer threads (default: %(default)s)")
+    pipeline.add_argument("--queue-size", type=int,
+                          help="Files buffered between stages (default: twice the worker count)")
+    pipeline.add_argument("--spool-dir", help="Local directory for prefetched inputs and pending outputs")
+    
+    metrics = parser.add_argument_group("metrics options")
+    metrics.add_argument("--metrics-jsonl", metavar="PATH",
+                         help="Append a JSON record per file (duration, bytes, stages, peak memory, error class)")
+    metrics.add_argument("--metrics-prom", metavar="PATH",
+                         help="Write Prometheus counters and histograms to PATH when the batch finishes")
+    metrics.add_argument("--profile-sample", type=float, default=0.0, metavar="RATE",
+                         help="Fraction of files to run under cProfile and tracemalloc (default: 0)")
+    metrics.add_argument("--profile-dir", default="profiles", help="Where sampled profiles are written (default: %(default)s)")
+    
+    cache = parser.add_argument_group("cache options")
+    cache.add_argument("--cache", action="store_true",
+                       help="Reuse earlier outputs for inputs and options that have not changed")
+    cache.add_argument("--cache-dir", help=f"Cache location (default: {DEFAULT_CACHE_DIR}); implies --cache")
+    cache.add_argument("--cache-max-size", type=int, metavar="MB", default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                       help="Evict least recently used outputs beyond this size (default: %(default)s)")
+    
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false",
+                        help="Always decode and re-encode, instead of remuxing media whose streams fit the target "
+                             "container and copying JPEGs that would be re-encoded as JPEG at no higher quality")
+    
+    images = parser.add_argument_group("image options")
+    images.add_argument("--quality", type=int, default=85, help="JPEG/WebP quality 1-100 (default: 85)")
+    images.add_argument("--resize", type=parse_dimensions, metavar="WxH", help="Resize images to WIDTHxHEIGHT")
+    images.add_argument("--fast-resize", action="store_true",
+                        help="Decode JPEGs at reduced size and shrink by integer factors before the final resample")
+    images.add_argument("--resample", choices=RESAMPLE_FILTERS, default="lanczos",
+                        help="Resampling filter; 'auto' picks one from the scale factor (default: lanczos)")
+    images.add_argument("--rendition", dest="renditions", action="append", type=parse_rendition_arg,
+                        metavar="FORMAT[:QUALITY][:WxH]",
+                        help="Write this rendition from a single decode; repeat for several outputs per image")
+    
+    documents = parser.add_argument_group("document options")
+    documents.add_argument("--encoding", default="utf-8", help="Text encoding (default: utf-8)")
+    documents.add_argument("--no-headers", dest="headers", action="store_false", help="Omit column headers")
+    documents.add_argument("--chunk-size", type=int, metavar="ROWS",
+                           help="Stream CSV/JSONL/TXT/XLSX/Parquet/Feather inputs in chunks of ROWS rows to bound memory use")
+    documents.add_argument("--csv-engine", choices=CSV_ENGINES, default="pandas",
+                           help="CSV parser; 'pyarrow' is multithreaded and converts CSV to Parquet/Feather "
+                                "without building a DataFrame (default: pandas)")
+    documents.add_argument("--sheet", metavar="NAME",
+                           help=f"Workbook sheet to convert, by name or index (default: the first); "
+                                f"'{ALL_SHEETS}' converts every sheet, one file per sheet unless the format is xlsx")
+    documents.add_argument("--excel-engine", choices=EXCEL_ENGINES, default="auto",
+                           help="Workbook reader; 'auto' uses calamine when python-calamine is installed, "
+                                "else openpyxl in read-only mode (default: auto)")
+    documents.add_argument("--schema-cache", action="store_true",
+                           help="Read CSVs with the text column types sampled from the first file with the same "
+                                "header, held as categoricals where values repeat; a column that held text there "
+                                "stays text in later files")
+    documents.add_argument("--flatten-json", action="store_true",
+                           help="Turn nested JSON objects into columns named like 'parent.child'")
+    
+    media = parser.add_argument_group("audio/video options")
+    media.add_argument("--codec", default="default", help="FFmpeg codec name (default: FFmpeg's choice)")
+    media.add_argument("--bitrate", help="Target bitrate, e.g. 192k or 2M")
+    media.add_argument("--variant", dest="variants", action="append", type=parse_variant_arg,
+                       metavar="FORMAT[:CODEC][:BITRATE]",
+                       help="Encode this variant in the same FFmpeg pass; repeat for several outputs per file")
+    media.add_argument("--audio-workers", type=int, help="Concurrent FFmpeg processes for audio (default: CPU count)")
+    media.add_argument("--video-workers", type=int, help="Concurrent FFmpeg processes for video (default: CPU count / 4)")
+    
+    return parser
+
+
+def build_runner(args, category):
+    # Returns (runner, executor, cache, scheduler, metrics) for the batch
+    if args.queue:
+        # Conversion happens on the queue's workers, with their own caches
+        # and pools
+        return QueueRunner(JobQueue(args.queue), max_attempts=args.max_attempts), None, None, None, None
+    
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_max_size * 1024 * 1024)
+    
+    scheduler = None
+    if category in ["Audio", "Video"]:
+        scheduler = FFmpegScheduler(
+            audio_workers=args.audio_workers or args.workers,
+            video_workers=args.video_workers or args.workers
+        )
+    
+    metrics = None
+    if args.metrics_jsonl or args.metrics_prom or args.profile_sample:
+        metrics = MetricsCollector(args.metrics_jsonl, args.profile_sample, args.profile_dir)
+    
+    admission = None
+    if args.memory_budget or args.cpu_budget:
+        memory_budget = None if args.memory_budget in (None, "auto") else args.memory_budget * MB
+        admission = AdmissionController.from_environment(memory_budget, args.cpu_budget)
+    
+    executor = ConversionExecutor(max_workers=args.workers, cache=cache, scheduler=scheduler, metrics=metrics,
+                                  admission=admission)
+    runner = executor
+    if args.pipeline:
+        runner = ConversionPipeline(
+            readers=args.readers,
+            writers=args.writers,
+            queue_size=args.queue_size,
+            spool_dir=args.spool_dir,
+            executor=executor
+        )
+    return runner, executor, cache, scheduler, metrics
+
+
+def close_runner(args, scheduler, metrics):
+    if scheduler is not None:
+        scheduler.shutdown()
+    if metrics is not None:
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+        metrics.close()
+
+
+def run_batch(args, category, jobs, options, journal=None, batch_id=None):
+    # With a journal, each file's result is recorded as it arrives so the
+    # batch can be resumed if this process dies
+    if journal is not None:
+        if batch_id is None:
+            batch_id = journal.create_batch(category, jobs, options)
+            if not args.quiet:
+                print(f"Batch {batch_id}: {len(jobs)} files")
+        journal.start(batch_id, jobs)
+    
+    runner, executor, cache, scheduler, metrics = build_runner(args, category)
+    total_files = len(jobs)
+    success_count = 0
+    completed = 0
+    progress = None
+    if args.progress:
+        def report(snapshot):
+            print(f"Progress: {format_progress(snapshot)}", file=sys.stderr, flush=True)
+        progress = BatchProgress([path for path, _ in jobs], on_update=report, update_interval=args.progress)
+    
+    try:
+        for input_file, output_file, error in runner.run(category, jobs, options, progress):
+            completed += 1
+            if journal is not None:
+                journal.finish_job(batch_id, input_file, error)
+            if error is None:
+                success_count += 1
+                if not args.quiet:
+                    print(f"[{completed}/{total_files}] {input_file} -> {output_file}")
+            else:
+                print(f"[{completed}/{total_files}] Error converting {input_file}: {error}", file=sys.stderr)
+        if journal is not None:
+            journal.finish_batch(batch_id)
+    except KeyboardInterrupt:
+        if isinstance(runner, QueueRunner) and runner.batch_id is not None:
+            print(f"Interrupted; batch {runner.batch_id} stays queued for the workers", file=sys.stderr)
+        if journal is not None:
+            print(f"Interrupted; resume with --resume {batch_id}", file=sys.stderr)
+        raise
+    finally:
+        close_runner(args, scheduler, metrics)
+        if journal is not None:
+            journal.close()
+    
+    if not args.quiet:
+        print(f"Conversion complete: {success_count}/{total_files} successful")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Cache: {executor.cache_hits} hits, {executor.cache_misses} misses this run; "
+                  f"{stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f} MB stored")
+    return 0 if success_count == total_files else 1
+
+
+def resume_batch(args, journal):
+    if args.resume == "latest":
+        batches = journal.unfinished_batches()
+        if not batches:
+            print("No unfinished batches in the journal.", file=sys.stderr)
+            return 2
+        batch_id = batches[0]['id']
+    else:
+        batch_id = args.resume
+    
+    batch = journal.batch(batch_id)
+    if batch is None:
+        print(f"No batch {batch_id} in the journal.", file=sys.stderr)
+        return 2
+    category, options = batch
+    jobs = journal.remaining_jobs(batch_id, args.retry_failed)
+    if not args.quiet:
+        counts = journal.counts(batch_id)
+        print(f"Resuming batch {batch_id}: {counts['done']} done, {len(jobs)} to convert")
+    if not jobs:
+        journal.finish_batch(batch_id)
+        return 0
+    for _, output_file in jobs:
+        os.makedirs(output_file if is_multi_output(options) else os.path.dirname(output_file) or ".",
+                    exist_ok=True)
+    return run_batch(args, category, jobs, options, journal, batch_id)
+
+
+def run_sync(args, category, options):
+    def report(input_file, output_file, error):
+        if error is None:
+            if not args.quiet:
+                print(f"{input_file} -> {output_file}")
+        else:
+            print(f"Error converting {input_file}: {error}", file=sys.stderr)
+    
+    def report_pass(summary):
+        if not args.quiet:
+            print(f"Sync: {summary['converted']} converted, {summary['failed']} failed, "
+                  f"{summary['unchanged']} unchanged, {summary['pruned']} outputs pruned"
+                  + (f", {summary['waiting']} still being written" if summary['waiting'] else ""))
+    
+    runner, _, _, scheduler, metrics = build_runner(args, category)
+    sync = DirectorySync(args.inputs[0], args.output_dir, category, options, runner,
+                         manifest_path=args.manifest, prune=args.prune, settle=args.settle,
+                         on_result=report)
+    try:
+        if args.watch is not None:
+            try:
+                sync.watch(args.watch, on_pass=report_pass)
+            except KeyboardInterrupt:
+                pass
+            return 0
+        summary = sync.run()
+        report_pass(summary)
+        return 0 if not summary['failed'] else 1
+    finally:
+        sync.close()
+        close_runner(args, scheduler, metrics)
+
+
+def run_service(args):
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_max_size * 1024 * 1024)
+    scheduler = FFmpegScheduler(
+        audio_workers=args.audio_workers or args.workers,
+        video_workers=args.video_workers or args.workers
+    )
+    if not args.quiet:
+        for address in args.serve:
+            where = f"unix:{address[1]}" if address[0] == 'unix' else f"http://{address[1]}:{address[2]}"
+            print(f"Serving conversions on {where}", file=sys.stderr, flush=True)
+    serve(args.serve, work_dir=args.service_dir, workers=args.workers, limits=dict(args.category_limits or []),
+          cache=cache, scheduler=scheduler, max_upload=args.max_upload * MB, result_ttl=args.result_ttl)
+    scheduler.shutdown(wait=False)
+    return 0
+
+
+def run_worker(args):
+    def report(job, outputs, error):
+        if error is None:
+            if not args.quiet:
+                print(f"{job['input']} -> {', '.join(outputs)}", flush=True)
+        else:
+            print(f"Error converting {job['input']}: {error}", file=sys.stderr, flush=True)
+    
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_max_size * 1024 * 1024)
+    scheduler = FFmpegScheduler(
+        audio_workers=args.audio_workers or args.workers,
+        video_workers=args.video_workers or args.workers
+    )
+    worker = QueueWorker(JobQueue(args.queue), workers=args.workers, categories=args.worker_categories,
+                         cache=cache, scheduler=scheduler, lease_seconds=args.lease, on_result=report)
+    if not args.quiet:
+        print(f"Worker {worker.worker_id} taking jobs from {args.queue}", file=sys.stderr, flush=True)
+    try:
+        worker.run(exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        # Unfinished jobs were put back on the queue
+        pass
+    finally:
+        scheduler.shutdown(wait=False)
+    if not args.quiet:
+        print(f"Worker {worker.worker_id} stopped after {worker.completed} jobs", file=sys.stderr)
+    return 0
+
+
+def list_queue(args):
+    queue = JobQueue(args.queue)
+    for batch in queue.batches():
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(batch['created']))
+        workers = f" on {', '.join(batch['workers'])}" if batch['workers'] else ""
+        print(f"{batch['id']}  {created}  {batch['category']} from {batch['submitter']}: "
+              f"{batch['done']}/{batch['total']} done, {batch['failed']} failed, {batch['queued']} queued, "
+              f"{batch['leased']} running{workers}")
+    queue.close()
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if args.serve:
+        if args.inputs:
+            parser.error("--serve takes no inputs; jobs are submitted over HTTP")
+        return run_service(args)
+    if (args.worker or args.queue_status) and not args.queue:
+        parser.error("--worker and --queue-status require --queue")
+    if args.queue_status:
+        return list_queue(args)
+    if args.worker:
+        if args.inputs:
+            parser.error("--worker takes no inputs; jobs come from the queue")
+        return run_worker(args)
+    if args.queue and args.pipeline:
+        parser.error("--pipeline applies to local conversion and cannot be used with --queue")
+    
+    journal = None
+    if args.journal or args.resume or args.list_batches:
+        journal = JobJournal(args.journal)
+    if args.list_batches:
+        for batch in journal.unfinished_batches():
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(batch['created']))
+            print(f"{batch['id']}  {created}  {batch['category']}: {batch['done']}/{batch['total']} done, "
+                  f"{batch['failed']} failed, {batch['remaining']} remaining")
+        return 0
+    if args.resume:
+        return resume_batch(args, journal)
+    
+    if not args.inputs:
+        parser.error("at least one input is required")
+    if not args.format and not args.renditions and not args.variants:
+        parser.error("one of --format, --rendition or --variant is required")
+    if args.sync and (len(args.inputs) != 1 or not os.path.isdir(args.inputs[0])):
+        parser.error("--sync takes a single input directory")
+    if (args.watch is not None or args.prune or args.manifest) and not args.sync:
+        parser.error("--watch, --prune and --manifest require --sync")
+    if args.sync and journal is not None:
+        parser.error("--sync keeps its own manifest and cannot be used with --journal")
+    
+    if args.renditions:
+        category = "Images"
+    elif args.variants:
+        category = args.category or category_for_format(args.variants[0]['format'])
+    else:
+        category = args.category or category_for_format(args.format)
+    files = [] if args.sync else expand_inputs(args.inputs)
+    if not files and not args.sync:
+        print("No input files matched.", file=sys.stderr)
+        return 2
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    options = {
+        'format': args.format,
+        'quality': args.quality,
+        'resize': args.resize is not None,
+        'dimensions': args.resize,
+        'fast_resize': args.fast_resize,
+        'resample': args.resample,
+        'encoding': args.encoding,
+        'headers': args.headers,
+        'chunk_size': args.chunk_size,
+        'csv_engine': args.csv_engine,
+        'sheet': args.sheet,
+        'excel_engine': args.excel_engine,
+        'codec': args.codec,
+        'bitrate': args.bitrate,
+        'renditions': args.renditions,
+        'variants': args.variants,
+        'fast_path': args.fast_path,
+        'schema_cache': args.schema_cache,
+        'flatten_json': args.flatten_json,
+    }
+    if is_multi_output(options):
+        jobs = [(path, args.output_dir) for path in files]
+    else:
+        jobs = [(path, output_path_for(path, args.output_dir, args.format)) for path in files]
+    
+    if args.sync:
+        return run_sync(args, category, options)
+    return run_batch(args, category, jobs, options, journal)
@@ -0,0 +1,109 @@
+import os
+
+# Arrow-native inputs and outputs. Conversions between these never build
+# a pandas DataFrame: record batches go straight from reader to writer.
+COLUMNAR_INPUTS = ['.parquet', '.feather', '.arrow']
+COLUMNAR_OUTPUTS = ['parquet', 'feather']
+ARROW_OUTPUTS = COLUMNAR_OUTPUTS + ['csv']
+
+CSV_ENGINES = ['pandas', 'pyarrow']
+
+# Rows per record batch when reading a columnar file incrementally
+DEFAULT_BATCH_SIZE = 65536
+
+
+def can_convert_columnar(input_file, format, encoding=None, csv_engine=None):
+    input_ext = os.path.splitext(input_file)[1].lower()
+    if input_ext == '.csv' and csv_engine != 'pyarrow':
+        return False
+    if input_ext not in COLUMNAR_INPUTS + ['.csv'] or format not in ARROW_OUTPUTS:
+        return False
+    if format == 'csv' and (encoding or 'utf-8').lower().replace('_', '-') not in ['utf-8', 'utf8']:
+        # Arrow only writes UTF-8 text
+        return False
+    return True
+
+
+def open_batches(input_file, encoding=None, batch_size=None):
+    # Returns (schema, iterator of record batches). Without a batch size the
+    # whole file is read with Arrow's multithreaded readers, which is fastest;
+    # with one, batches are read incrementally so memory stays bounded.
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    input_ext = os.path.splitext(input_file)[1].lower()
+
+    if input_ext == '.csv':
+        read_options = pv.ReadOptions(encoding=encoding or 'utf-8', use_threads=True)
+        if batch_size:
+            # Arrow sizes CSV batches by bytes (block_size), so batch_size
+            # only switches to incremental reading here
+            reader = pv.open_csv(input_file, read_options=read_options)
+            return reader.schema, iter(reader)
+        table = pv.read_csv(input_file, read_options=read_options)
+        return table.schema, iter(table.to_batches())
+    elif input_ext == '.parquet':
+        if batch_size:
+            parquet_file = pq.ParquetFile(input_file)
+            return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=batch_size)
+        table = pq.read_table(input_file)
+        return table.schema, iter(table.to_batches())
+    elif input_ext in ['.feather', '.arrow']:
+        # Feather v2 is the Arrow IPC file format, so batches can be read
+        # one at a time from a memory map
+        reader = pa.ipc.open_file(pa.memory_map(input_file, 'r'))
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        raise ValueError(f"Unsupported columnar input format: {input_ext}")
+
+
+class BatchWriter:
+    # Writes Arrow record batches to a Parquet, Feather or CSV file as they
+    # arrive
+    def __init__(self, output_file, format, schema, headers=True):
+        import pyarrow as pa
+        import pyarrow.csv as pv
+        import pyarrow.parquet as pq
+
+        self.schema = schema
+        if format == 'parquet':
+            self.writer = pq.ParquetWriter(output_file, schema)
+        elif format == 'feather':
+            # Same compression as pyarrow.feather.write_feather
+            options = pa.ipc.IpcWriteOptions(compression='lz4')
+            self.writer = pa.ipc.new_file(output_file, schema, options=options)
+        elif format == 'csv':
+            # Arrow quotes every string value; numbers are written bare
+            write_options = pv.WriteOptions(include_header=bool(headers), quoting_style='needed')
+            self.writer = pv.CSVWriter(output_file, schema, write_options=write_options)
+        else:
+            raise ValueError(f"Arrow output to {format} is not supported")
+
+    def write(self, batch):
+        self.writer.write_batch(batch)
+
+    def write_frame(self, frame):
+        import pyarrow as pa
+
+        # Later chunks are cast to the first chunk's schema, so a column that
+        # pandas reads as int64 in one chunk and float64 in the next still
+        # lands in a single file
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def convert_columnar(input_file, output_file, format, encoding=None, headers=True, batch_size=None):
+    schema, batches = open_batches(input_file, encoding, batch_size)
+    with BatchWriter(output_file, format, schema, headers) as writer:
+        for batch in batches:
+            writer.write(batch)
@@ -0,0 +1,138 @@
+import os
+import shutil
+
+from .columnar import COLUMNAR_OUTPUTS, can_convert_columnar, convert_columnar
+from .excel import EXCEL_INPUTS, Workbook, XlsxWriter, convert_workbook, writes_sheet_files
+from .jsonstream import iter_json_frames, json_layout
+from .metrics import stage
+from .schema import SchemaCache, read_csv_with_schema
+from .streaming import can_stream, stream_chunk_size, stream_document
+
+
+def read_document(input_file, format, encoding, csv_engine=None, sheet=None, excel_engine=None, schemas=None,
+                  flatten=False):
+    # Returns a DataFrame, or None when the input is text that is simply
+    # copied to the output. With a SchemaCache, CSVs read by pandas use the
+    # schema cached for their header; flatten turns nested JSON objects
+    # into dotted columns.
+    
+    # Imported here so headless runs that never touch documents skip pandas
+    import pandas as pd
+    
+    input_ext = os.path.splitext(input_file)[1].lower()
+    
+    if input_ext == '.csv':
+        if csv_engine == 'pyarrow':
+            # Multithreaded Arrow parser, converted to a DataFrame at the end
+            return pd.read_csv(input_file, encoding=encoding or 'utf-8', engine='pyarrow')
+        if schemas is not None:
+            # Compact types only where the output does not record them
+            return read_csv_with_schema(input_file, encoding, schemas, format not in COLUMNAR_OUTPUTS)
+        return pd.read_csv(input_file, encoding=encoding or 'utf-8')
+    elif input_ext == '.parquet':
+        return pd.read_parquet(input_file)
+    elif input_ext in ['.feather', '.arrow']:
+        return pd.read_feather(input_file)
+    elif input_ext in EXCEL_INPUTS:
+        with Workbook(input_file, excel_engine) as workbook:
+            return next(workbook.iter_frames(workbook.select(sheet)[0]))
+    elif input_ext in ['.json', '.jsonl']:
+        if flatten or (input_ext == '.json' and json_layout(input_file, encoding) == 'lines'):
+            # pandas reads neither flattened records nor JSON Lines in a
+            # .json file
+            return next(iter_json_frames(input_file, encoding, flatten=flatten))
+        return pd.read_json(input_file, lines=input_ext == '.jsonl', encoding=encoding or 'utf-8')
+    elif input_ext == '.txt':
+        if format != 'csv':
+            return None
+        
+        with open(input_file, 'r', encoding=encoding or 'utf-8') as src:
+            content = src.read()
+        
+        # Simple conversion: split by newlines and commas
+        rows = content.strip().split('\n')
+        return pd.DataFrame([row.split(',') for row in rows])
+    else:
+        raise ValueError(f"Unsupported input format: {input_ext}")
+
+
+def write_document(data, output_file, format, encoding, headers):
+    if format == 'csv':
+        data.to_csv(output_file, index=False, header=headers)
+    elif format == 'xlsx':
+        # Written row by row rather than building the sheet in memory
+        with XlsxWriter(output_file, headers) as writer:
+            writer.write(data)
+    elif format == 'json':
+        data.to_json(output_file, orient='records', force_ascii=False)
+    elif format == 'jsonl':
+        data.to_json(output_file, orient='records', lines=True, force_ascii=False)
+    elif format == 'parquet':
+        data.to_parquet(output_file, index=False)
+    elif format == 'feather':
+        # Feather cannot store a non-default index
+        data.reset_index(drop=True).to_feather(output_file)
+    elif format == 'txt':
+        # Simple conversion for text
+        with open(output_file, 'w', encoding=encoding or 'utf-8') as out:
+            out.write(data.to_string(index=False, header=headers))
+    else:
+        raise ValueError(f"Unsupported output format: {format}")
+
+
+def convert_document(input_file, output_file, format, encoding, headers, chunk_size=None, csv_engine=None,
+                     sheet=None, excel_engine=None, schema_cache=False, flatten_json=False):
+    # Returns the files written when every sheet of a workbook goes to its
+    # own file in the output_file directory, and None otherwise
+    input_ext = os.path.splitext(input_file)[1].lower()
+    if input_ext in EXCEL_INPUTS:
+        # Workbooks are read lazily, and all selected sheets come from one open
+        with stage('workbook'):
+            return convert_workbook(input_file, output_file, format, encoding, headers, chunk_size,
+                                    sheet, excel_engine)
+    
+    if writes_sheet_files({'sheet': sheet, 'format': format}):
+        # Other inputs in an all-sheets batch write their single output
+        # into the same directory
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        output_file = os.path.join(output_file, f"{base_name}.{format}")
+        convert_document(input_file, output_file, format, encoding, headers, chunk_size, csv_engine,
+                         schema_cache=schema_cache, flatten_json=flatten_json)
+        return [output_file]
+    
+    # Conversions between Arrow-readable inputs and Parquet, Feather or CSV
+    # outputs pass record batches straight through without pandas
+    if can_convert_columnar(input_file, format, encoding, csv_engine):
+        with stage('columnar'):
+            convert_columnar(input_file, output_file, format, encoding, headers, chunk_size)
+        return
+    
+    # With the schema cache, CSVs parsed by pandas reuse the text columns
+    # sampled from the first file seen with the same header
+    schemas = None
+    if schema_cache and input_ext == '.csv' and csv_engine != 'pyarrow':
+        schemas = SchemaCache()
+    try:
+        # With a chunk size, inputs that can be read incrementally are
+        # streamed so peak memory is bounded by the chunk rather than the
+        # file. Large JSON inputs are streamed regardless.
+        chunk_size = stream_chunk_size(input_file, format, chunk_size)
+        if chunk_size and can_stream(input_file, format):
+            with stage('stream'):
+                stream_document(input_file, output_file, format, encoding, headers, chunk_size, schemas,
+                                flatten_json)
+            return
+        
+        with stage('read'):
+            data = read_document(input_file, format, encoding, csv_engine, schemas=schemas, flatten=flatten_json)
+    finally:
+        if schemas is not None:
+            schemas.close()
+    if data is None:
+        # For simple text files, just copy them
+        with stage('copy'):
+            shutil.copy2(input_file, output_file)
+        return
+    
+    with stage('write'):
+        write_document(data, output_file, format, encoding, headers)
@@ -0,0 +1,239 @@
+import os
+import shutil
+
+from .images import convert_image, render_renditions
+from .documents import convert_document
+from .excel import writes_sheet_files
+from .fastpath import fast_path_enabled
+from .journal import temp_output_path
+from .media import convert_audio, convert_media_variants, convert_video
+from .metrics import stage
+
+CATEGORIES = ["Images", "Documents", "Audio", "Video"]
+
+# Output formats offered for each category
+FORMATS = {
+    "Images": ["jpg", "png", "gif", "bmp", "tiff", "webp"],
+    "Documents": ["csv", "xlsx", "json", "jsonl", "txt", "parquet", "feather"],
+    "Audio": ["mp3", "wav", "ogg", "flac"],
+    "Video": ["mp4", "avi", "mkv", "webm"]
+}
+
+# Input extensions recognised for each category
+INPUT_EXTENSIONS = {
+    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".webp"],
+    "Documents": [".csv", ".xlsx", ".xls", ".json", ".jsonl", ".txt", ".parquet", ".feather", ".arrow"],
+    "Audio": [".mp3", ".wav", ".ogg", ".flac"],
+    "Video": [".mp4", ".avi", ".mkv", ".mov", ".webm"]
+}
+
+DEFAULT_OPTIONS = {
+    'quality': 85,
+    'resize': False,
+    'dimensions': None,
+    'fast_resize': False,
+    'resample': 'lanczos',
+    'encoding': 'utf-8',
+    'headers': True,
+    'chunk_size': None,
+    'csv_engine': 'pandas',
+    'sheet': None,
+    'excel_engine': 'auto',
+    'codec': None,
+    'bitrate': None,
+    'threads': None,
+    'fast_path': True,
+    'schema_cache': False,
+    'flatten_json': False,
+}
+
+
+def category_for_format(format):
+    format = (format or '').lower().lstrip('.')
+    for category, formats in FORMATS.items():
+        if format in formats:
+            return category
+    return None
+
+
+def category_for_input(input_file):
+    ext = os.path.splitext(input_file)[1].lower()
+    for category, extensions in INPUT_EXTENSIONS.items():
+        if ext in extensions:
+            return category
+    return None
+
+
+def is_multi_output(options):
+    # Jobs that write several files into a directory rather than one file
+    return bool(options.get('renditions') or options.get('variants') or writes_sheet_files(options))
+
+
+def output_path_for(input_file, output_dir, format):
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(output_dir, f"{base_name}.{format}")
+
+
+def run_conversion_job(category, file_path, output_file, options, progress=None):
+    # Module-level so it can be pickled into a process pool worker.
+    # progress, if given, is called as progress(fraction, details) while an
+    # FFmpeg conversion runs; other categories only report on completion.
+    #
+    # Outputs are written under temporary names and renamed into place, so
+    # a job that is killed never leaves a truncated file at the final path
+    if is_multi_output(options):
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        temp_dir = temp_output_path(os.path.join(output_file, base_name))
+        os.makedirs(temp_dir)
+        try:
+            temp_files = _run_job(category, file_path, temp_dir, options, progress)
+            output_files = []
+            for temp_file in temp_files:
+                final_file = os.path.join(output_file, os.path.relpath(temp_file, temp_dir))
+                os.replace(temp_file, final_file)
+                output_files.append(final_file)
+            return output_files
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    temp_file = temp_output_path(output_file)
+    try:
+        _run_job(category, file_path, temp_file, options, progress)
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return output_file
+
+
+def _run_job(category, file_path, output_file, options, progress=None):
+    if category == "Images" and options.get('renditions'):
+        # Rendition jobs write several files into output_file, a directory
+        return render_renditions(file_path, output_file, options['renditions'],
+                                 options.get('fast_resize'), options.get('resample'), fast_path_enabled(options))
+    elif category == "Images":
+        convert_image(file_path, output_file, options['format'], options.get('quality'),
+                      options.get('resize'), options.get('dimensions'),
+                      options.get('fast_resize'), options.get('resample'), fast_path_enabled(options))
+    elif category == "Documents":
+        # Returns the sheet files when every sheet is written separately
+        output_files = convert_document(file_path, output_file, options['format'],
+                                        options.get('encoding'), options.get('headers'),
+                                        options.get('chunk_size'), options.get('csv_engine'),
+                                        options.get('sheet'), options.get('excel_engine'),
+                                        bool(options.get('schema_cache')), options.get('flatten_json'))
+        return output_files or output_file
+    elif category in ["Audio", "Video"] and options.get('variants'):
+        # Variant jobs write several files into output_file, a directory
+        return convert_media_variants(category, file_path, output_file, options['variants'],
+                                      options.get('threads'), progress, options.get('pipe_input'),
+                                      fast_path_enabled(options))
+    elif category == "Audio":
+        convert_audio(file_path, output_file, options['format'], options.get('codec'), options.get('bitrate'),
+                      options.get('threads'), progress, options.get('pipe_input'), fast_path_enabled(options))
+    elif category == "Video":
+        convert_video(file_path, output_file, options['format'], options.get('codec'), options.get('bitrate'),
+                      options.get('threads'), progress, options.get('pipe_input'), fast_path_enabled(options))
+    else:
+        raise ValueError(f"Unsupported category: {category}")
+    return output_file
+
+
+def run_cached_job(category, file_path, output_file, options, cache, progress=None):
+    # Returns (output_file, hit). On a hit the earlier output is copied into
+    # place instead of running the conversion.
+    if is_multi_output(options):
+        # Multi-output jobs are not cached; they always run
+        return run_conversion_job(category, file_path, output_file, options, progress), False
+    
+    with stage('cache_lookup'):
+        key = cache.key_for(category, file_path, options)
+        hit = cache.fetch(key, output_file)
+    if hit:
+        return output_file, True
+    
+    # The new output is renamed over any earlier one, so an output hardlinked
+    # from the cache by an older version is replaced rather than truncated
+    run_conversion_job(category, file_path, output_file, options, progress)
+    with stage('cache_store'):
+        cache.store(key, output_file)
+    return output_file, False
+
+
+def resolve_options(input_file, output, options=None):
+    # Fill in defaults and work out the category, format and output path
+    # for a single conversion
+    resolved = dict(DEFAULT_OPTIONS)
+    resolved.update(options or {})
+    
+    if resolved.get('renditions'):
+        # Renditions carry their own formats and always write to a directory
+        resolved['category'] = "Images"
+        output = output or os.path.dirname(os.path.abspath(input_file))
+        os.makedirs(output, exist_ok=True)
+        return "Images", output, resolved
+    
+    if resolved.get('variants'):
+        # Media variants also write several files into a directory
+        category = resolved.get('category') or category_for_input(input_file)
+        if category not in ["Audio", "Video"]:
+            raise ValueError("Variants are only supported for audio and video inputs")
+        resolved['category'] = category
+        output = output or os.path.dirname(os.path.abspath(input_file))
+        os.makedirs(output, exist_ok=True)
+        return category, output, resolved
+    
+    if writes_sheet_files(resolved):
+        # Every sheet of a workbook goes to its own file in a directory
+        resolved['format'] = resolved['format'].lower().lstrip('.')
+        resolved['category'] = "Documents"
+        output = output or os.path.dirname(os.path.abspath(input_file))
+        os.makedirs(output, exist_ok=True)
+        return "Documents", output, resolved
+    
+    format = resolved.get('format')
+    if not format:
+        if not output or os.path.isdir(output):
+            raise ValueError("An output format is required when the output is a directory")
+        format = os.path.splitext(output)[1]
+    resolved['format'] = format.lower().lstrip('.')
+    
+    category = (resolved.get('category')
+                or category_for_format(resolved['format'])
+                or category_for_input(input_file))
+    if category not in CATEGORIES:
+        raise ValueError(f"Unsupported output format: {resolved['format']}")
+    resolved['category'] = category
+    
+    if not output:
+        output = os.path.dirname(os.path.abspath(input_file))
+    if os.path.isdir(output):
+        output = output_path_for(input_file, output, resolved['format'])
+    return category, output, resolved
+
+
+def convert(input_file, output, options=None, cache=None):
+    """Convert a single file and return the path that was written.
+    
+    ``output`` may be a file path or an existing directory. ``options`` is a
+    dict with ``format`` and any of the per-category options (``quality``,
+    ``resize``, ``dimensions``, ``fast_resize``, ``resample``, ``encoding``,
+    ``headers``, ``chunk_size``, ``csv_engine``, ``sheet``, ``excel_engine``, ``schema_cache``,
+    ``flatten_json``, ``codec``, ``bitrate``); ``category`` is inferred from
+    the format when omitted. Pass a ``ConversionCache`` to reuse earlier
+    outputs for unchanged inputs.
+    
+    With ``renditions`` (a list of ``"FORMAT[:QUALITY][:WxH]"`` specs or
+    dicts) the image is decoded once, several files are written into the
+    ``output`` directory and the list of their paths is returned. Audio and
+    video ``variants`` (``"FORMAT[:CODEC][:BITRATE]"`` specs or dicts) work
+    the same way, encoding every variant from one FFmpeg decode pass.
+    
+    A ``sheet`` of ``"*"`` converts every sheet of a workbook from one
+    open; unless the format is ``xlsx`` each sheet is written to its own
+    file in the ``output`` directory and the list of paths is returned.
+    """
+    category, output_file, resolved = resolve_options(input_file, output, options)
+    if cache is not None:
+        return run_cached_job(category, input_file, output_file, resolved, cache)[0]
+    return run_conversion_job(category, input_file, output_file, resolved)
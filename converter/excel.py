@@ -0,0 +1,278 @@
+import datetime
+import importlib.util
+import json
+import os
+import re
+
+# Engines for reading workbooks. 'auto' uses calamine (Rust, several times
+# faster) when python-calamine is installed and openpyxl's read-only mode
+# otherwise.
+EXCEL_ENGINES = ['auto', 'calamine', 'openpyxl']
+
+# Sheet option meaning every sheet in the workbook
+ALL_SHEETS = '*'
+
+EXCEL_INPUTS = ['.xlsx', '.xls']
+
+# Rows per sheet in the XLSX format
+MAX_ROWS = 1048576
+
+
+def have_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def writes_sheet_files(options):
+    # Converting every sheet to a non-workbook format writes one file per
+    # sheet, so the job's output is a directory
+    format = (options.get('format') or '').lower().lstrip('.')
+    return options.get('sheet') == ALL_SHEETS and format not in ['', 'xlsx']
+
+
+def sheet_output_path(output_dir, input_file, sheet_name, format):
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    safe_name = re.sub(r'[^\w.-]+', '_', sheet_name).strip('_') or 'sheet'
+    return os.path.join(output_dir, f"{base_name}-{safe_name}.{format}")
+
+
+def _calamine_value(value):
+    # Match what openpyxl and pandas' calamine reader return
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+class Workbook:
+    # A workbook opened once for reading, whichever sheets are converted.
+    # Rows are read lazily, one sheet at a time.
+    def __init__(self, input_file, engine=None):
+        engine = engine or 'auto'
+        if engine not in EXCEL_ENGINES:
+            raise ValueError(f"Unsupported Excel engine: {engine}")
+        input_ext = os.path.splitext(input_file)[1].lower()
+        if engine == 'auto':
+            if have_module('python_calamine'):
+                engine = 'calamine'
+            elif input_ext == '.xlsx':
+                engine = 'openpyxl'
+            else:
+                # Legacy .xls goes through pandas (xlrd)
+                engine = 'pandas'
+        self.engine = engine
+
+        if engine == 'calamine':
+            from python_calamine import CalamineWorkbook
+            self.book = CalamineWorkbook.from_path(input_file)
+            self.sheet_names = list(self.book.sheet_names)
+        elif engine == 'openpyxl':
+            import openpyxl
+            self.book = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+            self.sheet_names = list(self.book.sheetnames)
+        else:
+            import pandas as pd
+            self.book = pd.ExcelFile(input_file)
+            self.sheet_names = list(self.book.sheet_names)
+
+    def select(self, sheet=None):
+        # Names of the sheets to convert: the first sheet by default, every
+        # sheet for ALL_SHEETS, or one sheet by name or index
+        if sheet is None or sheet == '':
+            return self.sheet_names[:1]
+        if sheet == ALL_SHEETS:
+            return list(self.sheet_names)
+        if sheet in self.sheet_names:
+            return [sheet]
+        if str(sheet).isdigit() and int(sheet) < len(self.sheet_names):
+            return [self.sheet_names[int(sheet)]]
+        raise ValueError(f"Worksheet not found: {sheet}")
+
+    def iter_rows(self, sheet_name):
+        if self.engine == 'calamine':
+            for row in self.book.get_sheet_by_name(sheet_name).iter_rows():
+                yield [_calamine_value(value) for value in row]
+        elif self.engine == 'openpyxl':
+            for row in self.book[sheet_name].iter_rows(values_only=True):
+                yield list(row)
+        else:
+            frame = self.book.parse(sheet_name, header=None)
+            for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None):
+                yield list(row)
+
+    def iter_frames(self, sheet_name, chunk_size=None):
+        # Yields the sheet as DataFrames of up to chunk_size rows (the whole
+        # sheet when chunk_size is None), with the first row as the header
+        # as pd.read_excel does
+        import pandas as pd
+
+        columns = None
+        rows = []
+        pending_blank = []
+        chunks = 0
+        for row in self.iter_rows(sheet_name):
+            blank = all(value is None for value in row)
+            if columns is None:
+                if not blank:
+                    columns = header_names(row)
+                continue
+            if blank:
+                # Blank rows only count once a later row shows they are not
+                # trailing padding
+                pending_blank.append(row)
+                continue
+            rows.extend(pending_blank)
+            pending_blank = []
+            rows.append(row)
+            if chunk_size and len(rows) >= chunk_size:
+                yield pd.DataFrame(_fit(rows, len(columns)), columns=columns)
+                chunks += 1
+                rows = []
+        if columns is None:
+            yield pd.DataFrame()
+        elif rows or not chunks:
+            yield pd.DataFrame(_fit(rows, len(columns)), columns=columns)
+
+    def close(self):
+        if self.engine != 'calamine':
+            # Read-only openpyxl workbooks keep the file open until closed
+            self.book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def header_names(row):
+    # Blank and repeated header cells are named as pandas names them
+    names = []
+    seen = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _fit(rows, width):
+    return [row[:width] + [None] * (width - len(row)) for row in rows]
+
+
+def _nested_text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+class XlsxWriter:
+    # Writes DataFrame chunks to an XLSX workbook row by row without keeping
+    # the sheet in memory: XlsxWriter's constant_memory mode when it is
+    # installed, openpyxl's write-only mode otherwise
+    def __init__(self, output_file, headers=True):
+        self.headers = headers
+        self.sheet = None
+        self.rows = 0
+        if have_module('xlsxwriter'):
+            import xlsxwriter
+            self.engine = 'xlsxwriter'
+            self.book = xlsxwriter.Workbook(output_file, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                'remove_timezone': True,
+            })
+        else:
+            import openpyxl
+            self.engine = 'openpyxl'
+            self.output_file = output_file
+            self.book = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(self, name=None):
+        if self.engine == 'xlsxwriter':
+            self.sheet = self.book.add_worksheet(name)
+        else:
+            self.sheet = self.book.create_sheet(name)
+        self.rows = 0
+
+    def write(self, chunk):
+        if self.sheet is None:
+            self.add_sheet()
+
+        rows = []
+        if self.rows == 0 and self.headers:
+            rows.append([str(name) for name in chunk.columns])
+        # Boxing to objects turns numpy scalars into Python numbers, and
+        # missing values become empty cells
+        boxed = chunk.astype(object).where(chunk.notna(), None)
+        for position, dtype in enumerate(chunk.dtypes):
+            if dtype == object:
+                # Cells hold scalars; nested JSON values are written as text
+                column = boxed.iloc[:, position]
+                boxed.isetitem(position, type(column)([_nested_text(value) for value in column],
+                                                      index=column.index, dtype=object))
+        rows.extend(boxed.itertuples(index=False, name=None))
+        if self.rows + len(rows) > MAX_ROWS:
+            raise ValueError(f"XLSX sheets are limited to {MAX_ROWS} rows")
+
+        for row in rows:
+            if self.engine == 'xlsxwriter':
+                self.sheet.write_row(self.rows, 0, row)
+            else:
+                self.sheet.append(row)
+            self.rows += 1
+
+    def close(self):
+        if self.sheet is None:
+            self.add_sheet()
+        if self.engine == 'xlsxwriter':
+            self.book.close()
+        else:
+            self.book.save(self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def convert_workbook(input_file, output_file, format, encoding, headers, chunk_size=None,
+                     sheet=None, engine=None):
+    # The workbook is opened once however many sheets are converted.
+    # Returns the list of files written when every sheet goes to its own
+    # file, and None otherwise.
+    from .streaming import ChunkWriter
+
+    with Workbook(input_file, engine) as workbook:
+        sheet_names = workbook.select(sheet)
+
+        if format == 'xlsx':
+            # Sheets are copied into one workbook under the same names
+            with XlsxWriter(output_file, headers) as writer:
+                for sheet_name in sheet_names:
+                    writer.add_sheet(sheet_name)
+                    for frame in workbook.iter_frames(sheet_name, chunk_size):
+                        writer.write(frame)
+            return None
+
+        if sheet != ALL_SHEETS:
+            with ChunkWriter(output_file, format, encoding, headers) as writer:
+                for frame in workbook.iter_frames(sheet_names[0], chunk_size):
+                    writer.write(frame)
+            return None
+
+        output_files = []
+        for sheet_name in sheet_names:
+            sheet_file = sheet_output_path(output_file, input_file, sheet_name, format)
+            with ChunkWriter(sheet_file, format, encoding, headers) as writer:
+                for frame in workbook.iter_frames(sheet_name, chunk_size):
+                    writer.write(frame)
+            output_files.append(sheet_file)
+        return output_files
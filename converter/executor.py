@@ -0,0 +1,220 @@
+import os
+import multiprocessing
+import queue
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from .engine import run_cached_job, run_conversion_job
+from .ffmpeg import FFmpegScheduler, default_media_workers, threads_per_job
+from .metrics import run_instrumented
+
+# Pillow and pandas work is CPU-bound and holds the GIL, so it runs in worker
+# processes. FFmpeg already runs out of process, so threads are enough there.
+EXECUTOR_KINDS = {
+    "Images": "process",
+    "Documents": "process",
+    "Audio": "thread",
+    "Video": "thread",
+}
+
+
+def default_worker_count():
+    return max(1, os.cpu_count() or 1)
+
+
+MEDIA_CATEGORIES = ["Audio", "Video"]
+
+
+class ConversionExecutor:
+    # max_workers applies to every category when given. Otherwise images and
+    # documents get one worker per core, and audio and video use the media
+    # defaults or the passed FFmpegScheduler's pool sizes.
+    #
+    # With an AdmissionController, jobs are started largest first and only
+    # while their estimated memory and CPU fit its budgets.
+    def __init__(self, max_workers=None, kind=None, cache=None, scheduler=None, metrics=None, admission=None):
+        self.max_workers = max(1, int(max_workers)) if max_workers else None
+        self.kind = kind
+        self.cache = cache
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.admission = admission
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def workers_for(self, category):
+        if category in MEDIA_CATEGORIES and self.scheduler is not None:
+            return self.scheduler.workers[category]
+        if self.max_workers:
+            return self.max_workers
+        if category in MEDIA_CATEGORIES:
+            return default_media_workers(category)
+        return default_worker_count()
+
+    def _create_pool(self, category, workers):
+        kind = self.kind or EXECUTOR_KINDS.get(category, "thread")
+        if kind == "process":
+            # spawn avoids forking a process that is running a Tk main loop
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def _job_options(self, category, options, workers):
+        if category in MEDIA_CATEGORIES and not options.get('threads'):
+            # Give each concurrent FFmpeg its share of the cores
+            if self.scheduler is not None:
+                threads = self.scheduler.threads_for(category)
+            else:
+                threads = threads_per_job(workers)
+            options = dict(options, threads=threads)
+        return options
+
+    def _submit_args(self, category, input_file, output_file, options, progress=None, original=None):
+        # original is the (input_file, output_file) a job stands for when it
+        # runs on spooled copies; progress and metrics are reported against it.
+        #
+        # Live progress callbacks only work in-process, which is where the
+        # FFmpeg jobs run; pooled image and document jobs report on completion
+        original_input, original_output = original or (input_file, output_file)
+        job_progress = None
+        if progress is not None and category in MEDIA_CATEGORIES:
+            job_progress = progress.job_progress(original_input)
+        if self.cache is not None:
+            function, args = run_cached_job, (category, input_file, output_file, options, self.cache, job_progress)
+        else:
+            function, args = run_conversion_job, (category, input_file, output_file, options, job_progress)
+        
+        if self.metrics is not None:
+            return run_instrumented, (function, args, category, original_input,
+                                      self.metrics.profile_dir_for_next(), original_output)
+        return function, args
+
+    def _complete(self, outcome):
+        # Unpacks what a job returned, feeding the metrics collector and
+        # cache counters. Raises the job's error, if it had one.
+        if self.metrics is not None:
+            result, record, error = outcome
+            self.metrics.add(record)
+            if error is not None:
+                raise error
+        else:
+            result = outcome
+        
+        if self.cache is not None:
+            if result[1]:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        return result
+
+    def run(self, category, jobs, options, progress=None):
+        # jobs is a list of (input_file, output_file) pairs. Results are
+        # yielded as (input_file, output_file, error) in completion order.
+        # progress is an optional BatchProgress updated as jobs run.
+        if not jobs:
+            return
+        
+        workers = self.workers_for(category)
+        options = self._job_options(category, options, workers)
+        
+        if workers == 1:
+            # Skip the pool overhead entirely for serial runs. Admission
+            # still orders the jobs and holds each one until it fits, which
+            # matters when the controller is shared with other runs.
+            if self.admission is not None:
+                costed = self.admission.order(category, jobs, options)
+            else:
+                costed = [(job, None) for job in jobs]
+            for (input_file, output_file), cost in costed:
+                function, args = self._submit_args(category, input_file, output_file, options, progress)
+                if cost is not None:
+                    self.admission.acquire(cost)
+                try:
+                    self._complete(function(*args))
+                    error = None
+                except Exception as e:
+                    error = e
+                finally:
+                    if cost is not None:
+                        self.admission.release(cost)
+                if progress is not None:
+                    progress.finish(input_file, error is None)
+                yield input_file, output_file, error
+            return
+        
+        if category in MEDIA_CATEGORIES:
+            # FFmpeg jobs go through a scheduler whose pools outlive the batch
+            # when one was passed in
+            scheduler = self.scheduler
+            owns_scheduler = scheduler is None
+            if owns_scheduler:
+                scheduler = FFmpegScheduler(**{f"{category.lower()}_workers": workers})
+            try:
+                yield from self._run_futures(category, jobs, options, partial(scheduler.submit, category), progress)
+            finally:
+                if owns_scheduler:
+                    scheduler.shutdown()
+            return
+        
+        with self._create_pool(category, workers) as pool:
+            yield from self._run_futures(category, jobs, options, pool.submit, progress)
+
+    def _run_futures(self, category, jobs, options, submit, progress=None):
+        if self.admission is not None:
+            yield from self._run_admitted(category, jobs, options, submit, progress)
+            return
+        
+        futures = {}
+        for input_file, output_file in jobs:
+            function, args = self._submit_args(category, input_file, output_file, options, progress)
+            futures[submit(function, *args)] = (input_file, output_file)
+        for future in as_completed(futures):
+            input_file, output_file = futures[future]
+            error = future.exception()
+            if error is None:
+                try:
+                    self._complete(future.result())
+                except Exception as e:
+                    error = e
+            if progress is not None:
+                progress.finish(input_file, error is None)
+            yield input_file, output_file, error
+
+    def _run_admitted(self, category, jobs, options, submit, progress=None):
+        # A dispatcher thread submits jobs, largest first, as the admission
+        # controller lets them in; results are yielded here as they complete
+        costed = self.admission.order(category, jobs, options)
+        done = queue.Queue()
+        
+        def dispatch():
+            for (input_file, output_file), cost in costed:
+                self.admission.acquire(cost)
+                function, args = self._submit_args(category, input_file, output_file, options, progress)
+                try:
+                    future = submit(function, *args)
+                except Exception as e:
+                    self.admission.release(cost)
+                    done.put((input_file, output_file, None, e))
+                    continue
+                
+                def finished(future, job=(input_file, output_file), cost=cost):
+                    self.admission.release(cost)
+                    done.put(job + (future, None))
+                future.add_done_callback(finished)
+        
+        threading.Thread(target=dispatch, daemon=True).start()
+        for _ in costed:
+            input_file, output_file, future, error = done.get()
+            if error is None:
+                error = future.exception()
+            if error is None:
+                try:
+                    self._complete(future.result())
+                except Exception as e:
+                    error = e
+            if progress is not None:
+                progress.finish(input_file, error is None)
+            yield input_file, output_file, error
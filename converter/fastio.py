@@ -0,0 +1,91 @@
+import contextlib
+import errno
+import mmap
+import os
+
+# Files smaller than this are read and written the ordinary way; mapping
+# and preallocating only pay off once the copies they avoid are large
+MMAP_THRESHOLD = 1024 * 1024
+
+# Bytes moved per sendfile call when feeding a pipe
+PUMP_BLOCK = 1024 * 1024
+
+
+@contextlib.contextmanager
+def map_input(path):
+    # Yields a read-only file-like view of path: a memory map for large
+    # files, so decoders read straight from the page cache instead of
+    # through Python's read buffers, and an ordinary file otherwise or where
+    # mapping is not supported (empty files, some network filesystems)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            yield f
+            return
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            yield f
+            return
+        if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            # Decoders read front to back; let the kernel read ahead
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def write_output(path, data):
+    # Writes a finished in-memory output with one write call. Large files
+    # are preallocated first, so the filesystem can lay them out in one
+    # extent instead of growing them a block at a time.
+    data = memoryview(data)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        if len(data) >= MMAP_THRESHOLD and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, len(data))
+            except OSError:
+                # Not supported on every filesystem; the write still works
+                pass
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
+
+
+def pump(source_fd, target_fd):
+    # Copies a file or pipe into a pipe or socket until the end of the
+    # source. On Linux the data stays inside the kernel: sendfile moves
+    # pages from a file and splice moves them from a pipe. Elsewhere, or
+    # when the descriptors support neither, it is read and written in
+    # blocks.
+    unsupported = (errno.EINVAL, errno.ESPIPE, errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP)
+    if hasattr(os, 'sendfile'):
+        offset = 0
+        try:
+            while True:
+                sent = os.sendfile(target_fd, source_fd, offset, PUMP_BLOCK)
+                if sent == 0:
+                    return
+                offset += sent
+        except OSError as e:
+            if e.errno not in unsupported or offset:
+                raise
+    if hasattr(os, 'splice'):
+        try:
+            while os.splice(source_fd, target_fd, PUMP_BLOCK):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in unsupported:
+                raise
+    while True:
+        block = os.read(source_fd, PUMP_BLOCK)
+        if not block:
+            return
+        view = memoryview(block)
+        while view:
+            view = view[os.write(target_fd, view):]
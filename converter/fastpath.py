@@ -0,0 +1,186 @@
+import os
+
+from .ffmpeg import probe_media
+
+# Works out when a conversion can skip the decode and re-encode: media whose
+# streams the target container can hold as they are is remuxed with stream
+# copy, and JPEGs that would only be re-encoded as JPEG are copied.
+
+# Codecs each output container can carry without re-encoding, by stream
+# type. Containers missing a stream type cannot carry it at all.
+CONTAINER_CODECS = {
+    'mp4': {
+        'video': {'h264', 'hevc', 'av1', 'mpeg4', 'vp9'},
+        'audio': {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus'},
+        'subtitle': {'mov_text'},
+    },
+    'mkv': {
+        'video': None,
+        'audio': None,
+        'subtitle': {'subrip', 'ass', 'ssa', 'webvtt', 'hdmv_pgs_subtitle', 'dvd_subtitle', 'dvb_subtitle'},
+    },
+    'webm': {
+        'video': {'vp8', 'vp9', 'av1'},
+        'audio': {'opus', 'vorbis'},
+        'subtitle': {'webvtt'},
+    },
+    'avi': {
+        'video': {'mpeg4', 'h264', 'mjpeg', 'msmpeg4v2', 'msmpeg4v3'},
+        'audio': {'mp3', 'ac3', 'pcm_s16le', 'pcm_u8'},
+    },
+    'mp3': {'audio': {'mp3'}, 'cover': {'mjpeg', 'png'}},
+    'ogg': {'audio': {'vorbis', 'opus', 'flac'}},
+    'flac': {'audio': {'flac'}, 'cover': {'mjpeg', 'png'}},
+    'wav': {'audio': {'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_f32le', 'pcm_u8'}},
+}
+
+# Text subtitles a container cannot hold as they are but can take as its
+# own text codec, which is cheap to convert: MP4's mov_text, and SubRip
+# for MKV (which cannot store mov_text)
+TEXT_SUBTITLE_CODECS = {'subrip', 'srt', 'ass', 'ssa', 'webvtt', 'text', 'mov_text'}
+TEXT_SUBTITLE_TARGETS = {'mp4': 'mov_text', 'mkv': 'srt'}
+
+# Encoder names accepted by the codec option, and the codec each produces
+ENCODER_CODECS = {
+    'h264': 'h264', 'libx264': 'h264',
+    'h265': 'hevc', 'hevc': 'hevc', 'libx265': 'hevc',
+    'vp8': 'vp8', 'libvpx': 'vp8',
+    'vp9': 'vp9', 'libvpx-vp9': 'vp9',
+    'av1': 'av1', 'libaom-av1': 'av1', 'libsvtav1': 'av1',
+    'mp3': 'mp3', 'libmp3lame': 'mp3',
+    'aac': 'aac',
+    'ogg': 'vorbis', 'vorbis': 'vorbis', 'libvorbis': 'vorbis',
+    'opus': 'opus', 'libopus': 'opus',
+    'flac': 'flac',
+}
+
+# IJG's baseline luminance quantization table (JPEG spec, Annex K), which
+# libjpeg scales to produce the table for each quality setting
+STANDARD_LUMINANCE_TABLE = [
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+]
+
+JPEG_FORMATS = ['jpg', 'jpeg']
+
+
+def fast_path_enabled(options):
+    # On unless explicitly turned off; option dicts built before the option
+    # existed leave it out
+    return options.get('fast_path') is not False
+
+
+def estimate_jpeg_quality(quantization):
+    # The libjpeg quality setting that produced a luminance table, from how
+    # far it is scaled from the standard one. Sums are compared, so the
+    # order the tables are stored in does not matter.
+    table = quantization.get(0) if quantization else None
+    if not table or len(table) != 64:
+        return None
+    scale = sum(table) * 100 / sum(STANDARD_LUMINANCE_TABLE)
+    if scale <= 100:
+        quality = (200 - scale) / 2
+    else:
+        quality = 5000 / scale
+    return max(1, min(100, int(round(quality))))
+
+
+def jpeg_source_quality(input_file):
+    # The estimated quality of a JPEG input, or None for other images. Only
+    # the header is read.
+    from PIL import Image
+
+    try:
+        with Image.open(input_file) as img:
+            if img.format != 'JPEG':
+                return None
+            return estimate_jpeg_quality(getattr(img, 'quantization', None))
+    except Exception:
+        return None
+
+
+def can_copy_jpeg(source_quality, format, quality, size=None):
+    # Re-encoding a JPEG as JPEG without resizing only loses detail, and at
+    # an equal or higher quality it also makes the file bigger; the source
+    # file is the better output. EXIF data, including orientation, is kept
+    # as a side effect.
+    if source_quality is None or size or (format or '').lower() not in JPEG_FORMATS:
+        return False
+    return quality is None or quality >= source_quality
+
+
+def stream_copy_args(category, info, format, codec=None, bitrate=None):
+    # FFmpeg output options that remux the probed input (probe_media's
+    # dict) into format without re-encoding, or None when some stream must
+    # be transcoded. A bitrate, or a codec other than the source's, always
+    # means transcoding.
+    if info is None or bitrate:
+        return None
+    allowed = CONTAINER_CODECS.get((format or '').lower())
+    if allowed is None:
+        return None
+    wanted = None
+    if codec and codec != "default":
+        wanted = ENCODER_CODECS.get(codec.lower())
+        if wanted is None:
+            return None
+    # The codec option applies to the category's main stream type
+    codec_type = 'audio' if category == "Audio" else 'video'
+
+    args = []
+    subtitle_args = []
+    found = False
+    for stream in info.get('streams', []):
+        stream_type = stream.get('codec_type')
+        stream_codec = stream.get('codec_name')
+        if stream_type == 'video' and (stream.get('disposition') or {}).get('attached_pic'):
+            # Cover art travels with audio where the container allows it
+            if stream_codec not in allowed.get('cover', ()):
+                args.append('-vn')
+            continue
+        if stream_type == 'subtitle':
+            # FFmpeg only maps subtitles by default into containers that
+            # have a subtitle codec
+            if 'subtitle' not in allowed:
+                continue
+            if allowed['subtitle'] is None or stream_codec in allowed['subtitle']:
+                continue
+            target = TEXT_SUBTITLE_TARGETS.get(format.lower())
+            if target and stream_codec in TEXT_SUBTITLE_CODECS:
+                subtitle_args = ['-c:s', target]
+                continue
+            return None
+        if stream_type not in ('video', 'audio'):
+            continue
+        if stream_type == 'video' and category == "Audio":
+            args.append('-vn')
+            continue
+        if stream_type not in allowed:
+            return None
+        if allowed[stream_type] is not None and stream_codec not in allowed[stream_type]:
+            return None
+        if stream_type == codec_type:
+            if wanted is not None and stream_codec != wanted:
+                return None
+            found = True
+    if not found:
+        return None
+    return sorted(set(args)) + ['-c', 'copy'] + subtitle_args
+
+
+def probe_for_copy(category, input_file, targets):
+    # targets is a list of (format, codec, bitrate). Returns a list with the
+    # stream copy options for each target, or None where it must be
+    # transcoded; the input is only probed when some target could be copied.
+    plausible = [not bitrate and (format or '').lower() in CONTAINER_CODECS for format, _, bitrate in targets]
+    if not any(plausible) or not os.path.isfile(input_file):
+        return [None] * len(targets)
+    info = probe_media(input_file)
+    return [stream_copy_args(category, info, format, codec, bitrate) if ok else None
+            for (format, codec, bitrate), ok in zip(targets, plausible)]
@@ -0,0 +1,284 @@
+import json
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .fastio import pump
+from .metrics import stage
+
+FFMPEG = 'ffmpeg'
+FFPROBE = 'ffprobe'
+
+# Lines of FFmpeg's stderr kept for error messages
+STDERR_TAIL_LINES = 20
+
+# FFmpeg's name for reading its input from stdin
+PIPE_INPUT = 'pipe:0'
+
+# Input containers FFmpeg can decode front to back from a pipe. MP4 and MOV
+# are left out because their index may sit at the end of the file, and AVI
+# because seeking to its index is how FFmpeg finds interleaved streams.
+PIPE_INPUT_EXTENSIONS = ['.mp3', '.wav', '.ogg', '.flac', '.mkv', '.webm']
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    def __str__(self):
+        message = super().__str__()
+        if self.stderr:
+            message += f"\n{self.stderr.strip()}"
+        return message
+
+
+def cpu_count():
+    return max(1, os.cpu_count() or 1)
+
+
+def default_media_workers(category, cpus=None):
+    cpus = cpus or cpu_count()
+    if category == "Video":
+        # Video encoders are multi-threaded themselves, so fewer concurrent
+        # jobs with several threads each keeps every core busy without
+        # thrashing
+        return max(1, cpus // 4)
+    # Most audio encoders are single-threaded; one job per core
+    return cpus
+
+
+def threads_per_job(workers, cpus=None):
+    # Share the cores between the concurrent jobs so their encoder threads
+    # add up to roughly the CPU count
+    cpus = cpus or cpu_count()
+    return max(1, cpus // max(1, workers))
+
+
+def codec_args(category, codec, bitrate):
+    # Output options for one audio or video output
+    args = []
+    if codec and codec != "default":
+        args.extend(['-acodec' if category == "Audio" else '-vcodec', codec])
+    if bitrate:
+        args.extend(['-b:a' if category == "Audio" else '-b:v', bitrate])
+    return args
+
+
+def build_command(input_file, outputs, threads=None):
+    # outputs is a list of (output_file, output_args). Several outputs in
+    # one command share a single demux and decode of the input.
+    command = [FFMPEG, '-hide_banner', '-nostdin', '-y']
+    if threads:
+        command.extend(['-threads', str(threads)])
+    command.extend(['-i', input_file])
+    for output_file, output_args in outputs:
+        command.extend(output_args)
+        if threads:
+            command.extend(['-threads', str(threads)])
+        command.append(output_file)
+    return command
+
+
+def probe_duration(input_file):
+    # Duration in seconds from the container, or None when unknown
+    try:
+        with stage('ffprobe'):
+            result = subprocess.run(
+                [FFPROBE, '-v', 'error', '-show_entries', 'format=duration',
+                 '-of', 'default=noprint_wrappers=1:nokey=1', input_file],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        duration = float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+    return duration if duration > 0 else None
+
+
+def probe_media(input_file):
+    # ffprobe's format and stream details as a dict, or None when the file
+    # cannot be probed
+    try:
+        with stage('ffprobe'):
+            result = subprocess.run(
+                [FFPROBE, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', input_file],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        return json.loads(result.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def parse_out_time(value):
+    # "HH:MM:SS.micro" as reported in the out_time progress field
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def parse_progress_block(fields):
+    # Turns one block of FFmpeg -progress key=value lines into seconds of
+    # output written, frames, bytes and speed (x realtime)
+    out_time = None
+    for key in ('out_time_us', 'out_time_ms'):
+        # Both keys are in microseconds despite the name of the second
+        if fields.get(key, 'N/A') not in ('N/A', ''):
+            try:
+                out_time = int(fields[key]) / 1000000
+                break
+            except ValueError:
+                pass
+    if out_time is None and 'out_time' in fields:
+        out_time = parse_out_time(fields['out_time'])
+    
+    speed = fields.get('speed', '').rstrip('x').strip()
+    try:
+        speed = float(speed)
+    except ValueError:
+        speed = None
+    
+    def as_int(name):
+        try:
+            return int(fields.get(name, ''))
+        except ValueError:
+            return None
+    
+    return {
+        'out_time': max(0.0, out_time) if out_time is not None else None,
+        'frame': as_int('frame'),
+        'total_size': as_int('total_size'),
+        'speed': speed,
+        'done': fields.get('progress') == 'end',
+    }
+
+
+def can_pipe_input(input_file):
+    return os.path.splitext(input_file)[1].lower() in PIPE_INPUT_EXTENSIONS
+
+
+def run_ffmpeg(command, on_progress=None, source=None):
+    with stage('ffmpeg'):
+        _run_ffmpeg(command, on_progress, source)
+
+
+def _feed(source, process):
+    # Streams source, a path or a readable file descriptor such as another
+    # process's stdout, into FFmpeg's stdin. FFmpeg may stop reading early
+    # (an error, or -t), which shows up here as a broken pipe.
+    try:
+        if isinstance(source, int):
+            pump(source, process.stdin.fileno())
+        else:
+            with open(source, 'rb') as f:
+                pump(f.fileno(), process.stdin.fileno())
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _run_ffmpeg(command, on_progress=None, source=None):
+    # stderr is drained continuously so a chatty encode cannot fill the pipe
+    # and stall, but only its tail is kept for the error message.
+    #
+    # With on_progress, FFmpeg's machine-readable -progress stream is read
+    # from stdout and each block is passed on as parsed by
+    # parse_progress_block.
+    #
+    # With source, the command's input should be PIPE_INPUT: the source is
+    # fed to FFmpeg over a pipe instead of FFmpeg opening a file, so chained
+    # steps need no intermediate file on disk.
+    if on_progress is not None:
+        command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+    
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if source is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE if on_progress is not None else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace'
+    )
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    feeder = None
+    if source is not None:
+        feeder = threading.Thread(target=_feed, args=(source, process), daemon=True)
+        feeder.start()
+    
+    def drain_stderr():
+        for line in process.stderr:
+            tail.append(line)
+    
+    if on_progress is None:
+        drain_stderr()
+    else:
+        stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+        stderr_thread.start()
+        fields = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            fields[key] = value
+            if key == 'progress':
+                on_progress(parse_progress_block(fields))
+                fields = {}
+        process.stdout.close()
+        stderr_thread.join()
+    
+    process.stderr.close()
+    returncode = process.wait()
+    if feeder is not None:
+        feeder.join()
+    if returncode != 0:
+        raise FFmpegError(returncode, command, stderr=''.join(tail))
+
+
+class FFmpegScheduler:
+    # Long-lived pools of FFmpeg workers, one per media category, sized
+    # independently so a video batch cannot starve audio jobs and vice
+    # versa. The pools are created on first use and reused across batches.
+    def __init__(self, audio_workers=None, video_workers=None, cpus=None):
+        self.cpus = cpus or cpu_count()
+        self.workers = {
+            "Audio": max(1, int(audio_workers or default_media_workers("Audio", self.cpus))),
+            "Video": max(1, int(video_workers or default_media_workers("Video", self.cpus))),
+        }
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def threads_for(self, category):
+        return threads_per_job(self.workers[category], self.cpus)
+
+    def pool(self, category):
+        if category not in self.workers:
+            raise ValueError(f"Unsupported media category: {category}")
+        with self._lock:
+            if category not in self._pools:
+                self._pools[category] = ThreadPoolExecutor(
+                    max_workers=self.workers[category],
+                    thread_name_prefix=f"ffmpeg-{category.lower()}"
+                )
+            return self._pools[category]
+
+    def submit(self, category, function, *args):
+        return self.pool(category).submit(function, *args)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
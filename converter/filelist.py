@@ -0,0 +1,169 @@
+import glob
+import os
+import threading
+from array import array
+
+# Paths handed to a PathStore at a time while a directory or pattern is
+# being expanded, so readers see the list grow without waiting for the end
+INGEST_BATCH = 2000
+
+
+class PathStore:
+    # Append-only list of file paths kept compactly for batches of hundreds
+    # of thousands of files. Each directory is stored once and referenced by
+    # index; file names are packed UTF-8 in one buffer with an offset array.
+    # A path costs roughly its name's length plus 12 bytes, rather than a
+    # full Python string per entry.
+    #
+    # Appends and reads are thread-safe, so one thread can fill the store
+    # while another displays it.
+    def __init__(self, paths=None):
+        self._lock = threading.Lock()
+        self.clear()
+        if paths:
+            self.extend(paths)
+
+    def clear(self):
+        with self._lock:
+            self.dirs = []
+            self._dir_index = {}
+            self._dir_ids = array('I')
+            self._names = bytearray()
+            self._offsets = array('Q', [0])
+
+    def _append(self, path):
+        directory, name = os.path.split(path)
+        dir_id = self._dir_index.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_index[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        self._dir_ids.append(dir_id)
+        # surrogateescape keeps undecodable bytes in POSIX file names intact
+        self._names += name.encode('utf-8', 'surrogateescape')
+        self._offsets.append(len(self._names))
+
+    def append(self, path):
+        with self._lock:
+            self._append(path)
+
+    def extend(self, paths):
+        with self._lock:
+            for path in paths:
+                self._append(path)
+
+    def __len__(self):
+        return len(self._dir_ids)
+
+    def _name(self, index):
+        return self._names[self._offsets[index]:self._offsets[index + 1]].decode('utf-8', 'surrogateescape')
+
+    def name(self, index):
+        with self._lock:
+            return self._name(index)
+
+    def names(self, start, stop):
+        # File names of rows start to stop, for drawing the visible rows
+        with self._lock:
+            stop = min(stop, len(self._dir_ids))
+            return [self._name(i) for i in range(max(0, start), stop)]
+
+    def __getitem__(self, index):
+        with self._lock:
+            if index < 0:
+                index += len(self._dir_ids)
+            if not 0 <= index < len(self._dir_ids):
+                raise IndexError("path index out of range")
+            return os.path.join(self.dirs[self._dir_ids[index]], self._name(index))
+
+    def __iter__(self):
+        # Paths present when iteration starts; later appends are not seen
+        for i in range(len(self)):
+            yield self[i]
+
+
+def iter_input_files(sources, extensions=None):
+    # Yields the files named by sources, which may be files, directories
+    # (walked recursively) or glob patterns. Files found inside directories
+    # are kept only if their extension is in extensions; files named
+    # directly or matched by a pattern are always kept.
+    #
+    # Duplicates can only come from overlapping sources, so rather than
+    # remembering every path yielded, only the sources are remembered: the
+    # directories walked, whose subtrees are not walked again, and the files
+    # named one by one.
+    roots = []
+    named = set()
+    wanted = set(extensions) if extensions else None
+    for source in sources:
+        source = os.path.expanduser(source)
+        if os.path.exists(source):
+            matches = [source]
+        else:
+            matches = sorted(glob.iglob(source, recursive=True))
+        for path in matches:
+            absolute = os.path.abspath(path)
+            if os.path.isdir(path):
+                if any(_within(absolute, root) for root in roots):
+                    continue
+                inner = [root for root in roots if _within(root, absolute)]
+                roots.append(absolute)
+                for file_path in _walk(path, wanted, inner):
+                    if not named or os.path.abspath(file_path) not in named:
+                        yield file_path
+            elif os.path.isfile(path) and absolute not in named:
+                walked = wanted is None or os.path.splitext(path)[1].lower() in wanted
+                if walked and any(_within(absolute, root) for root in roots):
+                    continue
+                named.add(absolute)
+                yield path
+
+
+def _within(path, root):
+    # True when the absolute path is root or lies under it
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _walk(directory, wanted, skip=()):
+    # Depth-first with os.scandir, which gets file types from the directory
+    # listing instead of a stat per entry; names are sorted per directory
+    # so the order is stable. Subdirectories whose absolute path is in skip
+    # were walked already and are left out.
+    skip = set(skip)
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = sorted(os.scandir(current), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not skip or os.path.abspath(entry.path) not in skip:
+                        subdirs.append(entry.path)
+                elif entry.is_file() and (wanted is None or os.path.splitext(entry.name)[1].lower() in wanted):
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def ingest_paths(store, sources, extensions=None, stop=None, batch_size=INGEST_BATCH):
+    # Expands sources into store in batches and returns how many paths were
+    # added. Meant to run on a background thread; stop is an optional
+    # threading.Event that ends the expansion early.
+    added = 0
+    batch = []
+    for path in iter_input_files(sources, extensions):
+        if stop is not None and stop.is_set():
+            break
+        batch.append(path)
+        if len(batch) >= batch_size:
+            store.extend(batch)
+            added += len(batch)
+            batch = []
+    if batch and not (stop is not None and stop.is_set()):
+        store.extend(batch)
+        added += len(batch)
+    return added
@@ -0,0 +1,236 @@
+import io
+import os
+import shutil
+
+from .fastio import map_input, write_output
+from .fastpath import JPEG_FORMATS, can_copy_jpeg, jpeg_source_quality
+from .largeimage import convert_large_image, large_image_size
+from .metrics import stage
+
+# Resampling filters accepted by the 'resample' option. 'auto' picks one
+# from the scale factor, see choose_resample.
+RESAMPLE_FILTERS = ['auto', 'nearest', 'box', 'bilinear', 'hamming', 'bicubic', 'lanczos']
+
+# With a fast resize, images are first shrunk by an integer factor with
+# Image.reduce() until they are within this multiple of the target size,
+# then resampled the rest of the way
+REDUCING_GAP = 3.0
+
+# Images whose decoded pixels take up to this many bytes are encoded in
+# memory and written in one call. Larger ones are written by Pillow straight
+# to the file, so their encoded output is never held on top of the image.
+BUFFERED_SAVE_BYTES = 16 * 1024 * 1024
+
+
+def choose_resample(scale):
+    from PIL import Image
+    
+    # scale is target size / source size along the larger axis. Upscales
+    # and mild downscales keep LANCZOS; the final step of a large downscale
+    # works on an already reduced image, where a cheaper filter is
+    # indistinguishable at thumbnail sizes.
+    if scale >= 0.5:
+        return Image.LANCZOS
+    if scale >= 0.125:
+        return Image.BICUBIC
+    return Image.HAMMING
+
+
+def resample_filter(name, scale):
+    from PIL import Image
+    
+    name = (name or 'lanczos').lower()
+    if name == 'auto':
+        return choose_resample(scale)
+    if name not in RESAMPLE_FILTERS:
+        raise ValueError(f"Unsupported resampling filter: {name}")
+    return getattr(Image, name.upper())
+
+
+def open_image(input_file, target_size=None, fast_resize=False):
+    # Imported here so headless runs that never touch images skip Pillow
+    from PIL import Image
+    
+    img = Image.open(input_file)
+    if fast_resize and target_size and img.format == 'JPEG':
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale, never smaller than
+        # the target, instead of decoding every pixel and throwing most away
+        img.draft(img.mode, target_size)
+    return img
+
+
+def load_image(input_file, target_size=None, fast_resize=False):
+    # Opens and fully decodes input_file, reading it through a memory map
+    # when it is large enough for that to pay off
+    from PIL import UnidentifiedImageError
+    
+    with map_input(input_file) as source:
+        try:
+            img = open_image(source, target_size, fast_resize)
+        except UnidentifiedImageError:
+            # Name the file rather than the mapping
+            raise UnidentifiedImageError(f"cannot identify image file {input_file!r}") from None
+        img.load()
+    return img
+
+
+def resize_image(img, size, fast_resize=False, resample=None):
+    scale = max(size[0] / img.width, size[1] / img.height)
+    resample = resample_filter(resample, scale)
+    if fast_resize:
+        return img.resize(size, resample, reducing_gap=REDUCING_GAP)
+    return img.resize(size, resample)
+
+
+def parse_dimensions(dimensions):
+    try:
+        width, height = int(dimensions[0]), int(dimensions[1])
+    except (ValueError, TypeError, IndexError):
+        return None  # Skip if dimensions are invalid
+    if width < 1 or height < 1:
+        return None
+    return width, height
+
+
+def save_image(img, output_file, format, quality):
+    # Small images are encoded in memory and written in one preallocated
+    # write rather than the many small writes Pillow makes to a file
+    if img.width * img.height * len(img.getbands()) > BUFFERED_SAVE_BYTES:
+        encode_image(img, output_file, format, quality)
+        return
+    buffer = io.BytesIO()
+    encode_image(img, buffer, format, quality)
+    write_output(output_file, buffer.getbuffer())
+
+
+def encode_image(img, output_file, format, quality):
+    # Handle special cases for different formats
+    if format.lower() == 'jpg':
+        if img.mode == 'RGBA':
+            img = img.convert('RGB')
+        img.save(output_file, format='JPEG', quality=quality)
+    elif format.lower() == 'png':
+        img.save(output_file, format='PNG', optimize=True)
+    elif format.lower() == 'webp':
+        img.save(output_file, format='WEBP', quality=quality)
+    else:
+        img.save(output_file, format=format.upper())
+
+
+def convert_image(input_file, output_file, format, quality, resize, dimensions,
+                  fast_resize=False, resample=None, fast_path=True):
+    size = parse_dimensions(dimensions) if resize and dimensions else None
+    if fast_path and not size and format.lower() in JPEG_FORMATS:
+        if can_copy_jpeg(jpeg_source_quality(input_file), format, quality):
+            with stage('copy'):
+                shutil.copyfile(input_file, output_file)
+            return
+    if large_image_size(input_file):
+        # Gigapixel scans are converted in bands rather than decoded whole
+        convert_large_image(input_file, output_file, format, quality, size, resample)
+        return
+    with stage('decode'):
+        img = load_image(input_file, size, fast_resize)
+    
+    # Apply resize if needed
+    if size:
+        with stage('resize'):
+            img = resize_image(img, size, fast_resize, resample)
+    
+    with stage('encode'):
+        save_image(img, output_file, format, quality)
+
+
+def parse_rendition(spec):
+    # "FORMAT[:QUALITY][:WIDTHxHEIGHT]", e.g. "webp:80:800x600", "png::64x64"
+    parts = spec.split(':')
+    if not parts[0] or len(parts) > 3:
+        raise ValueError(f"Invalid rendition '{spec}', expected FORMAT[:QUALITY][:WIDTHxHEIGHT]")
+    
+    rendition = {'format': parts[0].lower(), 'quality': 85, 'dimensions': None}
+    if len(parts) > 1 and parts[1]:
+        rendition['quality'] = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        dimensions = parse_dimensions(parts[2].lower().split('x'))
+        if dimensions is None:
+            raise ValueError(f"Invalid rendition dimensions '{parts[2]}'")
+        rendition['dimensions'] = dimensions
+    return rendition
+
+
+def rendition_paths(input_file, output_dir, renditions):
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    names = []
+    for rendition in renditions:
+        name = base_name
+        if rendition.get('dimensions'):
+            name += "_{}x{}".format(*rendition['dimensions'])
+        names.append((name, rendition['format']))
+    
+    paths = []
+    for (name, format), rendition in zip(names, renditions):
+        if names.count((name, format)) > 1:
+            # Same format and size at different qualities
+            name += f"_q{rendition.get('quality')}"
+        paths.append(os.path.join(output_dir, f"{name}.{format}"))
+    return paths
+
+
+def render_renditions(input_file, output_dir, renditions, fast_resize=False, resample=None, fast_path=True):
+    # Decode the source once and write every (format, quality, dimensions)
+    # target from memory. Returns the output paths in rendition order.
+    renditions = [parse_rendition(r) if isinstance(r, str) else r for r in renditions]
+    paths = rendition_paths(input_file, output_dir, renditions)
+    
+    # Full-size JPEG renditions of a JPEG at no higher quality are copies
+    # of the source
+    copies = set()
+    if fast_path and any(not r.get('dimensions') and r['format'] in JPEG_FORMATS for r in renditions):
+        source_quality = jpeg_source_quality(input_file)
+        copies = {i for i, r in enumerate(renditions)
+                  if can_copy_jpeg(source_quality, r['format'], r.get('quality'), r.get('dimensions'))}
+    for i in copies:
+        with stage('copy'):
+            shutil.copyfile(input_file, paths[i])
+    pending = [i for i in range(len(renditions)) if i not in copies]
+    if not pending:
+        return paths
+    if large_image_size(input_file):
+        # One banded pass per rendition; each holds a band, not the image
+        for i in pending:
+            convert_large_image(input_file, paths[i], renditions[i]['format'], renditions[i].get('quality'),
+                                renditions[i].get('dimensions'), resample)
+        return paths
+    
+    sizes = [r.get('dimensions') for r in renditions]
+    draft_size = None
+    if all(sizes[i] for i in pending):
+        # Draft decoding must still cover the largest target
+        draft_size = (max(sizes[i][0] for i in pending), max(sizes[i][1] for i in pending))
+    with stage('decode'):
+        img = load_image(input_file, draft_size, fast_resize)
+    
+    # Work from the largest target down so each downscale can start from
+    # the smallest intermediate that still covers it, rather than the
+    # full-size source
+    intermediates = {img.size: img}
+    order = sorted(pending,
+                   key=lambda i: -(sizes[i][0] * sizes[i][1]) if sizes[i] else -float('inf'))
+    for i in order:
+        size = sizes[i]
+        if size is None:
+            rendered = img
+        elif size in intermediates:
+            rendered = intermediates[size]
+        else:
+            candidates = [
+                source for source_size, source in intermediates.items()
+                if source_size[0] >= size[0] and source_size[1] >= size[1]
+            ]
+            source = min(candidates, key=lambda s: s.width * s.height) if candidates else img
+            with stage('resize'):
+                rendered = resize_image(source, size, fast_resize, resample)
+            intermediates[size] = rendered
+        with stage('encode'):
+            save_image(rendered, paths[i], renditions[i]['format'], renditions[i].get('quality'))
+    return paths
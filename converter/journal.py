@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from .cache import DEFAULT_CACHE_DIR
+
+DEFAULT_JOURNAL_PATH = os.path.join(DEFAULT_CACHE_DIR, "journal.sqlite")
+
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+
+def temp_output_path(output_file):
+    # A hidden name next to the final output, on the same filesystem so it
+    # can be renamed into place atomically. The extension is kept because
+    # FFmpeg picks the container from it.
+    directory, name = os.path.split(output_file)
+    base_name, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{base_name}.{uuid.uuid4().hex[:12]}.part{ext}")
+
+
+def move_into_place(source, output_file):
+    # Moves a finished file to output_file without a window in which a
+    # partial copy is visible there, even across filesystems
+    temp_file = temp_output_path(output_file)
+    try:
+        shutil.move(source, temp_file)
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def _temp_output_of(name, wanted):
+    # True when name is a temp_output_path name, '.BASE.<anything>.partEXT',
+    # for one of the (base, ext) pairs in wanted
+    if not name.startswith('.'):
+        return False
+    end = name.find('.part')
+    while end != -1:
+        ext = name[end + 5:]
+        dot = name.find('.', 1)
+        while 0 < dot < end:
+            if (name[1:dot], ext) in wanted:
+                return True
+            dot = name.find('.', dot + 1)
+        end = name.find('.part', end + 1)
+    return False
+
+
+def remove_temp_outputs(output_files):
+    # Clears temporary outputs left behind by a run that was killed. Each
+    # directory is listed once however many outputs it holds.
+    wanted = {}
+    for output_file in output_files:
+        directory, name = os.path.split(output_file)
+        wanted.setdefault(directory, set()).add(os.path.splitext(name))
+    for directory, names in wanted.items():
+        try:
+            with os.scandir(directory or '.') as entries:
+                paths = [entry.path for entry in entries if _temp_output_of(entry.name, names)]
+        except OSError:
+            continue
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def remove_job_temp_outputs(jobs):
+    # remove_temp_outputs for (input, output) jobs, including the staging
+    # directory multi-output jobs create, named after the input
+    output_files = []
+    for input_file, output_file in jobs:
+        output_files.append(output_file)
+        if os.path.isdir(output_file):
+            output_files.append(os.path.join(output_file, os.path.splitext(os.path.basename(input_file))[0]))
+    remove_temp_outputs(output_files)
+
+
+class JobJournal:
+    # Durable record of every batch and the state of each of its files, so a
+    # batch that crashed or was cancelled can be resumed where it stopped.
+    #
+    # Jobs start 'pending'. Each attempt at a batch marks the jobs it is
+    # about to run 'running' and bumps their attempt count; they move to
+    # 'done' or 'failed' as results arrive. After a crash, whatever is still
+    # pending or running is what a resume runs.
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or DEFAULT_JOURNAL_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            " id TEXT PRIMARY KEY,"
+            " category TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " finished REAL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " batch_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " input TEXT NOT NULL,"
+            " output TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (batch_id, seq))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (batch_id, state)")
+        # Jobs are finished by input path
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_input ON jobs (batch_id, input)")
+        self.db.commit()
+
+    def create_batch(self, category, jobs, options):
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO batches (id, category, options, created) VALUES (?, ?, ?, ?)",
+                (batch_id, category, json.dumps(options, default=str), now)
+            )
+            self.db.executemany(
+                "INSERT INTO jobs (batch_id, seq, input, output, state, updated) VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(batch_id, seq, input_file, output_file, now) for seq, (input_file, output_file) in enumerate(jobs)]
+            )
+            self.db.commit()
+        return batch_id
+
+    def batch(self, batch_id):
+        # Returns (category, options) for a batch, or None
+        row = self.db.execute("SELECT category, options FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def unfinished_batches(self):
+        # Batches with work left, newest first, as dicts with job counts
+        rows = self.db.execute(
+            "SELECT b.id, b.category, b.created,"
+            " SUM(j.state IN ('pending', 'running')), SUM(j.state = 'done'),"
+            " SUM(j.state = 'failed'), COUNT(*)"
+            " FROM batches b JOIN jobs j ON j.batch_id = b.id"
+            " WHERE b.finished IS NULL GROUP BY b.id"
+            " HAVING SUM(j.state IN ('pending', 'running')) > 0"
+            " ORDER BY b.created DESC"
+        ).fetchall()
+        return [{'id': batch_id, 'category': category, 'created': created,
+                 'remaining': remaining, 'done': done, 'failed': failed, 'total': total}
+                for batch_id, category, created, remaining, done, failed, total in rows]
+
+    def remaining_jobs(self, batch_id, retry_failed=False):
+        states = ('pending', 'running', 'failed') if retry_failed else ('pending', 'running')
+        rows = self.db.execute(
+            f"SELECT input, output FROM jobs WHERE batch_id = ? AND state IN ({','.join('?' * len(states))})"
+            " ORDER BY seq",
+            (batch_id,) + states
+        ).fetchall()
+        return [(input_file, output_file) for input_file, output_file in rows]
+
+    def start(self, batch_id, jobs):
+        # Marks the jobs of this attempt as running and clears any partial
+        # outputs an earlier, interrupted attempt left behind
+        now = time.time()
+        remove_job_temp_outputs(jobs)
+        with self._lock:
+            self.db.execute("UPDATE batches SET finished = NULL WHERE id = ?", (batch_id,))
+            self.db.executemany(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, error = NULL, updated = ?"
+                " WHERE batch_id = ? AND input = ?",
+                [(now, batch_id, input_file) for input_file, _ in jobs]
+            )
+            self.db.commit()
+
+    def finish_job(self, batch_id, input_file, error=None):
+        with self._lock:
+            self.db.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE batch_id = ? AND input = ?",
+                ('done' if error is None else 'failed',
+                 None if error is None else f"{type(error).__name__}: {error}",
+                 time.time(), batch_id, input_file)
+            )
+            self.db.commit()
+
+    def finish_batch(self, batch_id):
+        # Called once every job has a result; failed jobs can still be
+        # retried by resuming the batch explicitly
+        with self._lock:
+            self.db.execute("UPDATE batches SET finished = ? WHERE id = ?", (time.time(), batch_id))
+            self.db.commit()
+
+    def counts(self, batch_id):
+        rows = self.db.execute("SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state", (batch_id,))
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(dict(rows.fetchall()))
+        return counts
+
+    def close(self):
+        with self._lock:
+            self.db.close()
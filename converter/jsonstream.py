@@ -0,0 +1,280 @@
+import io
+import json
+import os
+import re
+
+# Incremental reader for JSON inputs too large to parse in one go: the
+# elements of a top-level array, or JSON Lines, are decoded one record at a
+# time from a sliding text buffer and handed on in batches.
+
+# Characters read from the file per step
+READ_BLOCK = 1024 * 1024
+
+# Joins the keys of nested objects when records are flattened
+FLATTEN_SEP = '.'
+
+# Characters json_layout looks at to tell a single object from JSON Lines
+LAYOUT_PEEK = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_COMMA = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+
+
+class JSONRecordReader:
+    # Detects the layout of a JSON file from its first value:
+    #   'array'  - a top-level array, read element by element
+    #   'lines'  - JSON Lines, or any run of whitespace-separated values
+    #   'object' - a single top-level object, which cannot be split up and
+    #              is left to pandas' whole-file reader
+    # .jsonl files are always read as lines. Iterating yields (record, text)
+    # for array and lines layouts, where text is the record's JSON source.
+    def __init__(self, input_file, encoding=None):
+        self.input_file = input_file
+        self.src = open(input_file, 'r', encoding=encoding or 'utf-8')
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._first = None
+        try:
+            self.layout = self._detect()
+        except Exception:
+            self.src.close()
+            raise
+
+    def _fill(self, size=None):
+        # Drops what has been consumed and appends the next block; False at
+        # the end of the file
+        if self.eof:
+            return False
+        block = self.src.read(size or READ_BLOCK)
+        if not block:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        # The next character that is not whitespace, or '' at the end
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _decode(self):
+        size = READ_BLOCK
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                end = None
+            # A number at the very end of the buffer may continue in the
+            # next block
+            if end is not None and (end < len(self.buffer) or self.eof):
+                break
+            if not self._fill(size) and end is None:
+                # Raises the decoder's error for the truncated value
+                self.decoder.raw_decode(self.buffer, self.pos)
+            # Values longer than a block are re-read in doubling steps, so
+            # one huge record costs linear rather than quadratic time
+            size = max(size, len(self.buffer))
+        text = self.buffer[self.pos:end]
+        self.pos = end
+        return value, text
+
+    def _detect(self):
+        if self._peek() == '\ufeff':
+            self.pos += 1
+        first = self._peek()
+        if os.path.splitext(self.input_file)[1].lower() == '.jsonl':
+            return 'lines'
+        if first == '[':
+            self.pos += 1
+            return 'array'
+        if not first:
+            raise ValueError(f"No JSON data in {self.input_file}")
+        self._first = self._decode()
+        if isinstance(self._first[0], dict) and not self._peek():
+            return 'object'
+        return 'lines'
+
+    def __iter__(self):
+        # The separators between records are matched inline while they sit
+        # in the buffer; _peek only runs at block boundaries and the end
+        if self.layout == 'array':
+            if self._peek() == ']':
+                self.pos += 1
+            else:
+                while True:
+                    yield self._decode()
+                    match = _COMMA.match(self.buffer, self.pos)
+                    if match and match.end() < len(self.buffer):
+                        self.pos = match.end()
+                        continue
+                    char = self._peek()
+                    if char == ']':
+                        self.pos += 1
+                        break
+                    if char != ',':
+                        raise ValueError(f"Expected ',' or ']' between records in {self.input_file}")
+                    self.pos += 1
+                    self._peek()
+            if self._peek():
+                raise ValueError(f"Unexpected data after the top-level array in {self.input_file}")
+        elif self.layout == 'lines':
+            if self._first is not None:
+                first, self._first = self._first, None
+                yield first
+            while self._peek():
+                yield self._decode()
+                end = _WHITESPACE.match(self.buffer, self.pos).end()
+                while end < len(self.buffer):
+                    self.pos = end
+                    yield self._decode()
+                    end = _WHITESPACE.match(self.buffer, self.pos).end()
+        else:
+            raise ValueError(f"{self.input_file} holds a single JSON object, not a list of records")
+
+    def close(self):
+        self.src.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def json_layout(input_file, encoding=None):
+    # The layout JSONRecordReader would detect, from the first LAYOUT_PEEK
+    # characters alone, so a file that is then read whole by pandas is not
+    # decoded twice. A first value that runs past them is taken for a single
+    # object; JSON Lines records are rarely that large, and pandas reports a
+    # file that turns out not to be one.
+    if os.path.splitext(input_file)[1].lower() == '.jsonl':
+        return 'lines'
+    with open(input_file, 'r', encoding=encoding or 'utf-8') as src:
+        prefix = src.read(LAYOUT_PEEK)
+        complete = not src.read(1)
+    text = prefix.lstrip(' \t\n\r').lstrip('\ufeff').lstrip(' \t\n\r')
+    if not text:
+        if complete:
+            raise ValueError(f"No JSON data in {input_file}")
+        return 'object'
+    if text[0] == '[':
+        return 'array'
+    try:
+        value, end = json.JSONDecoder().raw_decode(text)
+    except json.JSONDecodeError:
+        if complete:
+            raise
+        return 'object'
+    if isinstance(value, dict) and not text[end:].strip(' \t\n\r'):
+        return 'object'
+    return 'lines'
+
+
+def flatten_record(record, sep=FLATTEN_SEP, prefix=''):
+    # {'a': {'b': 1}} -> {'a.b': 1}. Lists and empty objects are kept as
+    # values.
+    if not isinstance(record, dict):
+        return record
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten_record(value, sep, name + sep))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _record_columns(record):
+    if isinstance(record, dict):
+        return record.keys()
+    if isinstance(record, list):
+        return range(len(record))
+    return [0]
+
+
+def scan_columns(input_file, encoding=None, flatten=False):
+    # Returns (columns, sparse): every column in the file in order of first
+    # appearance, as a DataFrame built from all records at once would have
+    # them, and the set of those some record lacks. Streamed text outputs
+    # write their header before the later records are read, so records that
+    # introduce keys late need this first pass. (None, None) for a single
+    # top-level object, which is never split.
+    counts = {}
+    total = 0
+    with JSONRecordReader(input_file, encoding) as reader:
+        if reader.layout == 'object':
+            return None, None
+        for record, _ in reader:
+            if flatten:
+                record = flatten_record(record)
+            for name in _record_columns(record):
+                counts[name] = counts.get(name, 0) + 1
+            total += 1
+    return list(counts), {name for name, count in counts.items() if count < total}
+
+
+def records_frame(batch, flatten=False):
+    # A DataFrame from a batch of flattened records, or of record source
+    # texts. Unflattened records go through pd.read_json, so each batch gets
+    # the same type conversions as reading the whole file with pandas.
+    import pandas as pd
+
+    if flatten:
+        return pd.DataFrame(batch)
+    return pd.read_json(io.StringIO('[' + ','.join(batch) + ']'), convert_axes=False)
+
+
+def _align(frame, columns, sparse, seen=None):
+    # Gives a batch the columns of the whole file. Integer columns that are
+    # missing from some record anywhere in the file are made float, as they
+    # are when the file is read whole, even if this batch has them all.
+    # Without columns, batches get every column seen so far instead, in
+    # order of first appearance, as they go.
+    if columns is None:
+        seen.update(dict.fromkeys(frame.columns))
+        if list(seen) == list(frame.columns):
+            return frame
+        return frame.reindex(columns=list(seen))
+    frame = frame.reindex(columns=columns)
+    for name in sparse or ():
+        if frame[name].dtype.kind in 'iu':
+            frame[name] = frame[name].astype('float64')
+    return frame
+
+
+def iter_json_frames(input_file, encoding=None, chunk_size=None, flatten=False, columns=None, sparse=None):
+    # Yields DataFrames of up to chunk_size records (all of them at once
+    # without a chunk size), aligned to columns and sparse from
+    # scan_columns when given. Otherwise each one has the columns of the
+    # batches before it, but not those that only appear later.
+    import pandas as pd
+
+    with JSONRecordReader(input_file, encoding) as reader:
+        if reader.layout == 'object':
+            yield pd.read_json(input_file, encoding=encoding or 'utf-8')
+            return
+        # Only what the frame is built from is kept: flattened records, or
+        # the source text of each record
+        batch = []
+        seen = {}
+        yielded = False
+        for record, text in reader:
+            batch.append(flatten_record(record) if flatten else text)
+            if chunk_size and len(batch) >= chunk_size:
+                frame = records_frame(batch, flatten)
+                batch = []
+                yielded = True
+                yield _align(frame, columns, sparse, seen)
+        if batch or not yielded:
+            frame = records_frame(batch, flatten)
+            yield _align(frame, columns, sparse, seen)
@@ -0,0 +1,533 @@
+import contextlib
+import math
+import os
+import struct
+import zlib
+
+from .metrics import stage
+
+# Images with at least this many pixels are converted a band of rows at a
+# time instead of being decoded whole
+LARGE_IMAGE_PIXELS = 8192 * 8192
+
+# Smaller files are not opened to check their dimensions; even a heavily
+# compressed image of LARGE_IMAGE_PIXELS is bigger than this
+LARGE_FILE_BYTES = 4 * 1024 * 1024
+
+# Decoded source rows held per band. With the resized band and encoder
+# buffers, a few times this bounds a band conversion's memory whatever the
+# image's dimensions.
+BAND_BYTES = 32 * 1024 * 1024
+
+# Rows per piece when one uncompressed block of pixel data is split into
+# bands
+SPLIT_ROWS = 16
+
+# Edge of the tiles in TIFF output, and the zlib level tiles and PNG rows
+# are compressed at
+TILE_SIZE = 256
+DEFLATE_LEVEL = 6
+
+# Output formats written band by band. Others are assembled in memory at
+# the output size, which is bounded by the target dimensions rather than
+# the source's.
+STREAMED_FORMATS = ['tiff', 'png']
+
+# Largest resampling filter support (LANCZOS) in source pixels at scale 1;
+# a band decodes this many rows beyond its edges, scaled by the reduction
+FILTER_SUPPORT = 3
+
+# Resampling options mapped to libvips kernels
+VIPS_KERNELS = {
+    'auto': 'lanczos3',
+    'nearest': 'nearest',
+    'box': 'linear',
+    'bilinear': 'linear',
+    'hamming': 'lanczos2',
+    'bicubic': 'cubic',
+    'lanczos': 'lanczos3',
+}
+
+# Bits per pixel of raw modes Pillow reads without a stride, for splitting
+# uncompressed pixel data into rows
+RAWMODE_BITS = {
+    '1': 1, '1;I': 1, 'L': 8, 'L;I': 8, 'P': 8, 'LA': 16, 'I;16': 16, 'I;16B': 16, 'I;16L': 16, 'I;16N': 16,
+    'RGB': 24, 'BGR': 24, 'RGBA': 32, 'RGBa': 32, 'RGBX': 32, 'BGRA': 32, 'BGRX': 32, 'CMYK': 32,
+}
+
+# Modes written to each streamed format as they are; others are converted
+PNG_MODES = {'L': (0, 8), 'I;16': (0, 16), 'RGB': (2, 8), 'LA': (4, 8), 'RGBA': (6, 8)}
+TIFF_MODES = {
+    # mode: (bits per sample, samples per pixel, photometric interpretation, extra samples)
+    'L': (8, 1, 1, None),
+    'I;16': (16, 1, 1, None),
+    'LA': (8, 2, 1, 2),
+    'RGB': (8, 3, 2, None),
+    'RGBA': (8, 4, 2, 2),
+    'CMYK': (8, 4, 5, None),
+}
+
+
+def has_pyvips():
+    try:
+        import pyvips  # noqa: F401
+    except (ImportError, OSError):
+        # OSError: the binding is installed but libvips is not
+        return False
+    return True
+
+
+@contextlib.contextmanager
+def open_unbounded(input_file):
+    # Image.open without Pillow's decompression bomb check, which rejects
+    # images over ~179 megapixels even when they are never decoded whole
+    from PIL import Image
+
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        img = Image.open(input_file)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    with img:
+        yield img
+
+
+def large_image_size(input_file):
+    # (width, height) of an image convert_large_image can convert without
+    # decoding it whole, or None for ordinary images
+    try:
+        if os.path.getsize(input_file) < LARGE_FILE_BYTES:
+            return None
+        with open_unbounded(input_file) as img:
+            if img.width * img.height < LARGE_IMAGE_PIXELS:
+                return None
+            if not has_pyvips() and band_layout(img) is None:
+                return None
+            return img.size
+    except Exception:
+        return None
+
+
+def large_image_memory(format, size):
+    # Estimated peak memory of convert_large_image writing format at size
+    memory = 4 * BAND_BYTES
+    if (format or '').lower() not in STREAMED_FORMATS:
+        memory += size[0] * size[1] * 4
+    return memory
+
+
+def band_layout(img):
+    # The image's pixel data as horizontal slices Pillow can decode on
+    # their own: a list of (top, bottom, tiles) in row order. None when it
+    # cannot be split, e.g. compressed TIFFs, which Pillow hands to libtiff
+    # whole.
+    tiles = list(img.tile)
+    if not tiles or any(tile[0] != 'raw' for tile in tiles):
+        return None
+    if len(tiles) == 1:
+        return _split_raw_tile(img, tiles[0])
+    rows = {}
+    for tile in tiles:
+        x0, y0, x1, y1 = tile[1]
+        rows.setdefault((y0, y1), []).append(tile)
+    layout = [(top, bottom, rows[top, bottom]) for top, bottom in sorted(rows)]
+    for (_, bottom, _), (top, _, _) in zip(layout, layout[1:]):
+        if top < bottom:
+            return None
+    return layout
+
+
+def _split_raw_tile(img, tile):
+    # One block of uncompressed rows (single-strip TIFF, BMP, PPM) as
+    # SPLIT_ROWS-row pieces, each pointing at its own offset in the file
+    name, extents, offset, args = tile
+    if tuple(extents) != (0, 0, img.width, img.height):
+        return None
+    if isinstance(args, str):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    ystep = args[2] if len(args) > 2 else 1
+    if not stride:
+        if rawmode not in RAWMODE_BITS:
+            return None
+        stride = (img.width * RAWMODE_BITS[rawmode] + 7) // 8
+    layout = []
+    for top in range(0, img.height, SPLIT_ROWS):
+        bottom = min(img.height, top + SPLIT_ROWS)
+        # Bottom-up data (ystep -1) stores the last row first
+        row = top if ystep == 1 else img.height - bottom
+        piece = _retile(tile, (0, top, img.width, bottom), offset + row * stride, (rawmode, stride, ystep))
+        layout.append((top, bottom, [piece]))
+    return layout
+
+
+def _retile(tile, extents, offset=None, args=None):
+    offset = tile[2] if offset is None else offset
+    args = tile[3] if args is None else args
+    if hasattr(tile, '_replace'):
+        return tile._replace(extents=extents, offset=offset, args=args)
+    return (tile[0], extents, offset, args)
+
+
+class BandReader:
+    # Decodes horizontal bands of an image whose pixel data Pillow reads as
+    # uncompressed strips or tiles, touching only the strips a band needs.
+    # Each band reopens the file and narrows Pillow's tile list and size to
+    # those strips before loading.
+    def __init__(self, input_file):
+        self.input_file = input_file
+        with open_unbounded(input_file) as img:
+            self.size = img.size
+            self.mode = img.mode
+            self.layout = band_layout(img)
+        if self.layout is None:
+            raise ValueError(f"{input_file} cannot be read in bands")
+
+    def read(self, top, bottom):
+        pieces = [piece for piece in self.layout if piece[0] < bottom and piece[1] > top]
+        first, last = pieces[0][0], pieces[-1][1]
+        with open_unbounded(self.input_file) as img:
+            img.tile = [
+                _retile(tile, (tile[1][0], tile[1][1] - first, tile[1][2], tile[1][3] - first))
+                for _, _, tiles in pieces for tile in tiles
+            ]
+            # Private, but the only way to decode part of an image: Pillow
+            # allocates and fills an image of this size from the tiles (the
+            # TIFF plugin sizes it from _tile_size)
+            img._size = (img.width, last - first)
+            if hasattr(img, '_tile_size'):
+                img._tile_size = img._size
+            img.load()
+            return img.crop((0, top - first, img.width, bottom - first))
+
+
+class PngWriter:
+    # Writes a PNG a band of rows at a time. Rows use the Up filter, which
+    # suits photographs and scans, and go through one zlib stream into
+    # IDAT chunks as they are compressed.
+    def __init__(self, path, size, mode):
+        color_type, depth = PNG_MODES[mode]
+        self.mode = mode
+        self.previous = None
+        self.compressor = zlib.compressobj(DEFLATE_LEVEL)
+        self.file = open(path, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', size[0], size[1], depth, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data
+                        + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write(self, band):
+        import numpy as np
+
+        raw = band.tobytes('raw', 'I;16B') if self.mode == 'I;16' else band.tobytes()
+        rows = np.frombuffer(raw, dtype=np.uint8).reshape(band.height, -1)
+        above = np.empty_like(rows)
+        above[0] = 0 if self.previous is None else self.previous
+        above[1:] = rows[:-1]
+        filtered = np.empty((band.height, rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(rows, above, out=filtered[:, 1:])
+        self.previous = rows[-1].copy()
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        self._chunk(b'IDAT', self.compressor.flush())
+        self._chunk(b'IEND', b'')
+        self.file.close()
+
+
+class _RowBuffer:
+    # Rows waiting to make up a full tile row or an even number of rows
+    def __init__(self):
+        self.image = None
+
+    @property
+    def height(self):
+        return 0 if self.image is None else self.image.height
+
+    def append(self, band):
+        if self.image is None:
+            self.image = band
+            return
+        from PIL import Image
+
+        joined = Image.new(band.mode, (band.width, self.image.height + band.height))
+        joined.paste(self.image, (0, 0))
+        joined.paste(band, (0, self.image.height))
+        self.image = joined
+
+    def take(self, rows):
+        taken = self.image.crop((0, 0, self.image.width, rows))
+        if rows >= self.image.height:
+            self.image = None
+        else:
+            self.image = self.image.crop((0, rows, self.image.width, self.image.height))
+        return taken
+
+
+def _halve(band):
+    # 2x2 average; Image.reduce has no 16-bit mode, so those go through 'I'
+    if band.mode == 'I;16':
+        return band.convert('I').reduce(2).convert('I;16')
+    return band.reduce(2)
+
+
+class _TiffLevel:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.tiles = _RowBuffer()
+        self.reduce = _RowBuffer()
+        self.offsets = []
+        self.counts = []
+
+
+class TiledTiffWriter:
+    # Writes a tiled, deflate-compressed TIFF from bands of rows. With
+    # pyramid, half-size levels down to a single tile are built from the
+    # same bands by 2x2 averaging and stored as further pages marked as
+    # reduced-resolution images (NewSubfileType 1), which is how slide and
+    # map viewers find them. Only a tile row per level is held in memory.
+    # Files that could pass 4 GB are written as BigTIFF.
+    def __init__(self, path, size, mode, pyramid=True):
+        self.mode = mode
+        bits, samples, _, _ = TIFF_MODES[mode]
+        self.bigtiff = size[0] * size[1] * bits * samples // 8 * 4 // 3 >= 2 ** 31
+        self.levels = [_TiffLevel(*size)]
+        while pyramid and max(self.levels[-1].width, self.levels[-1].height) > TILE_SIZE:
+            last = self.levels[-1]
+            self.levels.append(_TiffLevel((last.width + 1) // 2, (last.height + 1) // 2))
+        self.file = open(path, 'w+b')
+        # The header's first-IFD offset is filled in once the IFDs are
+        # written at the end
+        self.file.write(b'II+\x00' + struct.pack('<HHQ', 8, 0, 0) if self.bigtiff else b'II*\x00\x00\x00\x00\x00')
+
+    def write(self, band):
+        self._feed(0, band)
+
+    def _feed(self, index, band, final=False):
+        level = self.levels[index]
+        if band is not None:
+            level.tiles.append(band)
+        while level.tiles.height >= TILE_SIZE or (final and level.tiles.height):
+            self._write_tile_row(level, level.tiles.take(min(TILE_SIZE, level.tiles.height)))
+        if index + 1 == len(self.levels):
+            return
+        if band is not None:
+            level.reduce.append(band)
+        # Pass on an even number of rows so 2x2 blocks never straddle bands
+        rows = level.reduce.height if final else level.reduce.height // 2 * 2
+        reduced = None
+        if rows:
+            reduced = _halve(level.reduce.take(rows))
+        if reduced is not None or final:
+            self._feed(index + 1, reduced, final)
+
+    def _write_tile_row(self, level, rows):
+        for x in range(0, level.width, TILE_SIZE):
+            # Edge tiles are padded to the full tile size, as TIFF requires
+            tile = rows.crop((x, 0, x + TILE_SIZE, TILE_SIZE))
+            raw = tile.tobytes()
+            data = zlib.compress(raw, DEFLATE_LEVEL)
+            level.offsets.append(self.file.tell())
+            level.counts.append(len(data))
+            self.file.write(data)
+
+    def close(self):
+        self._feed(0, None, final=True)
+        bits, samples, photometric, extra = TIFF_MODES[self.mode]
+        offset_type = 16 if self.bigtiff else 4
+        next_field = None
+        for index, level in enumerate(self.levels):
+            entries = [
+                (254, 4, [1 if index else 0]),
+                (256, 4, [level.width]),
+                (257, 4, [level.height]),
+                (258, 3, [bits] * samples),
+                (259, 3, [8]),
+                (262, 3, [photometric]),
+                (277, 3, [samples]),
+                (284, 3, [1]),
+                (322, 4, [TILE_SIZE]),
+                (323, 4, [TILE_SIZE]),
+                (324, offset_type, level.offsets),
+                (325, offset_type, level.counts),
+            ]
+            if extra is not None:
+                entries.append((338, 3, [extra]))
+            self.file.seek(0, os.SEEK_END)
+            ifd_offset = self.file.tell()
+            self._patch(next_field, ifd_offset)
+            next_field = self._write_ifd(ifd_offset, entries)
+        self.file.close()
+
+    def _patch(self, field, value):
+        # field is the position of an IFD offset: the header's, or the
+        # previous IFD's next-IFD offset
+        self.file.seek((8 if self.bigtiff else 4) if field is None else field)
+        self.file.write(struct.pack('<Q' if self.bigtiff else '<I', value))
+        self.file.seek(0, os.SEEK_END)
+
+    def _write_ifd(self, ifd_offset, entries):
+        # Returns the position of this IFD's next-IFD offset
+        count_format, entry_size, slot = ('<Q', 20, 8) if self.bigtiff else ('<H', 12, 4)
+        formats = {3: 'H', 4: 'I', 16: 'Q'}
+        header_size = struct.calcsize(count_format)
+        next_field = ifd_offset + header_size + entry_size * len(entries)
+        data_offset = next_field + slot
+        ifd = bytearray(struct.pack(count_format, len(entries)))
+        extra = bytearray()
+        for tag, kind, values in entries:
+            data = struct.pack(f'<{len(values)}{formats[kind]}', *values)
+            ifd += struct.pack('<HH', tag, kind)
+            ifd += struct.pack('<Q' if self.bigtiff else '<I', len(values))
+            if len(data) <= slot:
+                ifd += data.ljust(slot, b'\0')
+            else:
+                # Word-aligned, as the specification asks
+                if (data_offset + len(extra)) % 2:
+                    extra += b'\0'
+                ifd += struct.pack('<Q' if self.bigtiff else '<I', data_offset + len(extra))
+                extra += data
+        ifd += b'\0' * slot
+        self.file.write(ifd + extra)
+        return next_field
+
+
+class InMemoryWriter:
+    # For formats Pillow can only encode from a whole image: bands are
+    # pasted into an image of the output size and encoded at the end
+    def __init__(self, path, size, mode, format, quality):
+        from PIL import Image
+
+        self.path = path
+        self.format = format
+        self.quality = quality
+        self.image = Image.new(mode, size)
+        self.top = 0
+
+    def write(self, band):
+        self.image.paste(band, (0, self.top))
+        self.top += band.height
+
+    def close(self):
+        from .images import save_image
+
+        save_image(self.image, self.path, self.format, self.quality)
+
+
+def output_mode(mode, format, has_transparency=False):
+    # The mode bands are converted to before they are written
+    modes = {'png': PNG_MODES, 'tiff': TIFF_MODES}.get(format)
+    if mode == '1':
+        mode = 'L'
+    if modes is None:
+        # Pillow converts what its encoders need; palettes cannot be
+        # assembled band by band
+        return 'RGBA' if mode == 'P' and has_transparency else 'RGB' if mode == 'P' else mode
+    if mode in modes:
+        return mode
+    if mode in ('LA', 'PA', 'RGBA', 'RGBa', 'La') or has_transparency:
+        return 'RGBA'
+    return 'RGB'
+
+
+def convert_large_image(input_file, output_file, format, quality, size=None, resample=None):
+    # Converts an image large_image_size accepted without decoding it
+    # whole: through libvips when pyvips is installed, otherwise a band of
+    # rows at a time with Pillow. TIFF output is tiled and pyramidal.
+    if has_pyvips():
+        with stage('vips'):
+            _convert_with_vips(input_file, output_file, format, quality, size, resample)
+        return
+    _convert_in_bands(BandReader(input_file), output_file, format, quality, size, resample)
+
+
+def _convert_with_vips(input_file, output_file, format, quality, size, resample):
+    import pyvips
+
+    # Sequential access lets libvips stream the file top to bottom through
+    # its pipeline, holding a few scanlines per operation
+    image = pyvips.Image.new_from_file(input_file, access='sequential')
+    if size:
+        kernel = VIPS_KERNELS.get((resample or 'lanczos').lower(), 'lanczos3')
+        image = image.resize(size[0] / image.width, vscale=size[1] / image.height, kernel=kernel)
+
+    format = format.lower()
+    options = {} if quality is None else {'Q': quality}
+    if format in ['jpg', 'jpeg']:
+        if image.hasalpha():
+            image = image.flatten()
+        image.jpegsave(output_file, **options)
+    elif format == 'webp':
+        image.webpsave(output_file, **options)
+    elif format == 'png':
+        image.pngsave(output_file, compression=DEFLATE_LEVEL)
+    elif format in ['tiff', 'tif']:
+        image.tiffsave(output_file, tile=True, tile_width=TILE_SIZE, tile_height=TILE_SIZE, pyramid=True,
+                       compression='deflate', bigtiff=True)
+    else:
+        # The saver is picked from the extension
+        image.write_to_file(output_file)
+
+
+def _convert_in_bands(reader, output_file, format, quality, size=None, resample=None):
+    from .images import resample_filter
+
+    format = format.lower()
+    if format == 'tif':
+        format = 'tiff'
+    width, height = reader.size
+    out_width, out_height = size or reader.size
+    scale_y = height / out_height
+    margin = math.ceil(FILTER_SUPPORT * max(1.0, scale_y)) + 2 if size else 0
+    resample = resample_filter(resample, min(out_width / width, out_height / height)) if size else None
+
+    # Output rows per band, from how many source rows fit in BAND_BYTES;
+    # TIFF bands are whole tile rows
+    row_bytes = width * 4
+    source_rows = max(1, BAND_BYTES // row_bytes - 2 * margin)
+    band_rows = max(1, int(source_rows / scale_y))
+    if format == 'tiff':
+        band_rows = max(TILE_SIZE, band_rows // TILE_SIZE * TILE_SIZE)
+
+    with open_unbounded(reader.input_file) as img:
+        has_transparency = 'transparency' in img.info
+    mode = output_mode(reader.mode, format, has_transparency)
+    if format == 'png':
+        writer = PngWriter(output_file, (out_width, out_height), mode)
+    elif format == 'tiff':
+        writer = TiledTiffWriter(output_file, (out_width, out_height), mode)
+    else:
+        writer = InMemoryWriter(output_file, (out_width, out_height), mode, format, quality)
+
+    try:
+        for out_top in range(0, out_height, band_rows):
+            out_bottom = min(out_height, out_top + band_rows)
+            source_top, source_bottom = out_top * scale_y, out_bottom * scale_y
+            top = max(0, math.floor(source_top) - margin)
+            bottom = min(height, math.ceil(source_bottom) + margin)
+            with stage('decode'):
+                band = reader.read(top, bottom)
+            if band.mode != mode:
+                band = band.convert(mode)
+            if size:
+                # Resampling the box within the band uses the margin rows
+                # around it, so bands join without seams
+                with stage('resize'):
+                    band = band.resize((out_width, out_bottom - out_top), resample,
+                                       box=(0, source_top - top, width, source_bottom - top))
+            with stage('encode'):
+                writer.write(band)
+        with stage('encode'):
+            writer.close()
+    except BaseException:
+        if hasattr(writer, 'file'):
+            writer.file.close()
+        raise
@@ -0,0 +1,104 @@
+import os
+
+from .fastpath import probe_for_copy
+from .ffmpeg import PIPE_INPUT, FFmpegError, build_command, codec_args, probe_duration, run_ffmpeg
+
+
+def media_progress(input_file, progress):
+    # Adapts FFmpeg progress blocks into progress(fraction, block) calls,
+    # using the probed input duration to turn out_time into a fraction
+    if progress is None:
+        return None
+    duration = probe_duration(input_file)
+    
+    def on_progress(block):
+        fraction = None
+        if block['done']:
+            fraction = 1.0
+        elif duration and block['out_time'] is not None:
+            fraction = min(1.0, block['out_time'] / duration)
+        progress(fraction, block)
+    
+    return on_progress
+
+
+def run_media_command(input_file, outputs, threads=None, progress=None, pipe_input=False):
+    # With pipe_input the file is streamed to FFmpeg's stdin rather than
+    # opened by FFmpeg, see ffmpeg.can_pipe_input
+    source = input_file if pipe_input else None
+    command = build_command(PIPE_INPUT if pipe_input else input_file, outputs, threads)
+    run_ffmpeg(command, media_progress(input_file, progress), source)
+
+
+def output_args(category, input_file, targets, fast_path=True):
+    # FFmpeg options for each (format, codec, bitrate) target: a stream copy
+    # when the input's streams fit the target as they are, which is
+    # typically orders of magnitude faster than transcoding, and the codec
+    # and bitrate options otherwise
+    copies = probe_for_copy(category, input_file, targets) if fast_path else [None] * len(targets)
+    return [copy or codec_args(category, codec, bitrate) for copy, (_, codec, bitrate) in zip(copies, targets)]
+
+
+def run_media_targets(category, input_file, output_files, targets, threads=None, progress=None, pipe_input=False,
+                      fast_path=True):
+    # Writes each (format, codec, bitrate) target to its output file from one
+    # FFmpeg run. The probe can only say a stream copy looks possible; the
+    # muxer has the final word (a codec it will not store, timestamps it
+    # rejects), so a failed run that copied anything is retried transcoding.
+    args = output_args(category, input_file, targets, fast_path)
+    try:
+        run_media_command(input_file, list(zip(output_files, args)), threads, progress, pipe_input)
+    except FFmpegError:
+        transcode = output_args(category, input_file, targets, fast_path=False)
+        if args == transcode:
+            raise
+        run_media_command(input_file, list(zip(output_files, transcode)), threads, progress, pipe_input)
+
+
+def convert_audio(input_file, output_file, format, codec, bitrate, threads=None, progress=None, pipe_input=False,
+                  fast_path=True):
+    run_media_targets("Audio", input_file, [output_file], [(format, codec, bitrate)], threads, progress,
+                      pipe_input, fast_path)
+
+
+def convert_video(input_file, output_file, format, codec, bitrate, threads=None, progress=None, pipe_input=False,
+                  fast_path=True):
+    run_media_targets("Video", input_file, [output_file], [(format, codec, bitrate)], threads, progress,
+                      pipe_input, fast_path)
+
+
+def parse_variant(spec):
+    # "FORMAT[:CODEC][:BITRATE]", e.g. "mp3::320k", "webm:vp9:2M"
+    parts = spec.split(':')
+    if not parts[0] or len(parts) > 3:
+        raise ValueError(f"Invalid variant '{spec}', expected FORMAT[:CODEC][:BITRATE]")
+    return {
+        'format': parts[0].lower(),
+        'codec': parts[1] if len(parts) > 1 and parts[1] else None,
+        'bitrate': parts[2] if len(parts) > 2 and parts[2] else None,
+    }
+
+
+def variant_paths(input_file, output_dir, variants):
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    formats = [variant['format'] for variant in variants]
+    paths = []
+    for variant in variants:
+        name = base_name
+        if formats.count(variant['format']) > 1:
+            # Same container at different codecs or bitrates
+            suffix = '_'.join(str(v) for v in (variant.get('codec'), variant.get('bitrate')) if v)
+            name += f"_{suffix or len(paths)}"
+        paths.append(os.path.join(output_dir, f"{name}.{variant['format']}"))
+    return paths
+
+
+def convert_media_variants(category, input_file, output_dir, variants, threads=None, progress=None,
+                           pipe_input=False, fast_path=True):
+    # Encode every variant from a single FFmpeg invocation, so the input is
+    # read and decoded once however many outputs are requested
+    variants = [parse_variant(v) if isinstance(v, str) else v for v in variants]
+    paths = variant_paths(input_file, output_dir, variants)
+    targets = [(variant['format'], variant.get('codec'), variant.get('bitrate')) for variant in variants]
+    run_media_targets(category, input_file, paths, targets, threads, progress, pipe_input, fast_path)
+    return paths
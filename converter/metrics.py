@@ -0,0 +1,226 @@
+import contextvars
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+# The record of the file being converted on this thread, if it is being
+# instrumented. stage() is a no-op when nothing is set.
+_current_record = contextvars.ContextVar('converter_record', default=None)
+
+
+@contextmanager
+def stage(name):
+    # Times a named stage (decode, resize, encode, read, write, ffmpeg, ...)
+    # of the current conversion. Repeated stages accumulate.
+    record = _current_record.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = record['stages']
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def output_bytes(output):
+    if isinstance(output, (list, tuple)):
+        return sum(output_bytes(path) for path in output)
+    try:
+        return os.path.getsize(output)
+    except (OSError, TypeError):
+        return None
+
+
+def run_instrumented(function, args, category, input_file, profile_dir=None, output_file=None):
+    # Runs function(*args) and returns (result, record, error) instead of
+    # raising, so the record survives the trip back from a worker process.
+    # With profile_dir, the call also runs under cProfile and tracemalloc
+    # and the profile is written there. output_file, if given, is recorded
+    # in place of the path the job returned.
+    record = {
+        'id': uuid.uuid4().hex,
+        'time': time.time(),
+        'category': category,
+        'input': input_file,
+        'output': None,
+        'status': 'ok',
+        'error_class': None,
+        'error': None,
+        'duration': None,
+        'bytes_in': output_bytes(input_file),
+        'bytes_out': None,
+        'peak_rss_mb': None,
+        'stages': {},
+        'pid': os.getpid(),
+    }
+    token = _current_record.set(record)
+    profiler = None
+    if profile_dir:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+
+    result = error = None
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception as e:
+        error = e
+        record['status'] = 'error'
+        record['error_class'] = type(e).__name__
+        record['error'] = str(e)
+    finally:
+        record['duration'] = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+            os.makedirs(profile_dir, exist_ok=True)
+            record['profile'] = os.path.join(profile_dir, f"{record['id']}.prof")
+            profiler.dump_stats(record['profile'])
+        _current_record.reset(token)
+
+    output = result[0] if isinstance(result, tuple) else result
+    record['output'] = output_file or output
+    if error is None:
+        record['bytes_out'] = output_bytes(output)
+    record['peak_rss_mb'] = peak_rss_mb()
+    return result, record, error
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+class MetricsCollector:
+    # Collects per-file records from instrumented conversions. Each record
+    # is appended to a JSON Lines file as it arrives, and aggregated into
+    # counters and histograms that can be exported in the Prometheus text
+    # format (e.g. for node_exporter's textfile collector).
+    #
+    # profile_sample_rate is the fraction of files run under cProfile and
+    # tracemalloc, with profiles written to profile_dir.
+    def __init__(self, jsonl_path=None, profile_sample_rate=0.0, profile_dir=None):
+        self.jsonl_path = jsonl_path
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_dir = profile_dir or 'profiles'
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self.files = {}
+        self.errors = {}
+        self.bytes_in = {}
+        self.bytes_out = {}
+        self.durations = {}
+        self.stage_durations = {}
+
+    def profile_dir_for_next(self):
+        # Where the next job should write its profile, or None to skip
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            return self.profile_dir
+        return None
+
+    def add(self, record):
+        category = record['category']
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(record, default=str) + '\n')
+                self._jsonl.flush()
+
+            key = (category, record['status'])
+            self.files[key] = self.files.get(key, 0) + 1
+            if record['error_class']:
+                error_key = (category, record['error_class'])
+                self.errors[error_key] = self.errors.get(error_key, 0) + 1
+            self.bytes_in[category] = self.bytes_in.get(category, 0) + (record['bytes_in'] or 0)
+            self.bytes_out[category] = self.bytes_out.get(category, 0) + (record['bytes_out'] or 0)
+            self.durations.setdefault(category, Histogram()).observe(record['duration'])
+            for name, seconds in record['stages'].items():
+                self.stage_durations.setdefault((category, name), Histogram()).observe(seconds)
+
+    def prometheus_text(self):
+        lines = []
+
+        def counter(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in values:
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        def histogram(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in values:
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            counter("converter_files_total", "Files converted, by category and status.",
+                    [(_labels(category=c, status=s), v) for (c, s), v in sorted(self.files.items())])
+            counter("converter_errors_total", "Failed conversions, by category and exception class.",
+                    [(_labels(category=c, error_class=e), v) for (c, e), v in sorted(self.errors.items())])
+            counter("converter_input_bytes_total", "Bytes read from conversion inputs.",
+                    [(_labels(category=c), v) for c, v in sorted(self.bytes_in.items())])
+            counter("converter_output_bytes_total", "Bytes written to conversion outputs.",
+                    [(_labels(category=c), v) for c, v in sorted(self.bytes_out.items())])
+            histogram("converter_file_duration_seconds", "Wall time per converted file.",
+                      [(_labels(category=c), h) for c, h in sorted(self.durations.items())])
+            histogram("converter_stage_duration_seconds", "Wall time per conversion stage, per file.",
+                      [(_labels(category=c, stage=s), h) for (c, s), h in sorted(self.stage_durations.items())])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Written to a temporary name first so scrapers never read a
+        # partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
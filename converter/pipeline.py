@@ -0,0 +1,190 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+
+from .engine import is_multi_output
+from .executor import MEDIA_CATEGORIES, ConversionExecutor
+from .ffmpeg import can_pipe_input
+from .journal import move_into_place
+
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 2
+
+# Sentinel telling a stage's threads to stop
+_DONE = object()
+
+
+class ConversionPipeline:
+    # Overlaps I/O with conversion for inputs and outputs on slow storage
+    # such as NFS. Readers prefetch inputs into a local spool directory,
+    # converter workers run the usual conversion functions on the local
+    # copies, and writers move the results to their destination. The stages
+    # are connected by bounded queues, so a slow stage holds back the ones
+    # before it instead of letting the spool grow without limit.
+    #
+    # Audio and video inputs that FFmpeg can decode from a stream skip the
+    # spool: the converter thread feeds the source to FFmpeg over a pipe
+    # while it encodes, and FFmpeg writes straight to a temporary name next
+    # to the destination, so the media never makes a round trip through
+    # local disk.
+    def __init__(self, readers=None, writers=None, queue_size=None, spool_dir=None, executor=None):
+        self.executor = executor or ConversionExecutor()
+        self.readers = max(1, int(readers or DEFAULT_READERS))
+        self.writers = max(1, int(writers or DEFAULT_WRITERS))
+        self.queue_size = queue_size
+        self.spool_dir = spool_dir
+
+    def run(self, category, jobs, options, progress=None):
+        # Same contract as ConversionExecutor.run: yields (input_file,
+        # output_file, error) in completion order
+        if not jobs:
+            return
+        
+        workers = self.executor.workers_for(category)
+        options = self.executor._job_options(category, options, workers)
+        # Enough prefetched inputs to keep every converter busy, plus one
+        # waiting for each
+        queue_size = max(1, int(self.queue_size or workers * 2))
+        
+        # With admission control, the largest jobs are read first and each
+        # conversion waits until its estimated cost fits the budget
+        admission = self.executor.admission
+        costs = {}
+        if admission is not None:
+            costed = admission.order(category, jobs, options)
+            jobs = [job for job, _ in costed]
+            costs = {job: cost for job, cost in costed}
+        
+        pending = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+        converting = queue.Queue(maxsize=queue_size)
+        writing = queue.Queue(maxsize=queue_size)
+        results = queue.Queue()
+        
+        spool = tempfile.mkdtemp(prefix="converter-spool-", dir=self.spool_dir)
+        multi_output = is_multi_output(options)
+        
+        pool = None
+        if category not in MEDIA_CATEGORIES and workers > 1:
+            pool = self.executor._create_pool(category, workers)
+        
+        def read_stage():
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except queue.Empty:
+                    return
+                input_file, output_file = job
+                if category in MEDIA_CATEGORIES and can_pipe_input(input_file):
+                    converting.put((job, None))
+                    continue
+                # The original file name is kept so output naming and
+                # extension-based format detection are unchanged
+                local_input = os.path.join(spool, uuid.uuid4().hex, os.path.basename(input_file))
+                try:
+                    os.makedirs(os.path.dirname(local_input))
+                    shutil.copyfile(input_file, local_input)
+                except Exception as e:
+                    shutil.rmtree(os.path.dirname(local_input), ignore_errors=True)
+                    writing.put((job, None, None, e))
+                    continue
+                converting.put((job, local_input))
+        
+        def convert_stage():
+            while True:
+                item = converting.get()
+                if item is _DONE:
+                    return
+                job, local_input = item
+                input_file, output_file = job
+                if local_input is None:
+                    # Piped media job: no spool on either side
+                    local_output = None
+                    function, args = self.executor._submit_args(category, input_file, output_file,
+                                                                 dict(options, pipe_input=True), progress)
+                else:
+                    local_dir = os.path.join(spool, uuid.uuid4().hex)
+                    os.makedirs(local_dir)
+                    local_output = local_dir if multi_output else os.path.join(local_dir, os.path.basename(output_file))
+                    
+                    # Progress is reported against the original path the tracker knows
+                    function, args = self.executor._submit_args(category, local_input, local_output, options,
+                                                                 progress, original=job)
+                cost = costs.get(job)
+                if cost is not None:
+                    admission.acquire(cost)
+                try:
+                    if pool is not None:
+                        outcome = pool.submit(function, *args).result()
+                    else:
+                        outcome = function(*args)
+                    self.executor._complete(outcome)
+                    error = None
+                except Exception as e:
+                    error = e
+                finally:
+                    if cost is not None:
+                        admission.release(cost)
+                    if local_input is not None:
+                        shutil.rmtree(os.path.dirname(local_input), ignore_errors=True)
+                writing.put((job, local_input, local_output, error))
+        
+        def write_stage():
+            while True:
+                item = writing.get()
+                if item is _DONE:
+                    return
+                job, local_input, local_output, error = item
+                input_file, output_file = job
+                try:
+                    if error is None and local_output is not None:
+                        if multi_output:
+                            os.makedirs(output_file, exist_ok=True)
+                            for name in os.listdir(local_output):
+                                move_into_place(os.path.join(local_output, name), os.path.join(output_file, name))
+                        else:
+                            move_into_place(local_output, output_file)
+                except Exception as e:
+                    error = e
+                finally:
+                    if local_output is not None:
+                        shutil.rmtree(local_output if multi_output else os.path.dirname(local_output),
+                                      ignore_errors=True)
+                if progress is not None:
+                    progress.finish(input_file, error is None)
+                results.put((input_file, output_file, error))
+        
+        read_threads = [threading.Thread(target=read_stage, daemon=True) for _ in range(self.readers)]
+        convert_threads = [threading.Thread(target=convert_stage, daemon=True) for _ in range(workers)]
+        write_threads = [threading.Thread(target=write_stage, daemon=True) for _ in range(self.writers)]
+        for thread in read_threads + convert_threads + write_threads:
+            thread.start()
+        
+        def shut_down():
+            # Each stage is told to stop once everything upstream has finished
+            for thread in read_threads:
+                thread.join()
+            for _ in convert_threads:
+                converting.put(_DONE)
+            for thread in convert_threads:
+                thread.join()
+            for _ in write_threads:
+                writing.put(_DONE)
+            for thread in write_threads:
+                thread.join()
+        
+        closer = threading.Thread(target=shut_down, daemon=True)
+        closer.start()
+        try:
+            for _ in range(len(jobs)):
+                yield results.get()
+        finally:
+            closer.join()
+            if pool is not None:
+                pool.shutdown()
+            shutil.rmtree(spool, ignore_errors=True)
+
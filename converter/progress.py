@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+
+
+def file_weight(path):
+    # Jobs are weighted by input size so one large file moves the bar more
+    # than many small ones
+    try:
+        return max(1, os.path.getsize(path))
+    except OSError:
+        return 1
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+class BatchProgress:
+    # Thread-safe progress for a batch of conversions. Completed files count
+    # in full; running FFmpeg jobs count in proportion to how much of their
+    # input duration has been encoded. From that it derives overall
+    # percentage, throughput and an ETA for the whole batch.
+    #
+    # Files are weighed when they first report, not up front, so a large
+    # batch starts without statting every input and only running jobs are
+    # tracked by path. Until every file has reported, the files not seen yet
+    # are taken to weigh the average of those that have.
+    #
+    # on_update, if given, is called with a snapshot at most every
+    # update_interval seconds (and always when the last file finishes),
+    # from whichever thread reported the change.
+    def __init__(self, input_files, on_update=None, update_interval=0.5):
+        self.total_files = len(input_files)
+        self.on_update = on_update
+        self.update_interval = update_interval
+        
+        self._lock = threading.Lock()
+        # Weights, fractions, media seconds and speeds of running jobs;
+        # finished ones are folded into the totals below
+        self._weights = {}
+        self._fractions = {}
+        self._media_seconds = {}
+        self._speeds = {}
+        self._known_weight = 0
+        self._known_files = 0
+        self._finished_weight = 0
+        self._finished_media_seconds = 0.0
+        self._shown_fraction = 0.0
+        self._completed = 0
+        self._failed = 0
+        self._started = time.monotonic()
+        self._last_update = 0.0
+
+    def job_progress(self, input_file):
+        # Callback suitable for run_conversion_job's progress argument
+        def report(fraction, details=None):
+            self.update(input_file, fraction, details)
+        return report
+
+    def _weigh(self, input_file):
+        # Called with the lock held
+        weight = self._weights.get(input_file)
+        if weight is None:
+            weight = self._weights[input_file] = file_weight(input_file)
+            self._known_weight += weight
+            self._known_files += 1
+        return weight
+
+    def update(self, input_file, fraction, details=None):
+        with self._lock:
+            self._weigh(input_file)
+            if fraction is not None:
+                self._fractions[input_file] = max(0.0, min(1.0, fraction))
+            if details:
+                if details.get('out_time') is not None:
+                    self._media_seconds[input_file] = details['out_time']
+                if details.get('speed') is not None:
+                    self._speeds[input_file] = details['speed']
+        self._notify()
+
+    def finish(self, input_file, success=True):
+        with self._lock:
+            self._finished_weight += self._weigh(input_file)
+            del self._weights[input_file]
+            self._fractions.pop(input_file, None)
+            self._finished_media_seconds += self._media_seconds.pop(input_file, 0.0)
+            self._speeds.pop(input_file, None)
+            self._completed += 1
+            if not success:
+                self._failed += 1
+            last = self._completed >= self.total_files
+        self._notify(force=last)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self._started)
+            done_weight = self._finished_weight + sum(self._weights[path] * fraction
+                                                      for path, fraction in self._fractions.items())
+            total_weight = self._known_weight
+            if self._known_files < self.total_files:
+                average = self._known_weight / self._known_files if self._known_files else 1
+                total_weight += average * (self.total_files - self._known_files)
+            # Never shown going backwards when a file weighs more than
+            # estimated
+            fraction = min(1.0, max(self._shown_fraction, done_weight / (total_weight or 1)))
+            self._shown_fraction = fraction
+            media_seconds = self._finished_media_seconds + sum(self._media_seconds.values())
+            running_speeds = list(self._speeds.values())
+            completed = self._completed
+            failed = self._failed
+        
+        eta = None
+        if completed >= self.total_files:
+            eta = 0.0
+        elif fraction > 0:
+            eta = elapsed * (1 - fraction) / fraction
+        
+        return {
+            'fraction': fraction,
+            'percent': fraction * 100,
+            'completed': completed,
+            'failed': failed,
+            'total': self.total_files,
+            'elapsed': elapsed,
+            'bytes_done': done_weight,
+            'mb_per_s': done_weight / elapsed / (1024 * 1024),
+            # Seconds of media encoded per wall-clock second across all jobs
+            'realtime': media_seconds / elapsed if media_seconds else None,
+            # Sum of the speeds FFmpeg reports for the jobs still running
+            'ffmpeg_speed': sum(running_speeds) if running_speeds else None,
+            'eta': eta,
+        }
+
+    def _notify(self, force=False):
+        if self.on_update is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_update < self.update_interval:
+                return
+            self._last_update = now
+        self.on_update(self.snapshot())
+
+
+def format_progress(snapshot):
+    parts = [
+        f"{snapshot['percent']:.0f}%",
+        f"{snapshot['completed']}/{snapshot['total']} files",
+        f"{snapshot['mb_per_s']:.1f} MB/s",
+    ]
+    if snapshot['realtime']:
+        parts.append(f"{snapshot['realtime']:.1f}x realtime")
+    parts.append(f"ETA {format_duration(snapshot['eta'])}")
+    return " | ".join(parts)
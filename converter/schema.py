@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from .cache import DEFAULT_CACHE_DIR
+
+# Remembers the text columns of CSV inputs. The first time a header is seen
+# its first rows are sampled once; later files with the same header read
+# those columns as text without inferring them, with repeated strings read
+# straight into categoricals. Numeric columns are always left to the
+# parser, so their formatting never depends on an earlier file. Opt-in,
+# since a column that held text in the sample stays text in later files.
+
+DEFAULT_SCHEMA_PATH = os.path.join(DEFAULT_CACHE_DIR, "schemas.sqlite")
+
+# Rows sampled to infer a schema for a header seen for the first time
+SCHEMA_SAMPLE_ROWS = 10000
+
+# A string column is stored as a categorical when at most this share of
+# its values are distinct, and there are at most CATEGORY_MAX_VALUES of them
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_VALUES = 10000
+
+
+def header_signature(input_file, encoding=None):
+    # Cache key for a CSV input: its encoding and header line, so daily
+    # exports with the same columns share one schema. None when the file has
+    # no header to key on.
+    with open(input_file, 'r', encoding=encoding or 'utf-8', errors='replace', newline='') as src:
+        header = src.readline().rstrip('\r\n')
+    if not header.strip():
+        return None
+    key = f"{(encoding or 'utf-8').lower()}\0{header}"
+    return hashlib.sha256(key.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def is_category_candidate(values):
+    # values: a column with missing values dropped
+    unique = values.nunique()
+    return 0 < unique <= CATEGORY_MAX_VALUES and unique <= len(values) * CATEGORY_MAX_RATIO
+
+
+def _is_text(column):
+    import pandas as pd
+
+    if str(column.dtype) not in ['object', 'str', 'string']:
+        return False
+    return pd.api.types.infer_dtype(column, skipna=True) == 'string'
+
+
+def infer_schema(sample):
+    # {column: dtype} for the text columns of a sample DataFrame: 'str', or
+    # 'category' when few distinct values repeat. Numeric columns are not
+    # fixed: float64 from one file would print a later file's integers as
+    # 2.0, and int64 would silently read a later "2.0" as 2.
+    dtypes = {}
+    for name in sample.columns:
+        column = sample[name]
+        values = column.dropna()
+        if not len(values):
+            # Nothing to go on; an all-empty sample says nothing about the rest
+            continue
+        if _is_text(column):
+            dtypes[str(name)] = 'category' if is_category_candidate(values) else 'str'
+    return dtypes
+
+
+def compact_frame(data):
+    # Shrinks a DataFrame without changing its values: integer columns are
+    # downcast to the smallest type that holds them and repeated strings
+    # become categoricals. Text outputs are written exactly as before.
+    import pandas as pd
+
+    for position in range(data.shape[1]):
+        column = data.iloc[:, position]
+        if pd.api.types.is_integer_dtype(column.dtype) and not pd.api.types.is_extension_array_dtype(column.dtype):
+            data.isetitem(position, pd.to_numeric(column, downcast='integer'))
+        elif _is_text(column) and is_category_candidate(column.dropna()):
+            data.isetitem(position, column.astype('category'))
+    return data
+
+
+class SchemaCache:
+    # Inferred schemas by header signature, shared by every worker process
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or DEFAULT_SCHEMA_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS schemas ("
+            " key TEXT PRIMARY KEY,"
+            " dtypes TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " used REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def get(self, key):
+        row = self.db.execute("SELECT dtypes FROM schemas WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE schemas SET used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, dtypes):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO schemas (key, dtypes, created, used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(dtypes), now, now)
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def csv_dtypes(input_file, encoding, schemas, compact=True):
+    # Returns (key, dtypes) to read input_file with: the cached schema for
+    # its header, or one inferred from its first SCHEMA_SAMPLE_ROWS rows and
+    # stored for next time. dtypes is None when there is nothing to apply.
+    # Without compact, text is read as 'str' rather than categoricals. Text
+    # types never fail to parse, so they are safe for streamed reads too.
+    import pandas as pd
+
+    key = header_signature(input_file, encoding)
+    if key is None:
+        return None, None
+    dtypes = schemas.get(key)
+    if dtypes is None:
+        sample = pd.read_csv(input_file, encoding=encoding or 'utf-8', nrows=SCHEMA_SAMPLE_ROWS)
+        dtypes = infer_schema(sample)
+        schemas.put(key, dtypes)
+    if not compact:
+        dtypes = {name: 'str' if kind == 'category' else kind for name, kind in dtypes.items()}
+    return key, dtypes or None
+
+
+def read_csv_with_schema(input_file, encoding, schemas, compact=True):
+    import pandas as pd
+
+    _, dtypes = csv_dtypes(input_file, encoding, schemas, compact)
+    data = pd.read_csv(input_file, encoding=encoding or 'utf-8', dtype=dtypes)
+    return compact_frame(data) if compact else data
@@ -0,0 +1,537 @@
+import asyncio
+import json
+import mimetypes
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .engine import CATEGORIES, resolve_options, run_cached_job, run_conversion_job
+from .executor import EXECUTOR_KINDS, MEDIA_CATEGORIES, default_worker_count
+from .ffmpeg import FFmpegScheduler
+from .images import parse_rendition
+from .media import parse_variant
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Request bodies are read and written to disk in blocks of this size, so an
+# upload never has to fit in memory
+UPLOAD_BLOCK = 1024 * 1024
+DEFAULT_MAX_UPLOAD = 2 * 1024 * 1024 * 1024
+
+# Finished jobs and their files are kept this long for clients to collect
+DEFAULT_RESULT_TTL = 3600.0
+JANITOR_INTERVAL = 60.0
+
+# Times a job is run when worker processes die under it. A crash (an OOM
+# kill, a segfault in a codec) fails every job in the pool, so jobs get a
+# fresh pool once more; the one that caused it crashes again and fails.
+POOL_ATTEMPTS = 2
+
+# Longest a status request may wait for a job to finish
+MAX_WAIT_SECONDS = 300.0
+
+JOB_STATES = ['queued', 'running', 'done', 'failed']
+
+HTTP_REASONS = {
+    200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+    422: "Unprocessable Entity", 500: "Internal Server Error",
+}
+
+# Query parameters that map onto conversion options, with their parsers
+OPTION_PARSERS = {
+    'format': str,
+    'category': str,
+    'quality': int,
+    'fast_resize': lambda value: value.lower() in ['1', 'true', 'yes'],
+    'resample': str,
+    'encoding': str,
+    'headers': lambda value: value.lower() in ['1', 'true', 'yes'],
+    'chunk_size': int,
+    'csv_engine': str,
+    'sheet': str,
+    'excel_engine': str,
+    'codec': str,
+    'bitrate': str,
+    'fast_path': lambda value: value.lower() in ['1', 'true', 'yes'],
+    'schema_cache': lambda value: value.lower() in ['1', 'true', 'yes'],
+    'flatten_json': lambda value: value.lower() in ['1', 'true', 'yes'],
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _warm_worker():
+    # Run once in each pool process at startup, so the first real request
+    # does not pay for importing Pillow and pandas
+    import pandas  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+
+def parse_address(value):
+    # "unix:/path/to.sock", "HOST:PORT", ":PORT" or "PORT"
+    if value.startswith("unix:"):
+        return ('unix', value[len("unix:"):])
+    host, _, port = value.rpartition(':')
+    try:
+        return ('tcp', host or DEFAULT_HOST, int(port))
+    except ValueError:
+        raise ValueError(f"Invalid address '{value}', expected HOST:PORT or unix:PATH")
+
+
+def parse_job_options(query):
+    # Conversion options from a request's query string. Repeated
+    # "rendition" and "variant" parameters give multi-output jobs.
+    options = {}
+    for name, parser in OPTION_PARSERS.items():
+        if name in query:
+            try:
+                options[name] = parser(query[name][-1])
+            except ValueError:
+                raise HTTPError(400, f"Invalid value for {name}: {query[name][-1]}")
+    if 'resize' in query:
+        try:
+            width, height = query['resize'][-1].lower().split('x')
+            options['resize'] = True
+            options['dimensions'] = (int(width), int(height))
+        except ValueError:
+            raise HTTPError(400, "resize must be WIDTHxHEIGHT")
+    try:
+        if 'rendition' in query:
+            options['renditions'] = [parse_rendition(spec) for spec in query['rendition']]
+        if 'variant' in query:
+            options['variants'] = [parse_variant(spec) for spec in query['variant']]
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    if not options.get('format') and not options.get('renditions') and not options.get('variants'):
+        raise HTTPError(400, "One of format, rendition or variant is required")
+    if options.get('category') and options['category'] not in CATEGORIES:
+        raise HTTPError(400, f"Unknown category: {options['category']}")
+    return options
+
+
+def safe_filename(name):
+    name = os.path.basename(name.replace('\\', '/'))
+    name = re.sub(r'[^\w.-]+', '_', name).lstrip('.')
+    return name or 'input'
+
+
+class Job:
+    def __init__(self, job_id, job_dir, input_file, options):
+        self.id = job_id
+        self.dir = job_dir
+        self.input_file = input_file
+        self.options = options
+        self.category = None
+        self.state = 'queued'
+        self.error = None
+        self.outputs = []
+        self.progress = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = asyncio.Event()
+
+    def status(self):
+        status = {
+            'id': self.id,
+            'state': self.state,
+            'category': self.category,
+            'input': os.path.basename(self.input_file),
+            'outputs': [os.path.basename(output) for output in self.outputs],
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.progress is not None:
+            status['progress'] = self.progress
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+
+class ConversionService:
+    # A long-running conversion server. Jobs are submitted over HTTP (TCP or
+    # a Unix socket), their bodies streamed to work_dir, and converted in
+    # pools that stay warm between requests: a spawn process pool for images
+    # and documents and the FFmpeg scheduler's thread pools for audio and
+    # video. limits caps how many jobs of each category run at once, so a
+    # burst of one kind cannot starve the others.
+    #
+    #   POST   /jobs?format=png&filename=photo.jpg   body: the input file
+    #   GET    /jobs                                 every job's status
+    #   GET    /jobs/ID[?wait=SECONDS]               one job's status
+    #   GET    /jobs/ID/result[/NAME]                the converted file
+    #   DELETE /jobs/ID                              forget a job and its files
+    #   GET    /health
+    def __init__(self, work_dir=None, workers=None, limits=None, cache=None, scheduler=None,
+                 max_upload=DEFAULT_MAX_UPLOAD, result_ttl=DEFAULT_RESULT_TTL):
+        self.owns_work_dir = work_dir is None
+        self.work_dir = os.path.abspath(work_dir or tempfile.mkdtemp(prefix="converter-service-"))
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.workers = max(1, int(workers)) if workers else default_worker_count()
+        self.cache = cache
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or FFmpegScheduler(audio_workers=workers, video_workers=workers)
+        self.max_upload = max_upload
+        self.result_ttl = result_ttl
+
+        self.limits = {
+            category: self.scheduler.workers[category] if category in MEDIA_CATEGORIES else self.workers
+            for category in CATEGORIES
+        }
+        self.limits.update(limits or {})
+        self.jobs = {}
+        self.pool = None
+        self._semaphores = {}
+        self._tasks = set()
+        self._servers = []
+        self._socket_paths = []
+
+    async def start(self, addresses):
+        # addresses are ('tcp', host, port) or ('unix', path) tuples
+        self.pool = self._new_pool()
+        self._semaphores = {category: asyncio.Semaphore(limit) for category, limit in self.limits.items()}
+
+        for address in addresses:
+            if address[0] == 'unix':
+                if os.path.exists(address[1]):
+                    os.remove(address[1])
+                server = await asyncio.start_unix_server(self._handle, path=address[1], limit=UPLOAD_BLOCK)
+                self._socket_paths.append(address[1])
+            else:
+                server = await asyncio.start_server(self._handle, address[1], address[2], limit=UPLOAD_BLOCK)
+            self._servers.append(server)
+        self._spawn(self._janitor())
+
+    async def serve_forever(self, addresses):
+        await self.start(addresses)
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            await self.close()
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for path in self._socket_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        for task in list(self._tasks):
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.owns_scheduler:
+            self.scheduler.shutdown(wait=False)
+        if self.owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _new_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        for _ in range(self.workers):
+            pool.submit(_warm_worker)
+        return pool
+
+    def _replace_pool(self, broken):
+        # Every job on a broken pool notices; only the first replaces it
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+
+    def _spawn(self, coroutine):
+        # Keeps a reference so the task is not garbage collected mid-run
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            now = time.time()
+            for job in list(self.jobs.values()):
+                if job.finished is not None and now - job.finished > self.result_ttl:
+                    self.remove_job(job)
+
+    def remove_job(self, job):
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.dir, ignore_errors=True)
+
+    # Conversion
+
+    def submit(self, job):
+        self.jobs[job.id] = job
+        self._spawn(self._run(job))
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        try:
+            output_dir = os.path.join(job.dir, "output")
+            os.makedirs(output_dir, exist_ok=True)
+            category, output, options = resolve_options(job.input_file, output_dir, job.options)
+            job.category = category
+            async with self._semaphores[category]:
+                job.state = 'running'
+                job.started = time.time()
+                for attempt in range(POOL_ATTEMPTS):
+                    pool = self.pool
+                    try:
+                        future = self._submit(category, job, output, options)
+                        result = await asyncio.wrap_future(future, loop=loop)
+                        break
+                    except BrokenProcessPool:
+                        self._replace_pool(pool)
+                        if attempt + 1 == POOL_ATTEMPTS:
+                            raise
+            if self.cache is not None:
+                # run_cached_job returns (output, hit)
+                result = result[0]
+            job.outputs = result if isinstance(result, list) else [result]
+            job.state = 'done'
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.state = 'failed'
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+            job.done.set()
+
+    def _submit(self, category, job, output, options):
+        if category in MEDIA_CATEGORIES:
+            if not options.get('threads'):
+                options = dict(options, threads=self.scheduler.threads_for(category))
+
+            def report(fraction, details=None):
+                job.progress = fraction
+
+            if self.cache is not None:
+                args = (category, job.input_file, output, options, self.cache, report)
+                return self.scheduler.submit(category, run_cached_job, *args)
+            return self.scheduler.submit(category, run_conversion_job, category, job.input_file, output,
+                                         options, report)
+        if EXECUTOR_KINDS.get(category) != "process":
+            raise ValueError(f"Unsupported category: {category}")
+        if self.cache is not None:
+            return self.pool.submit(run_cached_job, category, job.input_file, output, options, self.cache)
+        return self.pool.submit(run_conversion_job, category, job.input_file, output, options)
+
+    # HTTP
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send_json(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                request = {'method': method, 'target': target, 'headers': headers, 'body_read': False}
+                try:
+                    await self._route(request, reader, writer, keep_alive)
+                except HTTPError as e:
+                    # An unread request body would be parsed as the next
+                    # request, so the connection is closed instead
+                    keep_alive = keep_alive and (request['body_read'] or not self._has_body(headers))
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=keep_alive)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    keep_alive = False
+                    await self._send_json(writer, 500, {'error': f"{type(e).__name__}: {e}"}, keep_alive=False)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _has_body(self, headers):
+        return 'transfer-encoding' in headers or int(headers.get('content-length') or 0) > 0
+
+    async def _route(self, request, reader, writer, keep_alive):
+        url = urllib.parse.urlsplit(request['target'])
+        query = urllib.parse.parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        method = request['method']
+
+        if parts == ['health'] and method == 'GET':
+            counts = dict.fromkeys(JOB_STATES, 0)
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            await self._send_json(writer, 200, {'status': 'ok', 'jobs': counts, 'limits': self.limits},
+                                  keep_alive=keep_alive)
+        elif parts == ['jobs'] and method == 'POST':
+            job = await self._receive_job(request, query, reader)
+            self.submit(job)
+            await self._send_json(writer, 202, job.status(), keep_alive=keep_alive,
+                                  headers={'Location': f"/jobs/{job.id}"})
+        elif parts == ['jobs'] and method == 'GET':
+            await self._send_json(writer, 200, [job.status() for job in self.jobs.values()],
+                                  keep_alive=keep_alive)
+        elif len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, f"No job {parts[1]}")
+            if len(parts) == 2 and method == 'GET':
+                if 'wait' in query and not job.done.is_set():
+                    try:
+                        timeout = min(float(query['wait'][-1]), MAX_WAIT_SECONDS)
+                    except ValueError:
+                        raise HTTPError(400, "wait must be a number of seconds")
+                    try:
+                        await asyncio.wait_for(job.done.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                await self._send_json(writer, 200, job.status(), keep_alive=keep_alive)
+            elif len(parts) == 2 and method == 'DELETE':
+                if not job.done.is_set():
+                    raise HTTPError(409, "The job is still running")
+                self.remove_job(job)
+                await self._send(writer, 204, keep_alive=keep_alive)
+            elif len(parts) in [3, 4] and parts[2] == 'result' and method == 'GET':
+                await self._send_result(writer, job, parts[3] if len(parts) == 4 else None, keep_alive)
+            else:
+                raise HTTPError(405, f"{method} is not supported on {url.path}")
+        else:
+            raise HTTPError(404, f"No route for {method} {url.path}")
+
+    async def _receive_job(self, request, query, reader):
+        headers = request['headers']
+        options = parse_job_options(query)
+        filename = (query.get('filename') or [headers.get('x-filename', '')])[-1]
+        if not os.path.splitext(filename)[1]:
+            raise HTTPError(400, "A filename with an extension is required to tell the input format")
+        if 'transfer-encoding' not in headers and 'content-length' not in headers:
+            raise HTTPError(411, "Content-Length or chunked transfer encoding is required")
+        length = int(headers.get('content-length') or 0)
+        if length > self.max_upload:
+            raise HTTPError(413, f"Uploads are limited to {self.max_upload} bytes")
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.work_dir, job_id)
+        os.makedirs(job_dir)
+        input_file = os.path.join(job_dir, safe_filename(filename))
+        try:
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                await self._receive_chunked(reader, input_file)
+            else:
+                await self._receive_body(reader, input_file, length)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        request['body_read'] = True
+        return Job(job_id, job_dir, input_file, options)
+
+    async def _receive_body(self, reader, path, length):
+        # Blocks are written from a thread so a slow disk does not stall
+        # other connections
+        loop = asyncio.get_running_loop()
+        with open(path, 'wb') as f:
+            remaining = length
+            while remaining:
+                block = await reader.read(min(UPLOAD_BLOCK, remaining))
+                if not block:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(block)
+                await loop.run_in_executor(None, f.write, block)
+
+    async def _receive_chunked(self, reader, path):
+        loop = asyncio.get_running_loop()
+        received = 0
+        with open(path, 'wb') as f:
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip trailers up to the blank line ending the body
+                    while (await reader.readline()).strip():
+                        pass
+                    return
+                received += size
+                if received > self.max_upload:
+                    raise HTTPError(413, f"Uploads are limited to {self.max_upload} bytes")
+                while size:
+                    block = await reader.read(min(UPLOAD_BLOCK, size))
+                    if not block:
+                        raise asyncio.IncompleteReadError(b'', size)
+                    size -= len(block)
+                    await loop.run_in_executor(None, f.write, block)
+                await reader.readexactly(2)
+
+    async def _send_result(self, writer, job, name, keep_alive):
+        if not job.done.is_set():
+            raise HTTPError(409, f"The job is {job.state}")
+        if job.state == 'failed':
+            raise HTTPError(422, job.error)
+        if name is None:
+            if len(job.outputs) != 1:
+                raise HTTPError(409, "The job wrote several files; request them by name: "
+                                     + ", ".join(os.path.basename(output) for output in job.outputs))
+            path = job.outputs[0]
+        else:
+            path = next((output for output in job.outputs if os.path.basename(output) == name), None)
+            if path is None:
+                raise HTTPError(404, f"The job has no output named {name}")
+
+        size = os.path.getsize(path)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        await self._send(writer, 200, content_type=content_type, length=size, keep_alive=keep_alive, headers={
+            'Content-Disposition': f'attachment; filename="{os.path.basename(path)}"',
+        })
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            # sendfile(2) where the transport supports it, read/write otherwise
+            await loop.sendfile(writer.transport, f)
+
+    async def _send(self, writer, status, body=b'', content_type=None, length=None, keep_alive=True,
+                    headers=None):
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        lines.append(f"Content-Length: {len(body) if length is None else length}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=True, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        await self._send(writer, status, body, 'application/json', keep_alive=keep_alive, headers=headers)
+
+
+def serve(addresses, **kwargs):
+    # Runs a ConversionService until interrupted. kwargs are passed to
+    # ConversionService.
+    service = ConversionService(**kwargs)
+    try:
+        asyncio.run(service.serve_forever(addresses))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,244 @@
+import os
+
+from .columnar import COLUMNAR_INPUTS, COLUMNAR_OUTPUTS, DEFAULT_BATCH_SIZE
+from .jsonstream import iter_json_frames, scan_columns
+from .schema import csv_dtypes
+
+# Rows held in memory at once when streaming a document conversion
+DEFAULT_CHUNK_SIZE = 50000
+
+# Input and output formats that can be converted chunk by chunk
+JSON_INPUTS = ['.json', '.jsonl']
+STREAMABLE_INPUTS = ['.csv', '.txt'] + JSON_INPUTS + COLUMNAR_INPUTS
+STREAMABLE_OUTPUTS = ['csv', 'jsonl', 'json', 'txt', 'xlsx'] + COLUMNAR_OUTPUTS
+
+# JSON inputs at least this large are streamed even without a chunk size.
+# Parsed whole they take several times their size in memory: the text, the
+# object tree and the DataFrame. Columnar outputs are left out, since a
+# column whose type changes between chunks cannot be appended to them.
+STREAM_JSON_BYTES = 64 * 1024 * 1024
+JSON_STREAM_OUTPUTS = ['csv', 'jsonl', 'json', 'txt', 'xlsx']
+
+# Outputs made of self-describing records. JSON inputs streamed to them are
+# not scanned for their columns first, so output starts with the first
+# chunk; records only get the keys seen up to their chunk, and an integer
+# key missing from a later record is not made float in earlier ones.
+RECORD_OUTPUTS = ['json', 'jsonl']
+
+
+def can_stream(input_file, format):
+    input_ext = os.path.splitext(input_file)[1].lower()
+    if input_ext == '.txt':
+        # Other text conversions are plain file copies, which already stream
+        return format == 'csv'
+    return input_ext in STREAMABLE_INPUTS and format in STREAMABLE_OUTPUTS
+
+
+def stream_chunk_size(input_file, format, chunk_size=None):
+    # The chunk size a conversion streams with, or None when it is read
+    # whole: the one asked for, or the default for large JSON inputs
+    if chunk_size:
+        return chunk_size
+    input_ext = os.path.splitext(input_file)[1].lower()
+    if input_ext in JSON_INPUTS and format in JSON_STREAM_OUTPUTS:
+        try:
+            if os.path.getsize(input_file) >= STREAM_JSON_BYTES:
+                return DEFAULT_CHUNK_SIZE
+        except OSError:
+            pass
+    return None
+
+
+class ChunkWriter:
+    # Writes DataFrame chunks to a single output file as they arrive, so
+    # only one chunk is ever held in memory
+    def __init__(self, output_file, format, encoding, headers):
+        if format not in STREAMABLE_OUTPUTS:
+            raise ValueError(f"Streaming output to {format} is not supported")
+        self.format = format
+        self.headers = headers
+        self.output_file = output_file
+        self.out = None
+        if format == 'xlsx':
+            from .excel import XlsxWriter
+            self.out = XlsxWriter(output_file, headers)
+        elif format not in COLUMNAR_OUTPUTS:
+            self.out = open(output_file, 'w', encoding=encoding or 'utf-8', newline='')
+        self.chunks_written = 0
+
+    def write(self, chunk):
+        first = self.chunks_written == 0
+        
+        if self.format in COLUMNAR_OUTPUTS:
+            # The Arrow writer needs a schema, so it opens with the first chunk
+            if first:
+                import pyarrow as pa
+                from .columnar import BatchWriter
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                self.out = BatchWriter(self.output_file, self.format, schema)
+            self.out.write_frame(chunk)
+        elif self.format == 'xlsx':
+            self.out.write(chunk)
+        elif self.format == 'csv':
+            chunk.to_csv(self.out, index=False, header=self.headers if first else False)
+        elif self.format == 'jsonl':
+            if len(chunk):
+                text = chunk.to_json(orient='records', lines=True, force_ascii=False)
+                self.out.write(text if text.endswith('\n') else text + '\n')
+        elif self.format == 'json':
+            # A JSON array is written as '[' + records + ']' so it never
+            # has to exist as one object in memory
+            if len(chunk):
+                text = chunk.to_json(orient='records', force_ascii=False)
+                self.out.write('[' if first else ',')
+                self.out.write(text[1:-1])
+            elif first:
+                self.out.write('[')
+        elif self.format == 'txt':
+            # Column widths are computed per chunk, so very wide values may
+            # shift alignment between chunks
+            text = chunk.to_string(index=False, header=self.headers if first else False)
+            if not first:
+                self.out.write('\n')
+            self.out.write(text)
+        
+        self.chunks_written += 1
+
+    def close(self):
+        if self.format == 'json':
+            self.out.write('[]' if self.chunks_written == 0 else ']')
+        if self.out is None:
+            # Nothing was read, so there is no schema to write
+            raise ValueError(f"Cannot write an empty {self.format} file without columns")
+        self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.out is not None:
+            # The input failed; its error is the one to report, not an
+            # unfinished or empty output
+            self.out.close()
+
+
+def count_text_columns(input_file, encoding):
+    # A cheap first pass so every chunk is padded to the same width, as the
+    # in-memory conversion does for the whole file at once
+    columns = 0
+    with open(input_file, 'r', encoding=encoding or 'utf-8') as src:
+        for line in src:
+            columns = max(columns, line.count(',') + 1)
+    return columns
+
+
+def iter_text_rows(input_file, encoding, chunk_size):
+    # Yields lists of comma-split rows, matching the in-memory
+    # content.strip().split('\n') conversion without reading the whole file
+    with open(input_file, 'r', encoding=encoding or 'utf-8') as src:
+        rows = []
+        pending_blank = []
+        started = False
+        for line in src:
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                # Blank lines only count once a later non-blank line shows
+                # they are not trailing whitespace
+                if started:
+                    pending_blank.append(line)
+                continue
+            if not started:
+                line = line.lstrip()
+                started = True
+            for blank in pending_blank:
+                rows.append(blank.split(','))
+            pending_blank = []
+            rows.append(line.split(','))
+            if len(rows) >= chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def csv_chunk_dtypes(input_file, encoding, chunk_size):
+    # Each chunk of a CSV would otherwise get the types its own rows suggest,
+    # so a column could print as 3999 in one chunk and 3999.0 in the next,
+    # where reading the whole file gives it one type. A first pass over the
+    # chunks, keeping only their dtypes, finds the columns that disagree:
+    # mixed integers and floats are read as float64 throughout, and columns
+    # that are text in some chunk are read as text, as they would be whole.
+    import pandas as pd
+
+    kinds = {}
+    with pd.read_csv(input_file, encoding=encoding or 'utf-8', chunksize=chunk_size) as reader:
+        for chunk in reader:
+            for name, dtype in chunk.dtypes.items():
+                kinds.setdefault(name, set()).add(dtype.kind)
+    dtypes = {}
+    for name, seen in kinds.items():
+        if len(seen) < 2:
+            continue
+        if seen <= {'i', 'u', 'f'}:
+            dtypes[name] = 'float64'
+        elif 'O' in seen:
+            dtypes[name] = 'str'
+    return dtypes
+
+
+def iter_chunks(input_file, encoding, chunk_size, dtypes=None, flatten=False, columns=None, sparse=None):
+    # dtypes fixes the types of CSV columns, so every chunk gets the same
+    # ones instead of whatever its own rows suggest. JSON records are
+    # flattened with flatten, and aligned to the columns and sparse columns
+    # found by scan_columns when given.
+    import pandas as pd
+    
+    input_ext = os.path.splitext(input_file)[1].lower()
+    
+    if input_ext == '.csv':
+        with pd.read_csv(input_file, encoding=encoding or 'utf-8', chunksize=chunk_size, dtype=dtypes) as reader:
+            for chunk in reader:
+                yield chunk
+    elif input_ext in JSON_INPUTS:
+        yield from iter_json_frames(input_file, encoding, chunk_size, flatten, columns, sparse)
+    elif input_ext == '.txt':
+        columns = count_text_columns(input_file, encoding)
+        for rows in iter_text_rows(input_file, encoding, chunk_size):
+            rows = [row + [None] * (columns - len(row)) for row in rows]
+            yield pd.DataFrame(rows, columns=range(columns))
+    elif input_ext in COLUMNAR_INPUTS:
+        from .columnar import open_batches
+        _, batches = open_batches(input_file, batch_size=min(chunk_size, DEFAULT_BATCH_SIZE))
+        for batch in batches:
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Streaming input from {input_ext} is not supported")
+
+
+def stream_document(input_file, output_file, format, encoding, headers, chunk_size=None, schemas=None,
+                    flatten=False):
+    chunk_size = int(chunk_size or DEFAULT_CHUNK_SIZE)
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1 row")
+    
+    dtypes = None
+    if os.path.splitext(input_file)[1].lower() == '.csv':
+        dtypes = csv_chunk_dtypes(input_file, encoding, chunk_size)
+        if schemas is not None:
+            # Categoricals would give each chunk its own dictionary, which
+            # the Arrow writers cannot append to one file
+            _, hints = csv_dtypes(input_file, encoding, schemas, format not in COLUMNAR_OUTPUTS)
+            dtypes.update(hints or {})
+        dtypes = dtypes or None
+    
+    columns = sparse = None
+    if os.path.splitext(input_file)[1].lower() in JSON_INPUTS and format not in RECORD_OUTPUTS:
+        # Records may bring new keys at any point, but tabular outputs fix
+        # their columns with the first chunk; one decoding pass collects them
+        columns, sparse = scan_columns(input_file, encoding, flatten)
+    
+    with ChunkWriter(output_file, format, encoding, headers) as writer:
+        for chunk in iter_chunks(input_file, encoding, chunk_size, dtypes, flatten, columns, sparse):
+            writer.write(chunk)
@@ -0,0 +1,325 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import hash_file, normalize_options
+from .engine import INPUT_EXTENSIONS, is_multi_output, output_path_for
+from .excel import writes_sheet_files
+from .images import rendition_paths
+from .media import variant_paths
+
+# Kept in the output tree, so a mirror carries its own record of what it holds
+MANIFEST_NAME = ".converter-manifest.sqlite"
+
+# Files modified more recently than this may still be being written; they
+# are left for the next pass
+DEFAULT_SETTLE_SECONDS = 2.0
+
+
+def options_key(category, options):
+    normalized = normalize_options(category, options)
+    for name in ('renditions', 'variants'):
+        if options.get(name):
+            normalized[name] = options[name]
+    text = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def expected_outputs(category, input_file, output, options):
+    # The files a job writes, so they can be pruned with their source
+    if options.get('renditions'):
+        return rendition_paths(input_file, output, options['renditions'])
+    if options.get('variants'):
+        return variant_paths(input_file, output, options['variants'])
+    if writes_sheet_files(options):
+        base_name = glob.escape(os.path.splitext(os.path.basename(input_file))[0])
+        format = options['format']
+        pattern = os.path.join(glob.escape(output), f"{base_name}-*.{format}")
+        single = os.path.join(output, f"{os.path.splitext(os.path.basename(input_file))[0]}.{format}")
+        return sorted(glob.glob(pattern)) + ([single] if os.path.exists(single) else [])
+    return [output]
+
+
+class SyncManifest:
+    # What has been converted from a source tree: one row per source file,
+    # keyed by its path relative to the source directory
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " outputs TEXT NOT NULL,"
+            " converted_at REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def get(self, path):
+        row = self.db.execute(
+            "SELECT size, mtime_ns, hash, options, outputs FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, digest, options, outputs = row
+        return {'size': size, 'mtime_ns': mtime_ns, 'hash': digest,
+                'options': options, 'outputs': json.loads(outputs)}
+
+    def record(self, path, size, mtime_ns, digest, options, outputs):
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, options, outputs, converted_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, digest, options, json.dumps(outputs), time.time())
+        )
+        self.db.commit()
+
+    def touch(self, path, size, mtime_ns):
+        # The content is unchanged; only its timestamp moved
+        self.db.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", (size, mtime_ns, path))
+        self.db.commit()
+
+    def remove(self, path):
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.db.commit()
+
+    def paths(self, prefix=None):
+        if prefix:
+            rows = self.db.execute(
+                "SELECT path FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                (prefix, len(prefix) + 1, prefix + "/")
+            )
+        else:
+            rows = self.db.execute("SELECT path FROM files")
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+class DirectorySync:
+    # Mirrors source_dir into output_dir, converting only files that are
+    # new or have changed (by size, mtime and then content hash) since the
+    # manifest last saw them, or whose options changed. With prune, outputs
+    # whose source has gone are deleted.
+    #
+    # runner is a ConversionExecutor or ConversionPipeline; on_result, if
+    # given, is called with each (input_file, output, error).
+    def __init__(self, source_dir, output_dir, category, options, runner, manifest_path=None,
+                 prune=False, settle=DEFAULT_SETTLE_SECONDS, on_result=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.category = category
+        self.options = options
+        self.runner = runner
+        self.prune_deleted = prune
+        self.settle = settle
+        self.on_result = on_result
+        self.extensions = set(INPUT_EXTENSIONS[category])
+        self.multi_output = is_multi_output(options)
+        self.options_key = options_key(category, options)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.manifest = SyncManifest(manifest_path or os.path.join(self.output_dir, MANIFEST_NAME))
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.source_dir).replace(os.sep, "/")
+
+    def output_for(self, rel_path):
+        output_dir = os.path.join(self.output_dir, *rel_path.split("/")[:-1])
+        if self.multi_output:
+            return output_dir
+        return output_path_for(rel_path, output_dir, self.options['format'])
+
+    def wanted(self, path):
+        return os.path.splitext(path)[1].lower() in self.extensions
+
+    def scan(self, directory=None):
+        # Yields (rel_path, path, stat) for every convertible file. The
+        # output tree is skipped when it sits inside the source tree.
+        stack = [directory or self.source_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.abspath(entry.path) != self.output_dir:
+                        stack.append(entry.path)
+                elif entry.is_file() and self.wanted(entry.name):
+                    yield self.relative(entry.path), entry.path, entry.stat()
+
+    def needs_conversion(self, rel_path, path, stat):
+        entry = self.manifest.get(rel_path)
+        if entry is None or entry['options'] != self.options_key:
+            return True
+        if not all(os.path.exists(output) for output in entry['outputs']):
+            return True
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return False
+        if entry['size'] != stat.st_size:
+            return True
+        # Same size but a new mtime (touched, or copied without -p): only
+        # the content hash can tell
+        if hash_file(path) == entry['hash']:
+            self.manifest.touch(rel_path, stat.st_size, stat.st_mtime_ns)
+            return False
+        return True
+
+    def plan(self, paths=None):
+        # Works out (jobs, unchanged, deleted, waiting) for the whole tree,
+        # or only for the given paths when a watcher reports changes
+        if paths is None:
+            candidates = self.scan()
+        else:
+            candidates = []
+            for path in paths:
+                if os.path.isdir(path):
+                    candidates.extend(self.scan(path))
+                elif os.path.isfile(path) and self.wanted(path):
+                    candidates.append((self.relative(path), path, os.stat(path)))
+
+        jobs = []
+        seen = set()
+        unchanged = waiting = 0
+        now = time.time()
+        for rel_path, path, stat in candidates:
+            seen.add(rel_path)
+            if now - stat.st_mtime < self.settle:
+                waiting += 1
+            elif self.needs_conversion(rel_path, path, stat):
+                jobs.append((path, self.output_for(rel_path)))
+            else:
+                unchanged += 1
+
+        if paths is None:
+            deleted = [rel_path for rel_path in self.manifest.paths() if rel_path not in seen]
+        else:
+            deleted = []
+            for path in paths:
+                if not os.path.exists(path):
+                    deleted.extend(self.manifest.paths(self.relative(path)))
+        return jobs, unchanged, deleted, waiting
+
+    def prune(self, rel_paths):
+        removed = 0
+        for rel_path in rel_paths:
+            entry = self.manifest.get(rel_path)
+            if entry is None:
+                continue
+            for output in entry['outputs']:
+                try:
+                    os.remove(output)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                self._remove_empty_dirs(os.path.dirname(output))
+            self.manifest.remove(rel_path)
+        return removed
+
+    def _remove_empty_dirs(self, directory):
+        while os.path.abspath(directory).startswith(self.output_dir + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def run(self, paths=None, progress=None):
+        # One incremental pass. Returns counts of what happened.
+        jobs, unchanged, deleted, waiting = self.plan(paths)
+        summary = {'converted': 0, 'failed': 0, 'unchanged': unchanged, 'waiting': waiting,
+                   'deleted': len(deleted), 'pruned': 0}
+        if self.prune_deleted and deleted:
+            summary['pruned'] = self.prune(deleted)
+
+        for _, output in jobs:
+            os.makedirs(output if self.multi_output else os.path.dirname(output), exist_ok=True)
+
+        # Stat before converting. The hash is taken afterwards, so the entry
+        # is only recorded if the stat still matches once it is: a file
+        # edited during the conversion or the hash is left for the next pass
+        # rather than paired with content that was never converted.
+        before = {}
+        for input_file, _ in jobs:
+            stat = os.stat(input_file)
+            before[input_file] = (stat.st_size, stat.st_mtime_ns)
+
+        for input_file, output, error in self.runner.run(self.category, jobs, self.options, progress):
+            if error is None:
+                size, mtime_ns = before[input_file]
+                outputs = expected_outputs(self.category, input_file, output, self.options)
+                digest = hash_file(input_file)
+                stat = os.stat(input_file)
+                if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                    self.manifest.record(self.relative(input_file), size, mtime_ns, digest,
+                                         self.options_key, outputs)
+                summary['converted'] += 1
+            else:
+                summary['failed'] += 1
+            if self.on_result is not None:
+                self.on_result(input_file, output, error)
+        return summary
+
+    def watch(self, interval=2.0, on_pass=None, stop=None):
+        # Runs a full pass, then converts files as they change. Uses
+        # watchdog (inotify on Linux) when it is installed and rescans every
+        # interval seconds otherwise. stop is an optional threading.Event.
+        stop = stop or threading.Event()
+        summary = self.run()
+        if on_pass is not None:
+            on_pass(summary)
+
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            while not stop.wait(interval):
+                summary = self.run()
+                if on_pass is not None and (summary['converted'] or summary['failed'] or summary['pruned']):
+                    on_pass(summary)
+            return
+
+        changed = set()
+        lock = threading.Lock()
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                with lock:
+                    changed.add(event.src_path)
+                    if getattr(event, 'dest_path', None):
+                        changed.add(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.source_dir, recursive=True)
+        observer.start()
+        try:
+            while not stop.wait(interval):
+                with lock:
+                    paths = [path for path in changed
+                             if not os.path.abspath(path).startswith(self.output_dir + os.sep)]
+                    changed.clear()
+                if not paths:
+                    continue
+                summary = self.run(paths)
+                if summary['waiting']:
+                    # Still being written; look again on the next tick
+                    with lock:
+                        changed.update(paths)
+                if on_pass is not None and (summary['converted'] or summary['failed'] or summary['pruned']):
+                    on_pass(summary)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def close(self):
+        self.manifest.close()
@@ -0,0 +1,505 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .engine import CATEGORIES, is_multi_output, run_cached_job, run_conversion_job
+from .executor import MEDIA_CATEGORIES, default_worker_count
+from .ffmpeg import FFmpegScheduler
+from .journal import remove_job_temp_outputs
+
+# A worker that has not renewed a lease for this long is presumed dead and
+# its job goes back on the queue. Workers renew at a third of it.
+DEFAULT_LEASE_SECONDS = 120.0
+
+# Times a job is handed out before a run of expired leases fails it, so an
+# input that kills its worker cannot take down every host in turn
+DEFAULT_MAX_ATTEMPTS = 3
+
+# How often idle workers look for jobs and submitters look for results
+DEFAULT_POLL_INTERVAL = 1.0
+
+QUEUE_STATES = ['queued', 'leased', 'done', 'failed']
+
+
+class RemoteJobError(Exception):
+    # A job that failed on a queue worker; the message is the worker's
+    # "ExceptionType: message"
+    pass
+
+
+class JobQueue:
+    # Durable queue of conversion jobs in a SQLite file that any number of
+    # submitters and workers, on this host or others, open at the same path.
+    #
+    # Submitters add a batch of jobs, all 'queued'. Workers lease them one at
+    # a time: a lease belongs to one worker and expires unless renewed, and
+    # an expired lease puts the job back on the queue for another worker.
+    # Workers mark jobs 'done' or 'failed' when they finish; each finished
+    # job gets the next number in its batch, so submitters can collect
+    # results in order with a cheap range query.
+    #
+    # The file is opened in SQLite's default rollback-journal mode rather
+    # than WAL, which needs shared memory and does not work across hosts on
+    # network filesystems. Every write takes the database lock up front
+    # (BEGIN IMMEDIATE), so two workers can never lease the same job.
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        with self._write() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " id TEXT PRIMARY KEY,"
+                " category TEXT NOT NULL,"
+                " options TEXT NOT NULL,"
+                " max_attempts INTEGER NOT NULL,"
+                " submitter TEXT,"
+                " created REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " batch_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " category TEXT NOT NULL,"
+                " input TEXT NOT NULL,"
+                " output TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " lease_expires REAL,"
+                " progress REAL,"
+                " outputs TEXT,"
+                " error TEXT,"
+                " finished INTEGER,"
+                " updated REAL NOT NULL,"
+                " PRIMARY KEY (batch_id, seq))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (state, category)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (state, lease_expires)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (batch_id, finished)")
+
+    @contextlib.contextmanager
+    def _write(self):
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def submit(self, category, jobs, options, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        # jobs is a list of (input_file, output_file) pairs, stored as
+        # absolute paths; every host must see them at the same paths
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._write() as db:
+            db.execute(
+                "INSERT INTO batches (id, category, options, max_attempts, submitter, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (batch_id, category, json.dumps(options, default=str), max(1, max_attempts),
+                 socket.gethostname(), now)
+            )
+            db.executemany(
+                "INSERT INTO jobs (batch_id, seq, category, input, output, state, updated)"
+                " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                [(batch_id, seq, category, os.path.abspath(input_file), os.path.abspath(output_file), now)
+                 for seq, (input_file, output_file) in enumerate(jobs)]
+            )
+        return batch_id
+
+    def _finish(self, db, batch_id, seq, state, outputs=None, error=None):
+        db.execute(
+            "UPDATE jobs SET state = ?, outputs = ?, error = ?, lease_expires = NULL, updated = ?,"
+            " finished = (SELECT COALESCE(MAX(finished), 0) + 1 FROM jobs WHERE batch_id = ?)"
+            " WHERE batch_id = ? AND seq = ?",
+            (state, None if outputs is None else json.dumps(outputs), error, time.time(), batch_id, batch_id, seq)
+        )
+
+    def _requeue(self, db, batch_id, seq, attempts, max_attempts, error, now):
+        # Puts a job whose attempt came to nothing back on the queue, or
+        # fails it with error once it has used up its attempts
+        if attempts >= max_attempts:
+            self._finish(db, batch_id, seq, 'failed', error=error)
+        else:
+            db.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL, lease_expires = NULL, progress = NULL,"
+                " updated = ? WHERE batch_id = ? AND seq = ?",
+                (now, batch_id, seq)
+            )
+
+    def _expire(self, db, now):
+        # Requeues jobs whose worker stopped renewing its lease, or fails
+        # them once they have used up their attempts
+        rows = db.execute(
+            "SELECT j.batch_id, j.seq, j.attempts, j.worker, b.max_attempts"
+            " FROM jobs j JOIN batches b ON b.id = j.batch_id"
+            " WHERE j.state = 'leased' AND j.lease_expires < ?",
+            (now,)
+        ).fetchall()
+        for batch_id, seq, attempts, worker, max_attempts in rows:
+            self._requeue(db, batch_id, seq, attempts, max_attempts,
+                          f"LeaseExpired: no result after {attempts} attempts; last worker {worker}", now)
+        return len(rows)
+
+    def lease(self, worker_id, categories=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        # Hands the oldest queued job in one of categories to worker_id.
+        # Returns a dict with the job and its batch's category and options,
+        # or None when there is nothing to do.
+        categories = list(categories or CATEGORIES)
+        now = time.time()
+        with self._write() as db:
+            self._expire(db, now)
+            # One indexed lookup per category, which never sorts the queue,
+            # then the oldest of those
+            rows = [
+                db.execute(
+                    "SELECT j.rowid, j.batch_id, j.seq, j.input, j.output, j.attempts, b.category, b.options"
+                    " FROM jobs j JOIN batches b ON b.id = j.batch_id"
+                    " WHERE j.state = 'queued' AND j.category = ? ORDER BY j.rowid LIMIT 1",
+                    (category,)
+                ).fetchone()
+                for category in categories
+            ]
+            rows = [row for row in rows if row is not None]
+            if not rows:
+                return None
+            _, batch_id, seq, input_file, output_file, attempts, category, options = min(rows)
+            db.execute(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, worker = ?, lease_expires = ?,"
+                " progress = NULL, updated = ? WHERE batch_id = ? AND seq = ?",
+                (worker_id, now + lease_seconds, now, batch_id, seq)
+            )
+        return {'batch_id': batch_id, 'seq': seq, 'input': input_file, 'output': output_file,
+                'attempt': attempts + 1, 'category': category, 'options': json.loads(options)}
+
+    def renew(self, worker_id, leases, lease_seconds=DEFAULT_LEASE_SECONDS):
+        # leases maps (batch_id, seq) to the job's progress fraction or
+        # None. Extends the ones worker_id still holds and returns the keys
+        # of those it has lost to expiry.
+        now = time.time()
+        lost = set()
+        with self._write() as db:
+            for (batch_id, seq), progress in leases.items():
+                cursor = db.execute(
+                    "UPDATE jobs SET lease_expires = ?, progress = COALESCE(?, progress), updated = ?"
+                    " WHERE batch_id = ? AND seq = ? AND state = 'leased' AND worker = ?",
+                    (now + lease_seconds, progress, now, batch_id, seq, worker_id)
+                )
+                if cursor.rowcount == 0:
+                    lost.add((batch_id, seq))
+        return lost
+
+    def complete(self, worker_id, batch_id, seq, outputs=None, error=None):
+        # Records a job's result. Returns False, discarding the result, if
+        # worker_id no longer holds the lease because it expired and the job
+        # went to another worker.
+        with self._write() as db:
+            row = db.execute(
+                "SELECT state, worker FROM jobs WHERE batch_id = ? AND seq = ?", (batch_id, seq)
+            ).fetchone()
+            if row != ('leased', worker_id):
+                return False
+            self._finish(db, batch_id, seq, 'failed' if error else 'done', outputs, error)
+        return True
+
+    def retry(self, worker_id, batch_id, seq, error):
+        # Puts back a job worker_id could not finish through no fault of its
+        # own, such as a worker process that crashed under it. The attempt
+        # counts, so an input that crashes every worker it reaches fails
+        # with error after its last attempt. Returns False if worker_id no
+        # longer holds the lease.
+        with self._write() as db:
+            row = db.execute(
+                "SELECT j.state, j.worker, j.attempts, b.max_attempts"
+                " FROM jobs j JOIN batches b ON b.id = j.batch_id WHERE j.batch_id = ? AND j.seq = ?",
+                (batch_id, seq)
+            ).fetchone()
+            if row is None or row[:2] != ('leased', worker_id):
+                return False
+            self._requeue(db, batch_id, seq, row[2], row[3], error, time.time())
+        return True
+
+    def release(self, worker_id, keys):
+        # Puts jobs back on the queue without counting the attempt, for a
+        # worker that is shutting down cleanly
+        now = time.time()
+        with self._write() as db:
+            db.executemany(
+                "UPDATE jobs SET state = 'queued', attempts = MAX(0, attempts - 1), worker = NULL,"
+                " lease_expires = NULL, progress = NULL, updated = ?"
+                " WHERE batch_id = ? AND seq = ? AND state = 'leased' AND worker = ?",
+                [(now, batch_id, seq, worker_id) for batch_id, seq in keys]
+            )
+
+    def results(self, batch_id, after=0):
+        # Jobs of a batch finished after the after'th, in finishing order,
+        # as (finished, seq, input, output, outputs, error)
+        rows = self.db.execute(
+            "SELECT finished, seq, input, output, outputs, error FROM jobs"
+            " WHERE batch_id = ? AND finished > ? ORDER BY finished",
+            (batch_id, after)
+        ).fetchall()
+        return [(finished, seq, input_file, output_file, json.loads(outputs) if outputs else None, error)
+                for finished, seq, input_file, output_file, outputs, error in rows]
+
+    def running(self, batch_id):
+        # Progress of the batch's leased jobs, as (seq, fraction)
+        return self.db.execute(
+            "SELECT seq, progress FROM jobs WHERE batch_id = ? AND state = 'leased' AND progress IS NOT NULL",
+            (batch_id,)
+        ).fetchall()
+
+    def counts(self, batch_id):
+        rows = self.db.execute("SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state", (batch_id,))
+        counts = dict.fromkeys(QUEUE_STATES, 0)
+        counts.update(dict(rows.fetchall()))
+        return counts
+
+    def batches(self):
+        # Every batch with its job counts and the workers holding its
+        # leases, newest first
+        rows = self.db.execute(
+            "SELECT b.id, b.category, b.submitter, b.created,"
+            " SUM(j.state = 'queued'), SUM(j.state = 'leased'), SUM(j.state = 'done'),"
+            " SUM(j.state = 'failed'), COUNT(*), GROUP_CONCAT(DISTINCT CASE WHEN j.state = 'leased' THEN j.worker END)"
+            " FROM batches b JOIN jobs j ON j.batch_id = b.id"
+            " GROUP BY b.id ORDER BY b.created DESC"
+        ).fetchall()
+        return [{'id': batch_id, 'category': category, 'submitter': submitter, 'created': created,
+                 'queued': queued, 'leased': leased, 'done': done, 'failed': failed, 'total': total,
+                 'workers': workers.split(',') if workers else []}
+                for batch_id, category, submitter, created, queued, leased, done, failed, total, workers in rows]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class QueueRunner:
+    # Runs batches on queue workers instead of in this process. Drop-in for
+    # ConversionExecutor.run: the batch is submitted to the queue and
+    # results are yielded as workers report them.
+    def __init__(self, queue, poll_interval=DEFAULT_POLL_INTERVAL, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.batch_id = None
+
+    def run(self, category, jobs, options, progress=None):
+        # Results are yielded with the paths as given in jobs, not the
+        # absolute ones the queue stores
+        if not jobs:
+            return
+        self.batch_id = self.queue.submit(category, jobs, options, self.max_attempts)
+        yield from self.collect(self.batch_id, jobs, progress)
+
+    def collect(self, batch_id, jobs, progress=None):
+        after = 0
+        remaining = len(jobs)
+        while remaining:
+            rows = self.queue.results(batch_id, after)
+            for finished, seq, _, _, _, error in rows:
+                after = finished
+                remaining -= 1
+                input_file, output_file = jobs[seq]
+                if progress is not None:
+                    progress.finish(input_file, error is None)
+                yield input_file, output_file, None if error is None else RemoteJobError(error)
+            if remaining and not rows:
+                if progress is not None:
+                    for seq, fraction in self.queue.running(batch_id):
+                        progress.update(jobs[seq][0], fraction)
+                time.sleep(self.poll_interval)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class QueueWorker:
+    # Leases jobs from a JobQueue and converts them until stopped. Like the
+    # conversion service it keeps its pools warm between jobs: a spawn
+    # process pool for images and documents and the FFmpeg scheduler's
+    # thread pools for audio and video. It holds at most as many leases per
+    # category as that category has workers, so jobs it cannot start yet
+    # stay on the queue for other hosts. A worker process that crashes
+    # breaks the whole process pool; the pool is replaced and its jobs go
+    # back on the queue with the attempt counted.
+    #
+    # on_result, if given, is called as on_result(job, outputs, error) after
+    # each job, from the thread running the worker.
+    def __init__(self, queue, worker_id=None, workers=None, categories=None, cache=None, scheduler=None,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL, on_result=None):
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.workers = max(1, int(workers)) if workers else default_worker_count()
+        self.categories = list(categories or CATEGORIES)
+        self.cache = cache
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or FFmpegScheduler(audio_workers=workers, video_workers=workers)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self.limits = {
+            category: self.scheduler.workers[category] if category in MEDIA_CATEGORIES else self.workers
+            for category in self.categories
+        }
+        self.pool = None
+        # The process pool each pooled job was submitted to, so a crash is
+        # only handled once per pool
+        self._pools = {}
+        self._active = {}
+        self._progress = {}
+        self._lost = set()
+        self.completed = 0
+
+    def _free_categories(self):
+        running = {}
+        for job in self._active.values():
+            running[job['category']] = running.get(job['category'], 0) + 1
+        return [category for category in self.categories if running.get(category, 0) < self.limits[category]]
+
+    def _fill(self):
+        # Leases jobs until every category is at its limit or the queue has
+        # nothing more for us. Returns how many were leased.
+        leased = 0
+        while True:
+            categories = self._free_categories()
+            if not categories:
+                return leased
+            job = self.queue.lease(self.worker_id, categories, self.lease_seconds)
+            if job is None:
+                return leased
+            leased += 1
+            try:
+                future = self._submit(job)
+            except BrokenProcessPool as e:
+                # The pool broke before its jobs reported it
+                self._replace_pool(self.pool)
+                self._retry(job, f"{type(e).__name__}: {e}")
+                continue
+            except Exception as e:
+                self._report(job, None, f"{type(e).__name__}: {e}")
+                continue
+            self._active[future] = job
+
+    def _submit(self, job):
+        category, input_file, output_file, options = job['category'], job['input'], job['output'], job['options']
+        # A worker that died on this job may have left a partial output
+        remove_job_temp_outputs([(input_file, output_file)])
+        os.makedirs(output_file if is_multi_output(options) else os.path.dirname(output_file), exist_ok=True)
+        function = run_conversion_job if self.cache is None else run_cached_job
+        if category in MEDIA_CATEGORIES:
+            if not options.get('threads'):
+                options = dict(options, threads=self.scheduler.threads_for(category))
+            key = (job['batch_id'], job['seq'])
+
+            def report(fraction, details=None):
+                self._progress[key] = fraction
+
+            args = (category, input_file, output_file, options) + ((self.cache,) if self.cache else ()) + (report,)
+            return self.scheduler.submit(category, function, *args)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        args = (category, input_file, output_file, options) + ((self.cache,) if self.cache else ())
+        future = self.pool.submit(function, *args)
+        self._pools[future] = self.pool
+        return future
+
+    def _finish(self, future):
+        job = self._active.pop(future)
+        pool = self._pools.pop(future, None)
+        self._progress.pop((job['batch_id'], job['seq']), None)
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker process died (an OOM kill, a segfault in a codec) and
+            # took every job in the pool with it. The pool is replaced and
+            # the jobs go back on the queue rather than failing.
+            self._replace_pool(pool)
+            self._retry(job, f"{type(error).__name__}: {error}")
+            return
+        outputs = None
+        if error is None:
+            result = future.result()
+            if self.cache is not None:
+                # run_cached_job returns (output, hit)
+                result = result[0]
+            outputs = result if isinstance(result, list) else [result]
+        self._report(job, outputs, None if error is None else f"{type(error).__name__}: {error}")
+
+    def _replace_pool(self, broken):
+        # Every job on a broken pool notices; only the first replaces it.
+        # The next pooled job starts a new one.
+        if broken is not None and self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _retry(self, job, error):
+        key = (job['batch_id'], job['seq'])
+        if key in self._lost:
+            self._lost.discard(key)
+            return
+        self.queue.retry(self.worker_id, job['batch_id'], job['seq'], error)
+
+    def _report(self, job, outputs, error):
+        key = (job['batch_id'], job['seq'])
+        if key in self._lost:
+            # The lease expired and the job belongs to another worker now
+            self._lost.discard(key)
+            return
+        if self.queue.complete(self.worker_id, job['batch_id'], job['seq'], outputs, error):
+            self.completed += 1
+            if self.on_result is not None:
+                self.on_result(job, outputs, error)
+
+    def _renew(self):
+        leases = {(job['batch_id'], job['seq']): self._progress.get((job['batch_id'], job['seq']))
+                  for job in self._active.values()}
+        if leases:
+            self._lost |= self.queue.renew(self.worker_id, leases, self.lease_seconds)
+
+    def run(self, stop=None, exit_when_idle=False):
+        # Works until stop (a threading.Event) is set or, with
+        # exit_when_idle, until the queue has nothing left for this worker.
+        # Jobs still running when it stops are put back on the queue.
+        stop = stop or threading.Event()
+        last_renew = time.monotonic()
+        try:
+            while not stop.is_set():
+                leased = self._fill()
+                if not self._active:
+                    if exit_when_idle and not leased:
+                        return
+                    stop.wait(self.poll_interval)
+                    continue
+                done, _ = wait(list(self._active), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(future)
+                if time.monotonic() - last_renew >= self.lease_seconds / 3:
+                    self._renew()
+                    last_renew = time.monotonic()
+        finally:
+            if self._active:
+                self.queue.release(self.worker_id, [(job['batch_id'], job['seq']) for job in self._active.values()])
+                self._active = {}
+                self._pools = {}
+            self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.owns_scheduler:
+            self.scheduler.shutdown(wait=False)
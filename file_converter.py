@@ -1,14 +1,142 @@
 import os
 import sys
+import logging
+import collections
 import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
-from PIL import Image, ImageTk
-import pandas as pd
+import tkinter.font as tkfont
+from tkinter import filedialog, ttk, messagebox, simpledialog
 import subprocess
 import threading
-import shutil
 from datetime import datetime
 
+from converter import (FORMATS, INPUT_EXTENSIONS, ConversionCache, ConversionExecutor, JobJournal, JobQueue,
+                       QueueRunner, default_worker_count, is_multi_output, output_path_for)
+from converter.images import RESAMPLE_FILTERS, convert_image
+from converter.admission import AdmissionController, default_memory_budget
+from converter.documents import convert_document
+from converter.filelist import PathStore, ingest_paths
+from converter.media import convert_audio, convert_video
+from converter.pipeline import ConversionPipeline
+from converter.progress import BatchProgress, format_progress
+from converter.streaming import DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# How often the file list and count are refreshed while files are being added
+INGEST_POLL_MS = 100
+
+# How often queued UI updates from worker threads are applied, and how many
+# are applied per tick so a burst cannot stall the main loop
+UI_TICK_MS = 50
+MAX_EVENTS_PER_TICK = 200
+
+
+class UIEventBus:
+    # Tkinter widgets may only be touched from the main thread. Worker
+    # threads post updates here instead, and the main loop applies them on
+    # a fixed-rate after() tick, so the cost to the UI does not depend on
+    # how many files a batch has.
+    #
+    # post() delivers every event in order. post_latest() coalesces: of the
+    # events posted under one key before a tick, only the newest is applied,
+    # at the position of the first, so a final status posted after the
+    # last progress update is never overwritten by it.
+    def __init__(self, root, interval=UI_TICK_MS):
+        self.root = root
+        self.interval = interval
+        self._queue = collections.deque()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self.root.after(self.interval, self._drain)
+    
+    def post(self, handler, *args):
+        self._queue.append((None, handler, args))
+    
+    def post_latest(self, key, handler, *args):
+        with self._lock:
+            pending = key in self._latest
+            self._latest[key] = (handler, args)
+            if not pending:
+                self._queue.append((key, None, None))
+    
+    def _drain(self):
+        try:
+            for _ in range(min(len(self._queue), MAX_EVENTS_PER_TICK)):
+                key, handler, args = self._queue.popleft()
+                if key is not None:
+                    with self._lock:
+                        handler, args = self._latest.pop(key)
+                try:
+                    handler(*args)
+                except Exception:
+                    logger.exception("UI update failed")
+        finally:
+            # Scheduled after the handlers run, so a modal dialog opened by
+            # one pauses the tick instead of stacking more dialogs on it
+            self.root.after(self.interval, self._drain)
+
+
+class VirtualFileList:
+    # A Listbox that shows a PathStore of any size. Only the rows that fit
+    # on screen are ever inserted into the widget, and the scrollbar is
+    # driven from the store's length, so adding or scrolling through 200k
+    # files costs the same as a dozen.
+    def __init__(self, parent, store, **listbox_options):
+        self.store = store
+        self.top = 0
+        self.rows = 1
+        self._drawn = None
+        
+        self.frame = ttk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, "units"))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-1, "units"))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(1, "units"))
+        self.listbox.bind("<Prior>", lambda event: self.scroll(-1, "pages"))
+        self.listbox.bind("<Next>", lambda event: self.scroll(1, "pages"))
+    
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+    
+    def _on_resize(self, event):
+        self.rows = max(1, event.height // self.line_height)
+        self.refresh()
+    
+    def yview(self, *args):
+        # Scrollbar command: ("moveto", fraction) or ("scroll", n, what)
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.store))
+            self.refresh()
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]), args[2])
+    
+    def scroll(self, amount, what):
+        self.top += amount * (self.rows if what == "pages" else 1)
+        self.refresh()
+        return "break"
+    
+    def refresh(self):
+        total = len(self.store)
+        self.top = max(0, min(self.top, total - self.rows))
+        bottom = min(total, self.top + self.rows)
+        if self._drawn != (self.top, bottom):
+            self.listbox.delete(0, tk.END)
+            names = self.store.names(self.top, bottom)
+            if names:
+                self.listbox.insert(tk.END, *names)
+            self._drawn = (self.top, bottom)
+        if total:
+            self.scrollbar.set(self.top / total, bottom / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
 class ModernFileConverterApp:
     def __init__(self, root):
         self.root = root
@@ -101,9 +229,64 @@ class ModernFileConverterApp:
         )
         self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        # Number of parallel conversion workers
+        self.workers_label = ttk.Label(self.status_frame, text="Workers:", font=("Helvetica", 10))
+        self.workers_label.pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.workers_var = tk.IntVar(value=default_worker_count())
+        self.workers_spinbox = ttk.Spinbox(
+            self.status_frame,
+            from_=1,
+            to=max(64, default_worker_count()),
+            textvariable=self.workers_var,
+            width=4
+        )
+        self.workers_spinbox.pack(side=tk.LEFT)
+        
+        # Reuse earlier outputs for unchanged inputs and options
+        self.cache_var = tk.BooleanVar(value=False)
+        self.cache_check = ttk.Checkbutton(
+            self.status_frame,
+            text="Cache results",
+            variable=self.cache_var
+        )
+        self.cache_check.pack(side=tk.LEFT, padx=(20, 0))
+        
+        # Overlap reads and writes on slow storage with conversion
+        self.pipeline_var = tk.BooleanVar(value=False)
+        self.pipeline_check = ttk.Checkbutton(
+            self.status_frame,
+            text="Prefetch I/O",
+            variable=self.pipeline_var
+        )
+        self.pipeline_check.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Hand batches to queue workers, here or on other hosts, instead of
+        # converting in this process
+        self.queue_path = None
+        self.queue_var = tk.BooleanVar(value=False)
+        self.queue_check = ttk.Checkbutton(
+            self.status_frame,
+            text="Shared queue",
+            variable=self.queue_var,
+            command=self.choose_queue
+        )
+        self.queue_check.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Recent conversions
         self.recent_conversions = []
         
+        # Updates from conversion threads, applied on the main thread
+        self.events = UIEventBus(self.root)
+        
+        # Durable record of each batch, so one cut short by a crash can be resumed
+        try:
+            self.journal = JobJournal()
+        except Exception as e:
+            logger.warning("Conversion journal unavailable: %s", e)
+            self.journal = None
+        self.root.after(500, self.offer_resume)
+        
         # Bind tab selection event
         self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_change)
         
@@ -128,6 +311,21 @@ class ModernFileConverterApp:
         )
         browse_button.pack(side=tk.LEFT, padx=(0, 10))
         
+        # Folders and patterns are expanded on a background thread
+        folder_button = ttk.Button(
+            file_buttons_frame, 
+            text="Add Folder", 
+            command=lambda: self.browse_folder(category)
+        )
+        folder_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        pattern_button = ttk.Button(
+            file_buttons_frame, 
+            text="Add Pattern", 
+            command=lambda: self.add_pattern(category)
+        )
+        pattern_button.pack(side=tk.LEFT, padx=(0, 10))
+        
         clear_button = ttk.Button(
             file_buttons_frame, 
             text="Clear All", 
@@ -146,23 +344,17 @@ class ModernFileConverterApp:
         )
         file_count_label.pack(anchor="w")
         
-        # Files listbox with scrollbar
-        files_frame = ttk.Frame(left_frame)
-        files_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
-        
-        files_listbox = tk.Listbox(
-            files_frame, 
+        # Files list; only the visible rows are drawn
+        files = PathStore()
+        files_list = VirtualFileList(
+            left_frame, 
+            files,
             selectbackground=self.primary_color,
             activestyle="none",
             font=("Helvetica", 10)
         )
-        files_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        files_scrollbar = ttk.Scrollbar(files_frame)
-        files_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        files_listbox.config(yscrollcommand=files_scrollbar.set)
-        files_scrollbar.config(command=files_listbox.yview)
+        files_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        files_listbox = files_list.listbox
         
         # Right side - conversion options
         right_frame = ttk.LabelFrame(content_frame, text="Conversion Options")
@@ -247,6 +439,27 @@ class ModernFileConverterApp:
             height_var = tk.StringVar(value="600")
             height_entry = ttk.Entry(resize_frame, textvariable=height_var, width=8)
             height_entry.grid(row=2, column=1, padx=5, sticky="w")
+            
+            fast_resize_var = tk.BooleanVar(value=False)
+            fast_resize_check = ttk.Checkbutton(
+                resize_frame, 
+                text="Fast resize (reduced decode)", 
+                variable=fast_resize_var
+            )
+            fast_resize_check.grid(row=3, column=0, columnspan=3, sticky="w", pady=5)
+            
+            resample_label = ttk.Label(resize_frame, text="Filter:")
+            resample_label.grid(row=4, column=0, sticky="w", pady=5)
+            
+            resample_var = tk.StringVar(value="lanczos")
+            resample_combobox = ttk.Combobox(
+                resize_frame, 
+                textvariable=resample_var,
+                values=RESAMPLE_FILTERS,
+                width=10,
+                state="readonly"
+            )
+            resample_combobox.grid(row=4, column=1, padx=5, sticky="w")
         
         elif category == "Documents":
             # Encoding options for documents
@@ -278,6 +491,44 @@ class ModernFileConverterApp:
                 variable=header_var
             )
             header_check.pack(anchor="w")
+            
+            # Streaming options for files larger than memory
+            stream_frame = ttk.Frame(advanced_frame)
+            stream_frame.pack(fill=tk.X, padx=10, pady=10)
+            
+            stream_var = tk.BooleanVar(value=False)
+            stream_check = ttk.Checkbutton(
+                stream_frame, 
+                text="Stream large files in chunks of", 
+                variable=stream_var
+            )
+            stream_check.grid(row=0, column=0, sticky="w")
+            
+            chunk_var = tk.StringVar(value=str(DEFAULT_CHUNK_SIZE))
+            chunk_entry = ttk.Entry(stream_frame, textvariable=chunk_var, width=8)
+            chunk_entry.grid(row=0, column=1, padx=5, sticky="w")
+            
+            chunk_label = ttk.Label(stream_frame, text="rows")
+            chunk_label.grid(row=0, column=2, sticky="w")
+            
+            # Arrow's CSV parser is multithreaded and lets CSV go to
+            # Parquet/Feather without building a DataFrame
+            arrow_var = tk.BooleanVar(value=False)
+            arrow_check = ttk.Checkbutton(
+                stream_frame, 
+                text="Parse CSV with Arrow (faster)", 
+                variable=arrow_var
+            )
+            arrow_check.grid(row=1, column=0, columnspan=3, sticky="w", pady=(5, 0))
+            
+            # Workbooks are opened once however many sheets are converted
+            sheets_var = tk.BooleanVar(value=False)
+            sheets_check = ttk.Checkbutton(
+                stream_frame, 
+                text="Convert every sheet of Excel workbooks", 
+                variable=sheets_var
+            )
+            sheets_check.grid(row=2, column=0, columnspan=3, sticky="w", pady=(5, 0))
         
         elif category in ["Audio", "Video"]:
             # Audio/video options
@@ -362,7 +613,12 @@ class ModernFileConverterApp:
                 encoding_var.get() if category == "Documents" else None,
                 header_var.get() if category == "Documents" else None,
                 codec_var.get() if category in ["Audio", "Video"] else None,
-                bitrate_var.get() if category in ["Audio", "Video"] else None
+                bitrate_var.get() if category in ["Audio", "Video"] else None,
+                chunk_size=chunk_var.get() if category == "Documents" and stream_var.get() else None,
+                fast_resize=fast_resize_var.get() if category == "Images" else None,
+                resample=resample_var.get() if category == "Images" else None,
+                csv_engine=("pyarrow" if arrow_var.get() else "pandas") if category == "Documents" else None,
+                sheet="*" if category == "Documents" and sheets_var.get() else None
             ),
             style="Success.TButton"
         )
@@ -381,22 +637,19 @@ class ModernFileConverterApp:
         
         # Store references to widgets we need to access later
         setattr(self, f"{category.lower()}_files_listbox", files_listbox)
+        setattr(self, f"{category.lower()}_files_list", files_list)
         setattr(self, f"{category.lower()}_file_count_label", file_count_label)
         setattr(self, f"{category.lower()}_history_listbox", history_listbox)
         setattr(self, f"{category.lower()}_format_var", format_var)
         setattr(self, f"{category.lower()}_output_var", output_var)
         
-        # Store selected files for this category
-        setattr(self, f"{category.lower()}_files", [])
+        # Store selected files for this category, and the stop events of
+        # folders and patterns still being added
+        setattr(self, f"{category.lower()}_files", files)
+        setattr(self, f"{category.lower()}_ingests", [])
     
     def get_format_options(self, category):
-        formats = {
-            "Images": ["jpg", "png", "gif", "bmp", "tiff", "webp"],
-            "Documents": ["csv", "xlsx", "json", "txt"],
-            "Audio": ["mp3", "wav", "ogg", "flac"],
-            "Video": ["mp4", "avi", "mkv", "webm"]
-        }
-        return formats.get(category, [])
+        return list(FORMATS.get(category, []))
     
     def browse_files(self, category):
         filetypes = self.get_filetypes(category)
@@ -407,9 +660,47 @@ class ModernFileConverterApp:
         )
         
         if files:
-            current_files = getattr(self, f"{category.lower()}_files")
-            current_files.extend(files)
-            self.update_file_list(category)
+            self.add_sources(category, files)
+    
+    def browse_folder(self, category):
+        directory = filedialog.askdirectory(title=f"Select a Folder of {category} Files")
+        if directory:
+            self.add_sources(category, [directory])
+    
+    def add_pattern(self, category):
+        pattern = simpledialog.askstring(
+            "Add Pattern",
+            "Glob pattern of files to add (use ** to search subfolders):",
+            parent=self.root
+        )
+        if pattern:
+            self.add_sources(category, [pattern])
+    
+    def add_sources(self, category, sources):
+        # Directories are walked and patterns expanded off the main thread;
+        # the list fills in as batches of paths arrive
+        files = getattr(self, f"{category.lower()}_files")
+        stop = threading.Event()
+        getattr(self, f"{category.lower()}_ingests").append(stop)
+        
+        def ingest():
+            try:
+                ingest_paths(files, sources, INPUT_EXTENSIONS[category], stop)
+            except Exception as e:
+                logger.error("Error adding %s files: %s", category.lower(), e)
+            finally:
+                stop.set()
+        
+        threading.Thread(target=ingest, daemon=True).start()
+        self._poll_ingest(category, stop)
+    
+    def _poll_ingest(self, category, stop):
+        ingests = getattr(self, f"{category.lower()}_ingests")
+        if stop.is_set() and stop in ingests:
+            ingests.remove(stop)
+        self.update_file_list(category)
+        if not stop.is_set():
+            self.root.after(INGEST_POLL_MS, self._poll_ingest, category, stop)
     
     def get_filetypes(self, category):
         if category == "Images":
@@ -425,11 +716,13 @@ class ModernFileConverterApp:
             )
         elif category == "Documents":
             return (
-                ("All Documents", "*.csv *.xlsx *.xls *.json *.txt"),
+                ("All Documents", "*.csv *.xlsx *.xls *.json *.jsonl *.txt *.parquet *.feather *.arrow"),
                 ("CSV", "*.csv"),
                 ("Excel", "*.xlsx *.xls"),
-                ("JSON", "*.json"),
+                ("JSON", "*.json *.jsonl"),
                 ("Text", "*.txt"),
+                ("Parquet", "*.parquet"),
+                ("Feather / Arrow", "*.feather *.arrow"),
                 ("All Files", "*.*")
             )
         elif category == "Audio":
@@ -456,23 +749,26 @@ class ModernFileConverterApp:
     
     def update_file_list(self, category):
         files = getattr(self, f"{category.lower()}_files")
-        listbox = getattr(self, f"{category.lower()}_files_listbox")
+        files_list = getattr(self, f"{category.lower()}_files_list")
         count_label = getattr(self, f"{category.lower()}_file_count_label")
         
-        # Clear and repopulate the listbox
-        listbox.delete(0, tk.END)
-        for file in files:
-            listbox.insert(tk.END, os.path.basename(file))
+        # Redraw the visible rows
+        files_list.refresh()
         
         # Update count label
         file_count = len(files)
+        adding = " (adding...)" if getattr(self, f"{category.lower()}_ingests") else ""
         if file_count == 0:
-            count_label.config(text="No files selected")
+            count_label.config(text=f"No files selected{adding}")
         else:
-            count_label.config(text=f"{file_count} file{'s' if file_count != 1 else ''} selected")
+            count_label.config(text=f"{file_count:,} file{'s' if file_count != 1 else ''} selected{adding}")
     
     def clear_files(self, category):
-        setattr(self, f"{category.lower()}_files", [])
+        ingests = getattr(self, f"{category.lower()}_ingests")
+        for stop in ingests:
+            stop.set()
+        ingests.clear()
+        getattr(self, f"{category.lower()}_files").clear()
         self.update_file_list(category)
     
     def browse_output(self, output_var):
@@ -484,6 +780,21 @@ class ModernFileConverterApp:
         if output_dir:
             output_var.set(output_dir)
     
+    def choose_queue(self):
+        if not self.queue_var.get():
+            return
+        path = filedialog.asksaveasfilename(
+            title="Select Shared Job Queue",
+            initialfile=os.path.basename(self.queue_path or "queue.sqlite"),
+            defaultextension=".sqlite",
+            filetypes=[("SQLite database", "*.sqlite"), ("All files", "*.*")],
+            confirmoverwrite=False
+        )
+        if path:
+            self.queue_path = path
+        else:
+            self.queue_var.set(False)
+    
     def on_tab_change(self, event):
         # Get the current tab name
         current_tab = self.tab_control.tab(self.tab_control.select(), "text")
@@ -491,13 +802,18 @@ class ModernFileConverterApp:
     
     def convert_files(self, category, files_listbox, format, output_dir, 
                      quality=None, resize=None, dimensions=None, 
-                     encoding=None, headers=None, codec=None, bitrate=None):
+                     encoding=None, headers=None, codec=None, bitrate=None, chunk_size=None,
+                     fast_resize=None, resample=None, csv_engine=None, sheet=None):
         files = getattr(self, f"{category.lower()}_files")
         
         if not files:
             messagebox.showwarning("No Files Selected", f"Please select {category.lower()} to convert.")
             return
         
+        if getattr(self, f"{category.lower()}_ingests"):
+            messagebox.showwarning("Still Adding Files", "Please wait until all files have been added.")
+            return
+        
         if not os.path.isdir(output_dir):
             try:
                 os.makedirs(output_dir)
@@ -505,64 +821,196 @@ class ModernFileConverterApp:
                 messagebox.showerror("Error", f"Could not create output directory: {e}")
                 return
         
+        if chunk_size is not None:
+            try:
+                chunk_size = int(chunk_size)
+                if chunk_size < 1:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "Chunk size must be a positive whole number of rows.")
+                return
+        
+        try:
+            max_workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            max_workers = default_worker_count()
+        
+        job_queue = None
+        if self.queue_var.get() and self.queue_path:
+            try:
+                job_queue = JobQueue(self.queue_path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not open the job queue: {e}")
+                return
+        
+        cache = None
+        if self.cache_var.get() and job_queue is None:
+            # Queue workers use their own caches
+            try:
+                cache = ConversionCache()
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not open the conversion cache: {e}")
+                return
+        
+        options = {
+            'format': format,
+            'quality': quality,
+            'resize': resize,
+            'dimensions': dimensions,
+            'fast_resize': fast_resize,
+            'resample': resample,
+            'encoding': encoding,
+            'headers': headers,
+            'chunk_size': chunk_size,
+            'csv_engine': csv_engine,
+            'sheet': sheet,
+            'codec': codec,
+            'bitrate': bitrate,
+        }
+        
         # Start conversion in a separate thread
         threading.Thread(
             target=self._convert_files_thread,
-            args=(category, files, format, output_dir, quality, resize, dimensions, 
-                  encoding, headers, codec, bitrate),
+            args=(category, list(files), output_dir, options, max_workers, cache, self.pipeline_var.get(), None,
+                  job_queue),
             daemon=True
         ).start()
     
-    def _convert_files_thread(self, category, files, format, output_dir, 
-                             quality, resize, dimensions, encoding, headers, codec, bitrate):
-        self.status_label.config(text=f"Converting {category.lower()}...")
-        self.progress_var.set(0)
+    def offer_resume(self):
+        if self.journal is None:
+            return
+        batches = self.journal.unfinished_batches()
+        if not batches:
+            return
+        
+        batch = batches[0]
+        created = datetime.fromtimestamp(batch['created']).strftime("%Y-%m-%d %H:%M:%S")
+        if not messagebox.askyesno("Resume Conversion",
+                f"A {batch['category'].lower()} conversion started {created} stopped with "
+                f"{batch['remaining']} of {batch['total']} files left.\n\nResume it?"):
+            # Not asked about again; the CLI can still resume it by id
+            self.journal.finish_batch(batch['id'])
+            return
+        
+        category, options = self.journal.batch(batch['id'])
+        try:
+            max_workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            max_workers = default_worker_count()
+        threading.Thread(
+            target=self._convert_files_thread,
+            args=(category, None, None, options, max_workers, None, self.pipeline_var.get(), batch['id']),
+            daemon=True
+        ).start()
+    
+    def _convert_files_thread(self, category, files, output_dir, options, max_workers, cache=None,
+                              use_pipeline=False, batch_id=None, job_queue=None):
+        # Runs on a worker thread: every widget update goes through
+        # self.events. Whatever goes wrong (a broken worker pool, a locked
+        # journal), the window is left showing the failure rather than a
+        # batch that looks like it is still running.
+        try:
+            self._convert_batch(category, files, output_dir, options, max_workers, cache, use_pipeline,
+                                batch_id, job_queue)
+        except Exception as e:
+            logger.exception("Conversion of %s failed", category.lower())
+            self.events.post(self.progress_var.set, 0)
+            self.events.post(self.status_label.config, {'text': f"Conversion failed: {type(e).__name__}: {e}"})
+            self.events.post(messagebox.showerror, "Conversion Failed", f"{type(e).__name__}: {e}")
+        finally:
+            if job_queue is not None:
+                job_queue.close()
+    
+    def _convert_batch(self, category, files, output_dir, options, max_workers, cache=None,
+                       use_pipeline=False, batch_id=None, job_queue=None):
+        # batch_id resumes a journaled batch, in which case files and
+        # output_dir come from the journal. With a job_queue the batch is
+        # converted by queue workers and this thread waits for their results.
+        format = options['format']
+        self.events.post(self.status_label.config, {'text': f"Converting {category.lower()}..."})
+        self.events.post(self.progress_var.set, 0)
         
-        total_files = len(files)
         success_count = 0
-        history_listbox = getattr(self, f"{category.lower()}_history_listbox")
+        ffmpeg_missing = False
         
         # Create timestamp for this batch
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        for i, file_path in enumerate(files):
-            try:
-                file_name = os.path.basename(file_path)
-                base_name = os.path.splitext(file_name)[0]
-                output_file = os.path.join(output_dir, f"{base_name}.{format}")
-                
-                # Update progress
-                progress_value = (i / total_files) * 100
-                self.progress_var.set(progress_value)
-                self.root.update_idletasks()
-                
-                if category == "Images":
-                    self._convert_image(file_path, output_file, format, quality, resize, dimensions)
-                elif category == "Documents":
-                    self._convert_document(file_path, output_file, format, encoding, headers)
-                elif category == "Audio":
-                    self._convert_audio(file_path, output_file, format, codec, bitrate)
-                elif category == "Video":
-                    self._convert_video(file_path, output_file, format, codec, bitrate)
-                
-                success_count += 1
-                
-            except Exception as e:
-                print(f"Error converting {file_path}: {e}")
+        if batch_id is not None:
+            jobs = self.journal.remaining_jobs(batch_id)
+            if not jobs:
+                # Another run finished the batch since it was offered
+                self.journal.finish_batch(batch_id)
+                self.events.post(self.progress_var.set, 100)
+                self.events.post(self.status_label.config, {'text': "Nothing left to convert in this batch"})
+                return
+            files = [file_path for file_path, _ in jobs]
+            output_dir = jobs[0][1] if is_multi_output(options) else os.path.dirname(jobs[0][1])
+            for _, output_file in jobs:
+                os.makedirs(output_file if is_multi_output(options) else os.path.dirname(output_file), exist_ok=True)
+        elif is_multi_output(options):
+            # One file per sheet, written into the output directory
+            jobs = [(file_path, output_dir) for file_path in files]
+        else:
+            jobs = [(file_path, output_path_for(file_path, output_dir, format)) for file_path in files]
+        
+        if self.journal is not None:
+            if batch_id is None:
+                batch_id = self.journal.create_batch(category, jobs, options)
+            self.journal.start(batch_id, jobs)
+        total_files = len(jobs)
+        
+        def show_progress(snapshot):
+            self.progress_var.set(snapshot['percent'])
+            self.status_label.config(text=f"Converting {category.lower()}... {format_progress(snapshot)}")
+        
+        # Byte- and time-weighted progress; FFmpeg jobs report as they encode
+        progress = BatchProgress(
+            files,
+            on_update=lambda snapshot: self.events.post_latest('progress', show_progress, snapshot),
+            update_interval=0.25
+        )
         
-        # Complete progress bar
-        self.progress_var.set(100)
-        self.status_label.config(text=f"Conversion complete: {success_count}/{total_files} successful")
+        # Jobs start largest first and only while they fit in memory; the
+        # Workers box still sets how many may run at once
+        executor = ConversionExecutor(max_workers=max_workers, cache=cache,
+                                      admission=AdmissionController(default_memory_budget()))
+        if job_queue is not None:
+            runner = QueueRunner(job_queue)
+        elif use_pipeline:
+            runner = ConversionPipeline(executor=executor)
+        else:
+            runner = executor
+        for file_path, output_file, error in runner.run(category, jobs, options, progress):
+            if self.journal is not None:
+                self.journal.finish_job(batch_id, file_path, error)
+            if error is None:
+                success_count += 1
+            else:
+                logger.error("Error converting %s: %s: %s", file_path, type(error).__name__, error)
+                if isinstance(error, (subprocess.CalledProcessError, FileNotFoundError)):
+                    ffmpeg_missing = ffmpeg_missing or category in ["Audio", "Video"]
+        if self.journal is not None:
+            self.journal.finish_batch(batch_id)
+        
+        # Complete progress bar, queued behind any pending progress updates
+        status = f"Conversion complete: {success_count}/{total_files} successful"
+        if cache is not None:
+            status += f" ({executor.cache_hits} from cache)"
+        self.events.post(self.progress_var.set, 100)
+        self.events.post(self.status_label.config, {'text': status})
         
         # Add to recent conversions history
         history_entry = f"{timestamp}: Converted {success_count} {category.lower()} to {format}"
-        self.recent_conversions.append(history_entry)
+        self.events.post(self.recent_conversions.append, history_entry)
+        self.events.post(self.update_history, category, history_entry)
         
-        # Update history listbox in the GUI thread
-        self.root.after(0, lambda: self.update_history(category, history_entry))
+        if ffmpeg_missing:
+            self.events.post(messagebox.showwarning, "FFmpeg Required", 
+                f"{category} conversion requires FFmpeg to be installed and in your PATH.")
         
         if success_count > 0:
-            messagebox.showinfo("Conversion Complete", 
+            self.events.post(messagebox.showinfo, "Conversion Complete", 
                 f"Successfully converted {success_count} out of {total_files} files.\n"
                 f"Files saved to: {output_dir}")
     
@@ -575,108 +1023,30 @@ class ModernFileConverterApp:
             history_listbox.delete(10, tk.END)
     
     def _convert_image(self, input_file, output_file, format, quality, resize, dimensions):
-        img = Image.open(input_file)
-        
-        # Apply resize if needed
-        if resize and dimensions:
-            try:
-                width, height = int(dimensions[0]), int(dimensions[1])
-                img = img.resize((width, height), Image.LANCZOS)
-            except (ValueError, TypeError):
-                pass  # Skip if dimensions are invalid
-        
-        # Handle special cases for different formats
-        if format.lower() == 'jpg':
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            img.save(output_file, format='JPEG', quality=quality)
-        elif format.lower() == 'png':
-            img.save(output_file, format='PNG', optimize=True)
-        elif format.lower() == 'webp':
-            img.save(output_file, format='WEBP', quality=quality)
-        else:
-            img.save(output_file, format=format.upper())
+        convert_image(input_file, output_file, format, quality, resize, dimensions)
     
     def _convert_document(self, input_file, output_file, format, encoding, headers):
-        input_ext = os.path.splitext(input_file)[1].lower()
-        
-        if input_ext == '.csv':
-            data = pd.read_csv(input_file, encoding=encoding or 'utf-8')
-        elif input_ext in ['.xlsx', '.xls']:
-            data = pd.read_excel(input_file)
-        elif input_ext == '.json':
-            data = pd.read_json(input_file, encoding=encoding or 'utf-8')
-        elif input_ext == '.txt':
-            # For simple text files, just copy them
-            with open(input_file, 'r', encoding=encoding or 'utf-8') as src:
-                content = src.read()
-            
-            if format == 'csv':
-                # Simple conversion: split by newlines and commas
-                rows = content.strip().split('\n')
-                data = pd.DataFrame([row.split(',') for row in rows])
-            else:
-                shutil.copy2(input_file, output_file)
-                return
-        else:
-            raise ValueError(f"Unsupported input format: {input_ext}")
-        
-        if format == 'csv':
-            data.to_csv(output_file, index=False, header=headers)
-        elif format == 'xlsx':
-            data.to_excel(output_file, index=False, header=headers)
-        elif format == 'json':
-            data.to_json(output_file, orient='records', force_ascii=False)
-        elif format == 'txt':
-            # Simple conversion for text
-            with open(output_file, 'w', encoding=encoding or 'utf-8') as out:
-                out.write(data.to_string(index=False, header=headers))
-        else:
-            raise ValueError(f"Unsupported output format: {format}")
+        convert_document(input_file, output_file, format, encoding, headers)
     
     def _convert_audio(self, input_file, output_file, format, codec, bitrate):
-        codec_param = []
-        if codec and codec != "default":
-            codec_param = ['-acodec', codec]
-        
-        bitrate_param = []
-        if bitrate:
-            bitrate_param = ['-b:a', bitrate]
-        
         try:
-            command = ['ffmpeg', '-i', input_file]
-            command.extend(codec_param)
-            command.extend(bitrate_param)
-            command.append(output_file)
-            
-            subprocess.run(command, check=True, stderr=subprocess.PIPE)
-        except subprocess.CalledProcessError:
-            messagebox.showwarning("FFmpeg Required", 
+            convert_audio(input_file, output_file, format, codec, bitrate)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            self.events.post(messagebox.showwarning, "FFmpeg Required", 
                 "Audio conversion requires FFmpeg to be installed and in your PATH.")
             raise
     
     def _convert_video(self, input_file, output_file, format, codec, bitrate):
-        codec_param = []
-        if codec and codec != "default":
-            codec_param = ['-vcodec', codec]
-        
-        bitrate_param = []
-        if bitrate:
-            bitrate_param = ['-b:v', bitrate]
-        
         try:
-            command = ['ffmpeg', '-i', input_file]
-            command.extend(codec_param)
-            command.extend(bitrate_param)
-            command.append(output_file)
-            
-            subprocess.run(command, check=True, stderr=subprocess.PIPE)
-        except subprocess.CalledProcessError:
-            messagebox.showwarning("FFmpeg Required", 
+            convert_video(input_file, output_file, format, codec, bitrate)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            self.events.post(messagebox.showwarning, "FFmpeg Required", 
                 "Video conversion requires FFmpeg to be installed and in your PATH.")
             raise
 
+
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     root = tk.Tk()
     app = ModernFileConverterApp(root)
     root.mainloop()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The converter package lives at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def job_options():
+    # Engine defaults with the given overrides, as the CLI and GUI pass them
+    from converter.engine import DEFAULT_OPTIONS
+
+    def make(**overrides):
+        options = dict(DEFAULT_OPTIONS)
+        options.update(overrides)
+        return options
+    return make
+
+
+@pytest.fixture
+def make_image(tmp_path):
+    # Writes a small gradient image so resized and re-encoded outputs differ
+    # from a flat fill
+    from PIL import Image
+
+    def make(name="image.png", size=(64, 48), mode="RGB"):
+        img = Image.linear_gradient("L").resize(size)
+        if mode != "L":
+            img = img.convert(mode)
+        path = tmp_path / name
+        img.save(path)
+        return str(path)
+    return make
@@ -0,0 +1,96 @@
+import os
+import threading
+
+from converter.admission import MB, AdmissionController, JobCost, estimate_cost
+from converter.executor import ConversionExecutor
+
+
+def test_largest_jobs_come_first(make_image, tmp_path, job_options):
+    jobs = [(make_image(f"{name}.png", size=size), str(tmp_path / f"{name}.jpg"))
+            for name, size in [("small", (10, 10)), ("large", (300, 200)), ("medium", (100, 100))]]
+    jobs.append((str(tmp_path / "missing.png"), str(tmp_path / "missing.jpg")))
+    
+    costed = AdmissionController().order("Images", jobs, job_options(format="jpg"))
+    
+    assert [os.path.basename(job[0]) for job, _ in costed] == ["large.png", "medium.png", "small.png", "missing.png"]
+
+
+def test_image_cost_counts_resized_outputs(make_image, job_options):
+    image = make_image(size=(400, 300))
+    plain = estimate_cost("Images", image, job_options(format="png"))
+    resized = estimate_cost("Images", image, job_options(format="png", resize=True, dimensions=(200, 150)))
+    
+    assert plain.work == resized.work == 400 * 300
+    assert resized.memory - plain.memory == 200 * 150 * 3
+
+
+def test_streamed_documents_cost_a_chunk(tmp_path, job_options):
+    source = tmp_path / "rows.csv"
+    source.write_text("a,b\n" + "1,2\n" * 100000)
+    
+    whole = estimate_cost("Documents", str(source), job_options(format="json"))
+    streamed = estimate_cost("Documents", str(source), job_options(format="json", chunk_size=1000))
+    
+    assert streamed.memory < whole.memory
+    assert streamed.work == whole.work == source.stat().st_size
+
+
+def test_controller_holds_jobs_over_budget():
+    controller = AdmissionController(memory_budget=100 * MB, cpu_budget=4)
+    first, second = JobCost(60 * MB), JobCost(60 * MB)
+    
+    controller.acquire(first)
+    assert not controller.fits(second)
+    assert controller.fits(JobCost(30 * MB))
+    assert not controller.fits(JobCost(1, cpu=4))
+    
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (controller.acquire(second), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    controller.release(first)
+    assert acquired.wait(5)
+    thread.join()
+    
+    # A job larger than the whole budget still runs on its own
+    controller.release(second)
+    assert controller.fits(JobCost(500 * MB))
+    assert controller.peak_memory == 60 * MB
+
+
+def test_executor_runs_within_the_budget(make_image, tmp_path, job_options):
+    jobs = [(make_image(f"in{index}.png", size=(200 + index, 100)), str(tmp_path / f"in{index}.jpg"))
+            for index in range(4)]
+    controller = AdmissionController(memory_budget=1, cpu_budget=None)
+    executor = ConversionExecutor(max_workers=2, kind="thread", admission=controller)
+    
+    options = job_options(format="jpg")
+    
+    results = list(executor.run("Images", jobs, options))
+    
+    assert sorted(results) == sorted((i, o, None) for i, o in jobs)
+    # Every job is over the budget, so they ran one at a time
+    assert controller.peak_memory == max(cost.memory for _, cost in controller.order("Images", jobs, options))
+    assert controller.running == 0
+
+
+def test_serial_runs_are_admitted(make_image, tmp_path, job_options):
+    jobs = [(make_image(f"in{index}.png", size=(100 + 50 * index, 100)), str(tmp_path / f"in{index}.jpg"))
+            for index in range(3)]
+    controller = AdmissionController(memory_budget=1, cpu_budget=None)
+    executor = ConversionExecutor(max_workers=1, admission=controller)
+    # Another run sharing the controller holds the whole budget
+    other = JobCost(1)
+    controller.acquire(other)
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(executor.run("Images", jobs, job_options(format="jpg"))))
+    thread.start()
+    
+    thread.join(0.2)
+    assert not results
+    controller.release(other)
+    thread.join(10)
+    
+    # Largest first, one at a time
+    assert results == [(i, o, None) for i, o in reversed(jobs)]
+    assert controller.running == 0
@@ -0,0 +1,34 @@
+from converter.benchmark import build_cases, compare, generate_images, percentile, run_case
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile([5, 1, 4, 2, 3], 0.95) == 5
+
+
+def test_compare_flags_throughput_drops_only():
+    results = {'cases': {
+        'slower': {'files_per_sec': 80.0},
+        'faster': {'files_per_sec': 150.0},
+        'steady': {'files_per_sec': 95.0},
+        'new': {'files_per_sec': 10.0},
+    }}
+    baseline = {'cases': {name: {'files_per_sec': 100.0} for name in ('slower', 'faster', 'steady')}}
+    
+    assert compare(results, baseline, 0.10) == ['slower']
+    assert compare(results, baseline, 0.25) == []
+
+
+def test_run_case_on_generated_images(tmp_path):
+    images = generate_images(str(tmp_path), [(64, 48)])
+    _, category, inputs, options = next(case for case in build_cases({'images': images})
+                                          if case[0] == "image-png-to-jpg")
+    
+    case = run_case(category, inputs, options, str(tmp_path / "out"), repeats=2, workers=1)
+    
+    assert (case['files'], case['repeats'], case['workers']) == (len(inputs), 2, 1)
+    assert case['bytes_out'] > 0
+    assert case['files_per_sec'] > 0
+    assert case['latency_p50'] <= case['latency_max']
+    assert 'encode' in case['stages']
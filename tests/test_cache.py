@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from converter.cache import ConversionCache
+from converter.engine import run_cached_job
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("a,b\n1,x\n2,y\n")
+    return str(path)
+
+
+def test_miss_then_hit(cache, source, tmp_path, job_options):
+    options = job_options(format="json")
+    first = str(tmp_path / "first.json")
+    second = str(tmp_path / "second.json")
+    
+    assert run_cached_job("Documents", source, first, options, cache) == (first, False)
+    assert run_cached_job("Documents", source, second, options, cache) == (second, True)
+    
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_key_covers_content_and_output_options(cache, source, tmp_path, job_options):
+    key = cache.key_for("Documents", source, job_options(format="json"))
+    
+    assert cache.key_for("Documents", source, job_options(format="JSON")) == key
+    # Worker counts and other run settings do not change the output
+    assert cache.key_for("Documents", source, job_options(format="json", threads=4)) == key
+    assert cache.key_for("Documents", source, job_options(format="csv")) != key
+    assert cache.key_for("Documents", source, job_options(format="json", encoding="latin-1")) != key
+    assert cache.key_for("Documents", source, job_options(format="json", schema_cache=True)) != key
+    
+    with open(source, 'a') as f:
+        f.write("3,z\n")
+    assert cache.key_for("Documents", source, job_options(format="json")) != key
+
+
+def test_resize_settings_only_count_when_resizing(cache, make_image, job_options):
+    image = make_image()
+    plain = cache.key_for("Images", image, job_options(format="png"))
+    
+    assert cache.key_for("Images", image, job_options(format="png", dimensions=(10, 10))) == plain
+    resized = cache.key_for("Images", image, job_options(format="png", resize=True, dimensions=(10, 10)))
+    assert resized != plain
+    assert cache.key_for("Images", image, job_options(format="png", resize=True, dimensions=(20, 10))) != resized
+
+
+def test_fetched_output_is_independent_of_the_cache(cache, source, tmp_path, job_options):
+    options = job_options(format="json")
+    first = str(tmp_path / "first.json")
+    second = str(tmp_path / "second.json")
+    run_cached_job("Documents", source, first, options, cache)
+    run_cached_job("Documents", source, second, options, cache)
+    
+    with open(second, 'w') as f:
+        f.write("edited")
+    third = str(tmp_path / "third.json")
+    assert run_cached_job("Documents", source, third, options, cache) == (third, True)
+    with open(first) as a, open(third) as b:
+        assert b.read() == a.read()
+
+
+def test_fetch_of_unknown_key_is_a_miss(cache, tmp_path):
+    output_file = str(tmp_path / "out.json")
+    
+    assert not cache.fetch("0" * 64, output_file)
+    assert not os.path.exists(output_file)
+
+
+def test_eviction_keeps_the_store_under_its_limit(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"), max_bytes=150)
+    for index in range(4):
+        output_file = tmp_path / f"out{index}.bin"
+        output_file.write_bytes(bytes([index]) * 100)
+        cache.store(f"{index:064x}", str(output_file))
+    
+    assert cache.stats()['entries'] == 1
+    assert cache.fetch(f"{3:064x}", str(tmp_path / "fetched.bin"))
+    assert not cache.fetch(f"{0:064x}", str(tmp_path / "evicted.bin"))
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from converter import engine
+from converter.columnar import can_convert_columnar, convert_columnar
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'id': range(1000),
+        'price': [index / 4 for index in range(1000)],
+        'name': [f"item {index % 13}" for index in range(1000)],
+    })
+
+
+@pytest.fixture
+def parquet_file(frame, tmp_path):
+    path = tmp_path / "table.parquet"
+    frame.to_parquet(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("format", ["feather", "parquet"])
+@pytest.mark.parametrize("batch_size", [None, 128])
+def test_columnar_round_trip(frame, parquet_file, tmp_path, format, batch_size):
+    output_file = str(tmp_path / f"copy.{format}")
+    convert_columnar(parquet_file, output_file, format, batch_size=batch_size)
+    
+    read = pd.read_feather if format == "feather" else pd.read_parquet
+    pd.testing.assert_frame_equal(read(output_file), frame)
+
+
+def test_arrow_csv_matches_pandas_csv(parquet_file, tmp_path, job_options):
+    csv_file = engine.convert(parquet_file, str(tmp_path / "table.csv"), job_options())
+    arrow = engine.convert(csv_file, str(tmp_path / "arrow.parquet"), job_options(csv_engine="pyarrow"))
+    pandas = engine.convert(csv_file, str(tmp_path / "pandas.parquet"), job_options())
+    
+    pd.testing.assert_frame_equal(pd.read_parquet(arrow), pd.read_parquet(pandas))
+
+
+def test_can_convert_columnar():
+    assert can_convert_columnar("a.parquet", "feather")
+    assert can_convert_columnar("a.csv", "parquet", csv_engine="pyarrow")
+    assert not can_convert_columnar("a.csv", "parquet")
+    assert not can_convert_columnar("a.parquet", "csv", encoding="latin-1")
+    assert not can_convert_columnar("a.parquet", "json")
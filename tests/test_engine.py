@@ -0,0 +1,39 @@
+import os
+
+import pandas as pd
+import pytest
+
+from converter import engine
+
+
+def test_category_lookup():
+    assert engine.category_for_format(".PNG") == "Images"
+    assert engine.category_for_format("parquet") == "Documents"
+    assert engine.category_for_format("xyz") is None
+    assert engine.category_for_input("clip.MOV") == "Video"
+
+
+def test_convert_into_directory(tmp_path):
+    source = tmp_path / "table.csv"
+    source.write_text("a,b\n1,x\n2,y\n")
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    
+    written = engine.convert(str(source), str(out_dir), {'format': 'json'})
+    
+    assert written == engine.output_path_for(str(source), str(out_dir), 'json')
+    assert pd.read_json(written).to_dict('list') == {'a': [1, 2], 'b': ['x', 'y']}
+    # Outputs are renamed into place, leaving no temporary files behind
+    assert os.listdir(out_dir) == ["table.json"]
+
+
+def test_convert_takes_format_from_output_path(make_image, tmp_path):
+    written = engine.convert(make_image(), str(tmp_path / "copy.webp"))
+    
+    assert written == str(tmp_path / "copy.webp")
+    assert os.path.getsize(written) > 0
+
+
+def test_convert_needs_a_format_for_directories(make_image, tmp_path):
+    with pytest.raises(ValueError):
+        engine.convert(make_image(), str(tmp_path))
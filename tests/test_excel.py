@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+from converter.excel import Workbook, XlsxWriter, convert_workbook, have_module, header_names
+
+ENGINES = ['openpyxl', pytest.param('calamine', marks=pytest.mark.skipif(
+    not have_module('python_calamine'), reason="python-calamine is not installed"))]
+
+
+@pytest.fixture
+def workbook_file(tmp_path):
+    path = tmp_path / "book.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'id': range(250), 'name': [f"n{index}" for index in range(250)]}).to_excel(
+            writer, sheet_name="People", index=False)
+        pd.DataFrame({'total': [1.5, 2.5]}).to_excel(writer, sheet_name="Sum & more", index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_chunked_frames_match_read_excel(workbook_file, engine):
+    with Workbook(workbook_file, engine) as workbook:
+        assert workbook.select() == ["People"]
+        assert workbook.select("1") == ["Sum & more"]
+        frames = list(workbook.iter_frames("People", chunk_size=100))
+    
+    assert [len(frame) for frame in frames] == [100, 100, 50]
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True),
+                                  pd.read_excel(workbook_file, sheet_name="People"))
+
+
+def test_unknown_sheet(workbook_file):
+    with Workbook(workbook_file, 'openpyxl') as workbook:
+        with pytest.raises(ValueError):
+            workbook.select("Missing")
+
+
+def test_every_sheet_to_its_own_file(workbook_file, tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    
+    paths = convert_workbook(workbook_file, str(out_dir), 'csv', 'utf-8', True, sheet='*')
+    
+    assert [os.path.basename(path) for path in paths] == ["book-People.csv", "book-Sum_more.csv"]
+    assert pd.read_csv(paths[1])['total'].tolist() == [1.5, 2.5]
+
+
+def test_workbook_copy_keeps_sheets(workbook_file, tmp_path):
+    output_file = str(tmp_path / "copy.xlsx")
+    convert_workbook(workbook_file, output_file, 'xlsx', 'utf-8', True, chunk_size=64, sheet='*')
+    
+    copied = pd.read_excel(output_file, sheet_name=None)
+    original = pd.read_excel(workbook_file, sheet_name=None)
+    assert list(copied) == list(original)
+    for name in original:
+        pd.testing.assert_frame_equal(copied[name], original[name])
+
+
+def test_xlsx_writer_writes_nested_values_as_text(tmp_path):
+    output_file = str(tmp_path / "nested.xlsx")
+    with XlsxWriter(output_file) as writer:
+        writer.write(pd.DataFrame({'tags': [["a", "b"], None], 'meta': [{'k': 1}, "plain"]}))
+    
+    frame = pd.read_excel(output_file)
+    assert frame['tags'].tolist()[0] == '["a", "b"]'
+    assert pd.isna(frame['tags'].tolist()[1])
+    assert frame['meta'].tolist() == ['{"k": 1}', "plain"]
+
+
+def test_header_names():
+    assert header_names(["a", None, "a", "a"]) == ["a", "Unnamed: 1", "a.1", "a.2"]
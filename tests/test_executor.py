@@ -0,0 +1,52 @@
+import os
+
+from PIL import Image
+
+from converter.cache import ConversionCache
+from converter.executor import ConversionExecutor
+
+
+def _jobs(make_image, tmp_path, count):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    # Sizes differ so no two inputs share a cache entry
+    return [(make_image(f"in{i}.png", size=(64 + i, 48)), str(out_dir / f"in{i}.jpg")) for i in range(count)]
+
+
+def test_serial_run_converts_every_job(make_image, tmp_path, job_options):
+    jobs = _jobs(make_image, tmp_path, 3)
+    results = list(ConversionExecutor(max_workers=1).run("Images", jobs, job_options(format="jpg")))
+    
+    assert sorted(results) == sorted((i, o, None) for i, o in jobs)
+    for _, output_file in jobs:
+        with Image.open(output_file) as img:
+            assert img.format == "JPEG"
+
+
+def test_pool_run_reports_failures_per_job(make_image, tmp_path, job_options):
+    jobs = _jobs(make_image, tmp_path, 3)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    jobs.append((str(broken), str(tmp_path / "out" / "broken.jpg")))
+    
+    results = {i: error for i, _, error in ConversionExecutor(max_workers=2).run("Images", jobs, job_options(format="jpg"))}
+    
+    assert set(results) == {i for i, _ in jobs}
+    assert results[str(broken)] is not None
+    assert all(results[i] is None for i, _ in jobs[:3])
+    assert all(os.path.exists(o) for _, o in jobs[:3])
+    assert not os.path.exists(jobs[3][1])
+
+
+def test_cache_hits_are_counted(make_image, tmp_path, job_options):
+    jobs = _jobs(make_image, tmp_path, 2)
+    cache = ConversionCache(str(tmp_path / "cache"))
+    options = job_options(format="jpg")
+    
+    first = ConversionExecutor(max_workers=1, cache=cache)
+    list(first.run("Images", jobs, options))
+    assert (first.cache_hits, first.cache_misses) == (0, 2)
+    
+    second = ConversionExecutor(max_workers=1, cache=cache)
+    list(second.run("Images", jobs, options))
+    assert (second.cache_hits, second.cache_misses) == (2, 0)
@@ -0,0 +1,84 @@
+import mmap
+import os
+import threading
+
+import pytest
+
+from converter.fastio import MMAP_THRESHOLD, map_input, pump, write_output
+from converter.images import load_image
+
+
+def _read_pipe(read_fd, chunks):
+    with os.fdopen(read_fd, 'rb') as f:
+        chunks.append(f.read())
+
+
+def _pump_into_pipe(source_fd):
+    read_fd, write_fd = os.pipe()
+    chunks = []
+    reader = threading.Thread(target=_read_pipe, args=(read_fd, chunks))
+    reader.start()
+    try:
+        pump(source_fd, write_fd)
+    finally:
+        os.close(write_fd)
+        reader.join()
+    return chunks[0]
+
+
+@pytest.mark.parametrize("size", [10, MMAP_THRESHOLD + 1])
+def test_map_input_reads_the_whole_file(tmp_path, size):
+    data = os.urandom(size)
+    path = tmp_path / "input.bin"
+    path.write_bytes(data)
+    
+    with map_input(str(path)) as source:
+        assert isinstance(source, mmap.mmap) == (size >= MMAP_THRESHOLD)
+        assert source.read() == data
+
+
+def test_large_images_decode_from_a_map(tmp_path):
+    from PIL import Image
+    
+    path = str(tmp_path / "noise.bmp")
+    Image.frombytes("RGB", (800, 600), os.urandom(800 * 600 * 3)).save(path)
+    assert os.path.getsize(path) >= MMAP_THRESHOLD
+    
+    with Image.open(path) as expected:
+        assert load_image(path).tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("size", [0, 100, MMAP_THRESHOLD * 2])
+def test_write_output(tmp_path, size):
+    data = os.urandom(size)
+    path = tmp_path / "output.bin"
+    path.write_bytes(b"old contents that are longer than some of the new ones")
+    
+    write_output(str(path), bytearray(data))
+    
+    assert path.read_bytes() == data
+
+
+def test_pump_from_a_file(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    path = tmp_path / "source.bin"
+    path.write_bytes(data)
+    
+    with open(path, 'rb') as f:
+        assert _pump_into_pipe(f.fileno()) == data
+
+
+def test_pump_from_a_pipe():
+    data = os.urandom(256 * 1024)
+    read_fd, write_fd = os.pipe()
+    
+    def feed():
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(data)
+    writer = threading.Thread(target=feed)
+    writer.start()
+    try:
+        assert _pump_into_pipe(read_fd) == data
+    finally:
+        writer.join()
+        os.close(read_fd)
@@ -0,0 +1,92 @@
+import pytest
+from PIL import Image
+
+from converter import fastpath, media
+from converter.fastpath import can_copy_jpeg, estimate_jpeg_quality, jpeg_source_quality, stream_copy_args
+from converter.ffmpeg import FFmpegError
+from converter.images import convert_image
+
+
+def _info(*streams):
+    return {'streams': [dict(zip(('codec_type', 'codec_name'), stream)) for stream in streams]}
+
+
+@pytest.mark.parametrize("quality", [30, 50, 75, 90, 95])
+def test_jpeg_quality_is_recovered_from_the_tables(make_image, tmp_path, quality):
+    path = tmp_path / "photo.jpg"
+    with Image.open(make_image()) as img:
+        img.save(path, quality=quality)
+    
+    assert abs(jpeg_source_quality(str(path)) - quality) <= 1
+
+
+def test_jpeg_quality_of_other_inputs(make_image):
+    assert jpeg_source_quality(make_image("photo.png")) is None
+    assert estimate_jpeg_quality(None) is None
+    assert estimate_jpeg_quality({0: [1] * 10}) is None
+
+
+def test_jpeg_is_copied_only_when_re_encoding_cannot_help(make_image, tmp_path):
+    source = tmp_path / "photo.jpg"
+    with Image.open(make_image(size=(64, 48))) as img:
+        img.save(source, quality=80)
+    original = source.read_bytes()
+    
+    convert_image(str(source), str(tmp_path / "same.jpg"), "jpg", 90, False, None)
+    convert_image(str(source), str(tmp_path / "smaller.jpg"), "jpg", 60, False, None)
+    convert_image(str(source), str(tmp_path / "resized.jpg"), "jpg", 90, True, (32, 24))
+    convert_image(str(source), str(tmp_path / "off.jpg"), "jpg", 90, False, None, fast_path=False)
+    
+    assert (tmp_path / "same.jpg").read_bytes() == original
+    for name in ["smaller.jpg", "resized.jpg", "off.jpg"]:
+        assert (tmp_path / name).read_bytes() != original
+    assert not can_copy_jpeg(80, "png", 90)
+
+
+def test_stream_copy_for_compatible_containers():
+    h264 = _info(('video', 'h264'), ('audio', 'aac'))
+    
+    assert stream_copy_args("Video", h264, "mp4") == ['-c', 'copy']
+    assert stream_copy_args("Video", h264, "mkv", codec="libx264") == ['-c', 'copy']
+    assert stream_copy_args("Video", h264, "webm") is None
+    assert stream_copy_args("Video", h264, "mp4", codec="libx265") is None
+    assert stream_copy_args("Video", h264, "mp4", bitrate="2M") is None
+    assert stream_copy_args("Audio", h264, "mp4") == ['-vn', '-c', 'copy']
+    assert stream_copy_args("Audio", _info(('audio', 'flac')), "ogg") == ['-c', 'copy']
+
+
+def test_stream_copy_with_subtitles():
+    def subtitled(codec):
+        return _info(('video', 'h264'), ('audio', 'aac'), ('subtitle', codec))
+    
+    assert stream_copy_args("Video", subtitled('subrip'), "mkv") == ['-c', 'copy']
+    assert stream_copy_args("Video", subtitled('hdmv_pgs_subtitle'), "mkv") == ['-c', 'copy']
+    assert stream_copy_args("Video", subtitled('mov_text'), "mkv") == ['-c', 'copy', '-c:s', 'srt']
+    assert stream_copy_args("Video", subtitled('subrip'), "mp4") == ['-c', 'copy', '-c:s', 'mov_text']
+    assert stream_copy_args("Video", subtitled('hdmv_pgs_subtitle'), "mp4") is None
+    # AVI has no subtitle codec, so FFmpeg leaves them out
+    assert stream_copy_args("Video", _info(('video', 'h264'), ('subtitle', 'subrip')), "avi") == ['-c', 'copy']
+
+
+def test_failed_stream_copy_is_retried_transcoding(tmp_path, monkeypatch):
+    source = tmp_path / "clip.mkv"
+    source.write_bytes(b"")
+    monkeypatch.setattr(fastpath, 'probe_media', lambda path: _info(('video', 'h264'), ('audio', 'aac')))
+    runs = []
+    failing = {('-c', 'copy')}
+    
+    def run(input_file, outputs, threads, progress, pipe_input):
+        runs.append(outputs[0][1])
+        if tuple(outputs[0][1]) in failing:
+            raise FFmpegError(1, ['ffmpeg'])
+    monkeypatch.setattr(media, 'run_media_command', run)
+    
+    media.convert_video(str(source), str(tmp_path / "clip.mp4"), "mp4", None, None)
+    assert runs == [['-c', 'copy'], []]
+    
+    # A transcode that fails is not retried
+    runs.clear()
+    failing.add(())
+    with pytest.raises(FFmpegError):
+        media.convert_video(str(source), str(tmp_path / "clip.mp4"), "mp4", None, None, fast_path=False)
+    assert runs == [[]]
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from converter.executor import ConversionExecutor
+from converter.ffmpeg import (FFmpegScheduler, build_command, codec_args, default_media_workers,
+                              threads_per_job)
+
+
+def test_media_worker_defaults():
+    assert default_media_workers("Audio", cpus=8) == 8
+    assert default_media_workers("Video", cpus=8) == 2
+    assert default_media_workers("Video", cpus=2) == 1
+    assert threads_per_job(2, cpus=8) == 4
+    assert threads_per_job(16, cpus=8) == 1
+
+
+def test_codec_args():
+    assert codec_args("Audio", "libmp3lame", "192k") == ['-acodec', 'libmp3lame', '-b:a', '192k']
+    assert codec_args("Video", "default", "2M") == ['-b:v', '2M']
+    assert codec_args("Video", None, None) == []
+
+
+def test_several_outputs_share_one_input():
+    command = build_command("in.wav", [("a.mp3", ['-b:a', '128k']), ("b.ogg", [])], threads=2)
+    
+    assert command.count('-i') == 1
+    assert command[command.index('-i') + 1] == "in.wav"
+    assert command[-1] == "b.ogg"
+    assert command.index("a.mp3") < command.index("b.ogg")
+    assert command[command.index("a.mp3") - 4:command.index("a.mp3")] == ['-b:a', '128k', '-threads', '2']
+
+
+def test_scheduler_keeps_separate_pools_per_category():
+    with FFmpegScheduler(audio_workers=3, video_workers=1, cpus=4) as scheduler:
+        assert scheduler.threads_for("Video") == 4
+        assert scheduler.threads_for("Audio") == 1
+        assert scheduler.pool("Audio") is scheduler.pool("Audio")
+        assert scheduler.pool("Audio") is not scheduler.pool("Video")
+        assert scheduler.submit("Video", threading.current_thread).result().name.startswith("ffmpeg-video")
+        with pytest.raises(ValueError):
+            scheduler.pool("Images")
+
+
+def test_executor_sizes_media_jobs_from_the_scheduler():
+    with FFmpegScheduler(audio_workers=3, video_workers=1, cpus=4) as scheduler:
+        executor = ConversionExecutor(max_workers=8, scheduler=scheduler)
+        assert executor.workers_for("Audio") == 3
+        assert executor.workers_for("Images") == 8
+        assert executor._job_options("Video", {}, 1) == {'threads': 4}
+        assert executor._job_options("Video", {'threads': 2}, 1) == {'threads': 2}
@@ -0,0 +1,70 @@
+import os
+import threading
+
+import pytest
+
+from converter.filelist import PathStore, ingest_paths, iter_input_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel in ["a.png", "b.txt", "sub/c.png", "sub/deeper/d.png", "sub/e.md", "other/f.png"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    return tmp_path
+
+
+def _rel(paths, root):
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_path_store_round_trip():
+    paths = ["/data/a.png", "/data/b.png", "/other/ümlaut.png", "relative.png"]
+    store = PathStore(paths)
+    store.append("/data/c.png")
+    
+    assert len(store) == 5
+    assert list(store) == paths + ["/data/c.png"]
+    assert store[-1] == "/data/c.png"
+    assert store.names(1, 3) == ["b.png", "ümlaut.png"]
+    assert store.dirs == ["/data", "/other", ""]
+    with pytest.raises(IndexError):
+        store[5]
+    store.clear()
+    assert len(store) == 0
+
+
+def test_directories_are_walked_in_order_with_filter(tree):
+    files = list(iter_input_files([str(tree)], {".png"}))
+    
+    assert _rel(files, tree) == ["a.png", "other/f.png", "sub/c.png", "sub/deeper/d.png"]
+
+
+def test_overlapping_sources_yield_each_file_once(tree):
+    sources = [str(tree / "sub"), str(tree), str(tree / "sub" / "deeper"), str(tree / "a.png"),
+               str(tree / "a.png"), str(tree / "*.png")]
+    
+    files = _rel(iter_input_files(sources, {".png"}), tree)
+    
+    assert sorted(files) == ["a.png", "other/f.png", "sub/c.png", "sub/deeper/d.png"]
+    assert len(files) == len(set(files))
+
+
+def test_named_files_bypass_the_filter(tree):
+    # b.txt is skipped by the walk, so naming it still adds it once
+    files = _rel(iter_input_files([str(tree), str(tree / "b.txt"), str(tree / "b.txt")], {".png"}), tree)
+    
+    assert files.count("b.txt") == 1
+    assert len(files) == 5
+
+
+def test_ingest_paths_in_batches(tree):
+    store = PathStore()
+    
+    assert ingest_paths(store, [str(tree)], batch_size=2) == 6
+    assert len(store) == 6
+    
+    stopped = threading.Event()
+    stopped.set()
+    assert ingest_paths(PathStore(), [str(tree)], stop=stopped) == 0
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+from converter import images
+from converter.images import choose_resample, convert_image, parse_rendition, render_renditions, resample_filter
+
+
+def _mean_difference(a, b):
+    return sum(ImageStat.Stat(ImageChops.difference(a, b)).mean) / len(a.getbands())
+
+
+def test_fast_resize_matches_a_full_decode(make_image, tmp_path):
+    source = make_image("photo.jpg", size=(1600, 1200))
+    exact = str(tmp_path / "exact.png")
+    fast = str(tmp_path / "fast.png")
+    
+    convert_image(source, exact, "png", 85, True, (200, 150))
+    convert_image(source, fast, "png", 85, True, (200, 150), fast_resize=True)
+    
+    with Image.open(exact) as a, Image.open(fast) as b:
+        assert a.size == b.size == (200, 150)
+        assert _mean_difference(a, b) < 2
+
+
+def test_fast_resize_of_non_jpeg_inputs(make_image, tmp_path):
+    output_file = str(tmp_path / "small.png")
+    convert_image(make_image("big.png", size=(800, 600)), output_file, "png", 85, True, (80, 60), fast_resize=True)
+    
+    with Image.open(output_file) as img:
+        assert img.size == (80, 60)
+
+
+def test_resample_filters():
+    assert resample_filter(None, 0.1) == Image.LANCZOS
+    assert resample_filter("auto", 0.9) == choose_resample(0.9) == Image.LANCZOS
+    assert choose_resample(0.2) == Image.BICUBIC
+    assert choose_resample(0.05) == Image.HAMMING
+
+
+def test_parse_rendition():
+    assert parse_rendition("WEBP:80:800x600") == {'format': 'webp', 'quality': 80, 'dimensions': (800, 600)}
+    assert parse_rendition("png::64x64") == {'format': 'png', 'quality': 85, 'dimensions': (64, 64)}
+    for spec in ["", "png:1:2:3", "png::0x10"]:
+        with pytest.raises(ValueError):
+            parse_rendition(spec)
+
+
+def test_renditions_from_one_decode(make_image, tmp_path):
+    source = make_image("photo.png", size=(400, 300))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    
+    paths = render_renditions(source, str(out_dir), ["webp:80:200x150", "png::40x30", "jpg:50", "jpg:90"])
+    
+    assert [os.path.basename(p) for p in paths] == [
+        "photo_200x150.webp", "photo_40x30.png", "photo_q50.jpg", "photo_q90.jpg"
+    ]
+    sizes = []
+    for path in paths:
+        with Image.open(path) as img:
+            sizes.append(img.size)
+    assert sizes == [(200, 150), (40, 30), (400, 300), (400, 300)]
+
+
+def test_renditions_match_single_conversions(make_image, tmp_path):
+    source = make_image("photo.png", size=(400, 300))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    [rendered] = render_renditions(source, str(out_dir), ["png::100x75"])
+    single = str(tmp_path / "single.png")
+    convert_image(source, single, "png", 85, True, (100, 75))
+    
+    with Image.open(rendered) as a, Image.open(single) as b:
+        assert _mean_difference(a, b) < 1
+
+
+@pytest.mark.parametrize("limit, buffered", [(None, True), (100, False)])
+def test_only_small_images_are_encoded_in_memory(make_image, tmp_path, monkeypatch, limit, buffered):
+    if limit is not None:
+        monkeypatch.setattr(images, 'BUFFERED_SAVE_BYTES', limit)
+    writes = []
+    write_output = images.write_output
+    monkeypatch.setattr(images, 'write_output', lambda path, data: writes.append(path) or write_output(path, data))
+    output = str(tmp_path / "out.tiff")
+    
+    convert_image(make_image(), output, "tiff", 90, False, None)
+    
+    assert bool(writes) == buffered
+    with Image.open(output) as img:
+        assert img.size == (64, 48)
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from converter.engine import run_conversion_job
+from converter.journal import JobJournal, move_into_place, remove_temp_outputs, temp_output_path
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "journal.sqlite")
+
+
+def _jobs(tmp_path, count):
+    return [(str(tmp_path / f"in{index}.csv"), str(tmp_path / f"in{index}.json")) for index in range(count)]
+
+
+def test_interrupted_batch_resumes_where_it_stopped(journal_path, tmp_path):
+    jobs = _jobs(tmp_path, 4)
+    journal = JobJournal(journal_path)
+    batch_id = journal.create_batch("Documents", jobs, {'format': 'json'})
+    journal.start(batch_id, jobs)
+    journal.finish_job(batch_id, jobs[0][0])
+    journal.finish_job(batch_id, jobs[1][0], ValueError("bad row"))
+    # The process dies here with two jobs still running
+    journal.close()
+    
+    journal = JobJournal(journal_path)
+    [batch] = journal.unfinished_batches()
+    assert (batch['id'], batch['remaining'], batch['done'], batch['failed'], batch['total']) == (batch_id, 2, 1, 1, 4)
+    assert journal.batch(batch_id) == ("Documents", {'format': 'json'})
+    assert journal.remaining_jobs(batch_id) == jobs[2:]
+    assert journal.remaining_jobs(batch_id, retry_failed=True) == jobs[1:]
+    
+    journal.start(batch_id, jobs[2:])
+    for input_file, _ in jobs[2:]:
+        journal.finish_job(batch_id, input_file)
+    journal.finish_batch(batch_id)
+    
+    assert journal.unfinished_batches() == []
+    assert journal.counts(batch_id) == {'pending': 0, 'running': 0, 'done': 3, 'failed': 1}
+    journal.close()
+
+
+def test_start_clears_partial_outputs_of_its_jobs(journal_path, tmp_path):
+    jobs = _jobs(tmp_path, 2)
+    partial = temp_output_path(jobs[0][1])
+    other = temp_output_path(str(tmp_path / "unrelated.json"))
+    for path in (partial, other):
+        with open(path, 'w') as f:
+            f.write("{")
+    
+    journal = JobJournal(journal_path)
+    journal.start(journal.create_batch("Documents", jobs, {}), jobs)
+    journal.close()
+    
+    assert not os.path.exists(partial)
+    assert os.path.exists(other)
+
+
+def test_remove_temp_outputs_matches_base_and_extension(tmp_path):
+    names = [".report.0123456789ab.part.csv", ".report.0123456789ab.part.json", "report.csv", ".report.csv"]
+    for name in names:
+        (tmp_path / name).write_text("")
+    
+    remove_temp_outputs([str(tmp_path / "report.csv")])
+    
+    assert sorted(os.listdir(tmp_path)) == sorted(names[1:])
+
+
+def test_failed_conversion_leaves_no_output(tmp_path, job_options):
+    source = tmp_path / "broken.png"
+    source.write_bytes(b"not an image")
+    
+    with pytest.raises(Exception):
+        run_conversion_job("Images", str(source), str(tmp_path / "broken.jpg"), job_options(format="jpg"))
+    assert os.listdir(tmp_path) == ["broken.png"]
+
+
+def test_move_into_place(tmp_path):
+    source = tmp_path / "staged.txt"
+    source.write_text("new")
+    target = tmp_path / "final.txt"
+    target.write_text("old")
+    
+    move_into_place(str(source), str(target))
+    
+    assert target.read_text() == "new"
+    assert os.listdir(tmp_path) == ["final.txt"]
@@ -0,0 +1,157 @@
+import json
+
+import pandas as pd
+import pytest
+
+from converter import engine, jsonstream, streaming
+from converter.jsonstream import JSONRecordReader, flatten_record, iter_json_frames, scan_columns
+
+RECORDS = [
+    {'id': 1, 'name': "a", 'meta': {'size': 10, 'tags': ["x"]}},
+    {'id': 2, 'name': "b,c", 'meta': {'size': 20}},
+    {'id': 3, 'extra': 1.5, 'meta': {}},
+    {'id': 4, 'name': None, 'text': 'ü " ] ,'},
+]
+
+
+@pytest.fixture(params=["array", "pretty", "lines"])
+def records_file(request, tmp_path):
+    if request.param == "lines":
+        path = tmp_path / "records.jsonl"
+        path.write_text("".join(json.dumps(record) + "\n" for record in RECORDS))
+    else:
+        path = tmp_path / "records.json"
+        path.write_text(json.dumps(RECORDS, indent=2 if request.param == "pretty" else None))
+    return str(path)
+
+
+def test_records_are_read_one_at_a_time(records_file, monkeypatch):
+    # A block smaller than a record makes every value span reads
+    monkeypatch.setattr(jsonstream, 'READ_BLOCK', 7)
+    
+    with JSONRecordReader(records_file) as reader:
+        records = [record for record, _ in reader]
+        assert reader.layout in ['array', 'lines']
+    assert records == RECORDS
+
+
+def test_record_text_is_its_source(records_file):
+    with JSONRecordReader(records_file) as reader:
+        assert [json.loads(text) for _, text in reader] == RECORDS
+
+
+def test_layouts(tmp_path):
+    single = tmp_path / "single.json"
+    single.write_text('{"a": [1, 2]}')
+    concatenated = tmp_path / "values.json"
+    concatenated.write_text('{"a": 1} {"a": 2}\n{"a": 3}')
+    numbers = tmp_path / "numbers.json"
+    numbers.write_text("[1, 22, 333]")
+    
+    with JSONRecordReader(str(single)) as reader:
+        assert reader.layout == 'object'
+    with JSONRecordReader(str(concatenated)) as reader:
+        assert [record for record, _ in reader] == [{'a': 1}, {'a': 2}, {'a': 3}]
+    with JSONRecordReader(str(numbers)) as reader:
+        assert [record for record, _ in reader] == [1, 22, 333]
+    layouts = [jsonstream.json_layout(str(path)) for path in [single, concatenated, numbers]]
+    assert layouts == ['object', 'lines', 'array']
+
+
+def test_layout_is_detected_from_a_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonstream, 'LAYOUT_PEEK', 16)
+    large = tmp_path / "large.json"
+    large.write_text('\ufeff {"a": "' + "x" * 100 + '"}')
+    lines = tmp_path / "lines.json"
+    lines.write_text('{"a": 1}\n{"a": 2}\n' + '{"a": 3}\n' * 10)
+    
+    assert jsonstream.json_layout(str(large)) == 'object'
+    assert jsonstream.json_layout(str(lines)) == 'lines'
+
+
+@pytest.mark.parametrize("text", ["[1, 2", "[1 2]", "[1] 2", "", '{"a": '])
+def test_malformed_input(tmp_path, text):
+    path = tmp_path / "bad.json"
+    path.write_text(text)
+    
+    with pytest.raises(ValueError):
+        with JSONRecordReader(str(path)) as reader:
+            list(reader)
+
+
+def test_scan_columns(records_file):
+    columns, sparse = scan_columns(records_file)
+    
+    assert columns == ['id', 'name', 'meta', 'extra', 'text']
+    assert sparse == {'name', 'meta', 'extra', 'text'}
+    flat_columns, _ = scan_columns(records_file, flatten=True)
+    assert flat_columns == ['id', 'name', 'meta.size', 'meta.tags', 'extra', 'meta', 'text']
+
+
+def test_flatten_record():
+    assert flatten_record({'a': {'b': {'c': 1}, 'd': []}, 'e': {}}) == {'a.b.c': 1, 'a.d': [], 'e': {}}
+    assert flatten_record([1]) == [1]
+
+
+def test_chunked_frames_match_a_whole_read(records_file):
+    columns, sparse = scan_columns(records_file)
+    frames = list(iter_json_frames(records_file, chunk_size=3, columns=columns, sparse=sparse))
+    
+    assert [len(frame) for frame in frames] == [3, 1]
+    whole = pd.read_json(records_file, lines=records_file.endswith('.jsonl'))
+    # A chunk whose text column is all missing reads it as object rather
+    # than str; the values are the same
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), whole, check_dtype=False)
+
+
+def test_streamed_json_to_csv_matches_whole_file(records_file, tmp_path, job_options):
+    format = "csv"
+    whole = engine.convert(records_file, str(tmp_path / f"whole.{format}"), job_options(format=format))
+    streamed = engine.convert(records_file, str(tmp_path / f"streamed.{format}"),
+                              job_options(format=format, chunk_size=2))
+    
+    with open(whole, 'rb') as a, open(streamed, 'rb') as b:
+        assert b.read() == a.read()
+
+
+def _convert_records(records_file, tmp_path, job_options, format, monkeypatch):
+    whole = engine.convert(records_file, str(tmp_path / f"whole.{format}"), job_options(format=format))
+    
+    def no_scan(*args):
+        raise AssertionError("record outputs start writing without a column scan")
+    
+    monkeypatch.setattr(streaming, 'scan_columns', no_scan)
+    streamed = engine.convert(records_file, str(tmp_path / f"streamed.{format}"),
+                              job_options(format=format, chunk_size=2))
+    return [_read_records(path, format) for path in [whole, streamed]]
+
+
+def _read_records(path, format):
+    with open(path, encoding='utf-8') as f:
+        if format == 'jsonl':
+            return [json.loads(line) for line in f]
+        return json.load(f)
+
+
+@pytest.mark.parametrize("format", ["jsonl", "json"])
+def test_streamed_records_get_the_keys_seen_so_far(records_file, tmp_path, job_options, format, monkeypatch):
+    whole, streamed = _convert_records(records_file, tmp_path, job_options, format, monkeypatch)
+    
+    assert len(streamed) == len(whole)
+    for streamed_record, whole_record in zip(streamed, whole):
+        # Keys keep the whole file's order; those only seen in a later
+        # chunk are left out, where a whole read writes them as null
+        kept = dict(list(whole_record.items())[:len(streamed_record)])
+        assert streamed_record == kept
+        assert all(value is None for key, value in whole_record.items() if key not in kept)
+    assert list(streamed[-1]) == list(whole[-1])
+
+
+@pytest.mark.parametrize("format", ["jsonl", "json"])
+def test_streamed_records_match_when_keys_are_known_early(tmp_path, job_options, format, monkeypatch):
+    path = tmp_path / "records.jsonl"
+    path.write_text("".join(json.dumps({'id': index, 'name': f"n{index}"}) + "\n" for index in range(5)))
+    
+    whole, streamed = _convert_records(str(path), tmp_path, job_options, format, monkeypatch)
+    
+    assert streamed == whole
@@ -0,0 +1,136 @@
+import pytest
+from PIL import Image, ImageChops
+
+from converter import largeimage
+from converter.images import convert_image
+from converter.largeimage import PngWriter, TiledTiffWriter, band_layout, large_image_size
+
+
+def _source(mode, size=(600, 520)):
+    # Noise over a gradient, so a misplaced band or tile shows up
+    img = Image.merge("RGB", [
+        Image.linear_gradient("L").resize(size),
+        Image.effect_noise(size, 60),
+        Image.linear_gradient("L").rotate(90).resize(size),
+    ])
+    if mode == "I;16":
+        return Image.frombytes("I;16", size, img.convert("L").tobytes() * 2)
+    return img.convert(mode)
+
+
+def _write_in_bands(writer, img, heights):
+    top = 0
+    for height in heights:
+        writer.write(img.crop((0, top, img.width, min(img.height, top + height))))
+        top += height
+    assert top >= img.height
+    writer.close()
+
+
+def _max_difference(a, b):
+    extrema = ImageChops.difference(a, b).getextrema()
+    if len(a.getbands()) == 1:
+        extrema = [extrema]
+    return max(high for _, high in extrema)
+
+
+def _same_pixels(a, b):
+    return a.mode == b.mode and a.size == b.size and a.tobytes() == b.tobytes()
+
+
+@pytest.mark.parametrize("mode", ["L", "I;16", "RGB", "LA", "RGBA"])
+def test_png_writer_output_reads_back_exactly(tmp_path, mode):
+    img = _source(mode)
+    path = str(tmp_path / "out.png")
+    
+    _write_in_bands(PngWriter(path, img.size, mode), img, [1, 99, 300, 120])
+    
+    with Image.open(path) as written:
+        written.load()
+        assert _same_pixels(written, img)
+
+
+@pytest.mark.parametrize("mode", ["L", "I;16", "RGB", "LA", "RGBA", "CMYK"])
+def test_tiff_writer_output_reads_back_exactly(tmp_path, mode):
+    img = _source(mode)
+    path = str(tmp_path / "out.tiff")
+    
+    _write_in_bands(TiledTiffWriter(path, img.size, mode), img, [100, 256, 37, 127])
+    
+    with Image.open(path) as written:
+        assert written.n_frames == 3
+        written.load()
+        assert _same_pixels(written, img)
+        # Reduced-resolution pages, halved down to a single tile
+        sizes = []
+        for page in range(written.n_frames):
+            written.seek(page)
+            sizes.append(written.size)
+        assert sizes == [(600, 520), (300, 260), (150, 130)]
+        if mode in ["L", "RGB", "RGBA"]:
+            # Each level is the 2x2 average of the one above
+            written.seek(1)
+            written.load()
+            assert _max_difference(written, img.reduce(2)) <= 1
+
+
+def test_tiff_writer_without_pyramid(tmp_path):
+    img = _source("RGB")
+    path = str(tmp_path / "flat.tiff")
+    
+    _write_in_bands(TiledTiffWriter(path, img.size, "RGB", pyramid=False), img, [520])
+    
+    with Image.open(path) as written:
+        assert written.n_frames == 1
+        assert (written.tag_v2[322], written.tag_v2[323]) == (256, 256)
+
+
+@pytest.fixture
+def large_input(tmp_path, monkeypatch):
+    # Shrinks the thresholds so a small uncompressed TIFF takes the banded
+    # path, a few dozen rows at a time
+    monkeypatch.setattr(largeimage, 'LARGE_FILE_BYTES', 1)
+    monkeypatch.setattr(largeimage, 'LARGE_IMAGE_PIXELS', 1)
+    monkeypatch.setattr(largeimage, 'BAND_BYTES', 600 * 4 * 40)
+    monkeypatch.setattr(largeimage, 'has_pyvips', lambda: False)
+    img = _source("RGB")
+    path = str(tmp_path / "scan.tif")
+    img.save(path, compression=None)
+    return path, img
+
+
+@pytest.mark.parametrize("format", ["png", "tiff", "bmp"])
+def test_banded_conversion_matches_the_source(large_input, tmp_path, format):
+    path, img = large_input
+    output_file = str(tmp_path / f"out.{format}")
+    
+    assert large_image_size(path) == img.size
+    convert_image(path, output_file, format, 85, False, None)
+    
+    with Image.open(output_file) as written:
+        written.load()
+        assert _same_pixels(written, img)
+
+
+def test_banded_resize_has_no_seams(large_input, tmp_path):
+    path, img = large_input
+    output_file = str(tmp_path / "small.png")
+    
+    convert_image(path, output_file, "png", 85, True, (300, 260))
+    
+    expected = img.resize((300, 260), Image.LANCZOS)
+    with Image.open(output_file) as written:
+        assert _max_difference(written, expected) <= 2
+
+
+def test_compressed_inputs_are_not_banded(tmp_path, monkeypatch):
+    monkeypatch.setattr(largeimage, 'LARGE_FILE_BYTES', 1)
+    monkeypatch.setattr(largeimage, 'LARGE_IMAGE_PIXELS', 1)
+    monkeypatch.setattr(largeimage, 'has_pyvips', lambda: False)
+    path = str(tmp_path / "packed.tif")
+    _source("RGB").save(path, compression="tiff_deflate")
+    
+    with Image.open(path) as img:
+        assert band_layout(img) is None
+    assert large_image_size(path) is None
+    assert large_image_size(str(tmp_path / "missing.tif")) is None
@@ -0,0 +1,65 @@
+import json
+
+from converter.executor import ConversionExecutor
+from converter.metrics import MetricsCollector, run_instrumented, stage
+
+
+def _job(path):
+    with stage('read'):
+        pass
+    with stage('read'):
+        pass
+    return path
+
+
+def _failing_job():
+    raise ValueError("bad input")
+
+
+def test_run_instrumented_records_stages(tmp_path):
+    source = tmp_path / "in.txt"
+    source.write_text("hello")
+    
+    result, record, error = run_instrumented(_job, (str(source),), "Documents", str(source))
+    
+    assert (result, error) == (str(source), None)
+    assert record['status'] == 'ok'
+    assert list(record['stages']) == ['read']
+    assert record['bytes_in'] == record['bytes_out'] == 5
+
+
+def test_run_instrumented_captures_errors():
+    result, record, error = run_instrumented(_failing_job, (), "Images", "missing.png")
+    
+    assert result is None
+    assert isinstance(error, ValueError)
+    assert (record['status'], record['error_class'], record['error']) == ('error', 'ValueError', "bad input")
+
+
+def test_stage_outside_a_conversion_is_a_no_op():
+    with stage('decode'):
+        pass
+
+
+def test_collector_exports_jsonl_and_prometheus(make_image, tmp_path, job_options):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    jobs = [(make_image(), str(out_dir / "image.jpg")), (str(broken), str(out_dir / "broken.jpg"))]
+    metrics = MetricsCollector(jsonl_path=str(tmp_path / "metrics.jsonl"))
+    
+    list(ConversionExecutor(max_workers=1, metrics=metrics).run("Images", jobs, job_options(format="jpg")))
+    metrics.close()
+    
+    with open(tmp_path / "metrics.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert [record['status'] for record in records] == ['ok', 'error']
+    assert 'encode' in records[0]['stages']
+    
+    metrics.write_prometheus(str(tmp_path / "metrics.prom"))
+    text = (tmp_path / "metrics.prom").read_text()
+    assert 'converter_files_total{category="Images",status="ok"} 1' in text
+    assert 'converter_errors_total{category="Images",error_class="UnidentifiedImageError"} 1' in text
+    assert 'converter_file_duration_seconds_count{category="Images"} 2' in text
+    assert 'converter_stage_duration_seconds_bucket{category="Images",stage="encode",le="+Inf"} 1' in text
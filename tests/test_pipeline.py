@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+from converter.executor import ConversionExecutor
+from converter.pipeline import ConversionPipeline
+
+
+@pytest.fixture
+def csv_jobs(tmp_path):
+    source_dir = tmp_path / "in"
+    out_dir = tmp_path / "out"
+    source_dir.mkdir()
+    out_dir.mkdir()
+    jobs = []
+    for index in range(6):
+        source = source_dir / f"t{index}.csv"
+        source.write_text(f"a,b\n{index},x\n")
+        jobs.append((str(source), str(out_dir / f"t{index}.json")))
+    return jobs
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pipeline_converts_through_the_spool(csv_jobs, tmp_path, job_options, workers):
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    pipeline = ConversionPipeline(readers=2, writers=2, queue_size=1, spool_dir=str(spool_dir),
+                                  executor=ConversionExecutor(max_workers=workers))
+    
+    results = list(pipeline.run("Documents", csv_jobs, job_options(format="json")))
+    
+    assert sorted(results) == sorted((i, o, None) for i, o in csv_jobs)
+    for index, (_, output_file) in enumerate(csv_jobs):
+        assert pd.read_json(output_file).to_dict('records') == [{'a': index, 'b': 'x'}]
+    # The spool is cleared once the batch is done
+    assert os.listdir(spool_dir) == []
+
+
+def test_pipeline_reports_unreadable_inputs(csv_jobs, tmp_path, job_options):
+    missing = str(tmp_path / "in" / "missing.csv")
+    jobs = csv_jobs[:2] + [(missing, str(tmp_path / "out" / "missing.json"))]
+    pipeline = ConversionPipeline(executor=ConversionExecutor(max_workers=1), spool_dir=str(tmp_path))
+    
+    errors = {i: error for i, _, error in pipeline.run("Documents", jobs, job_options(format="json"))}
+    
+    assert isinstance(errors[missing], FileNotFoundError)
+    assert errors[csv_jobs[0][0]] is None and errors[csv_jobs[1][0]] is None
+    assert sorted(os.listdir(tmp_path / "out")) == ["t0.json", "t1.json"]
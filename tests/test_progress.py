@@ -0,0 +1,101 @@
+from converter.ffmpeg import parse_out_time, parse_progress_block
+from converter import progress as progress_module
+from converter.progress import BatchProgress, format_duration, format_progress
+
+
+def test_parse_progress_block():
+    details = parse_progress_block({
+        'out_time_us': '12500000', 'out_time': '00:00:12.500000', 'frame': '300',
+        'total_size': '1024', 'speed': ' 2.5x', 'progress': 'continue',
+    })
+    
+    assert details == {'out_time': 12.5, 'frame': 300, 'total_size': 1024, 'speed': 2.5, 'done': False}
+
+
+def test_parse_progress_block_falls_back_to_out_time():
+    details = parse_progress_block({'out_time_us': 'N/A', 'out_time': '01:02:03.5', 'speed': 'N/A', 'progress': 'end'})
+    
+    assert details['out_time'] == 3723.5
+    assert details['speed'] is None
+    assert details['frame'] is None
+    assert details['done']
+    assert parse_out_time("garbage") is None
+
+
+def test_batch_progress_weights_files_by_size(tmp_path):
+    small = tmp_path / "small.wav"
+    large = tmp_path / "large.wav"
+    small.write_bytes(b"x" * 100)
+    large.write_bytes(b"x" * 300)
+    snapshots = []
+    progress = BatchProgress([str(small), str(large)], on_update=snapshots.append, update_interval=0)
+    
+    # The large file has not reported yet, so it is taken to weigh as much
+    # as the small one
+    progress.finish(str(small))
+    assert progress.snapshot()['fraction'] == 0.5
+    
+    progress.job_progress(str(large))(0.5, {'out_time': 30.0, 'speed': 1.5})
+    snapshot = progress.snapshot()
+    assert snapshot['fraction'] == 0.625
+    assert snapshot['ffmpeg_speed'] == 1.5
+    assert snapshot['eta'] > 0
+    
+    progress.finish(str(large), success=False)
+    snapshot = snapshots[-1]
+    assert (snapshot['completed'], snapshot['failed'], snapshot['total']) == (2, 1, 2)
+    assert snapshot['fraction'] == 1.0
+    assert snapshot['eta'] == 0.0
+    assert snapshot['ffmpeg_speed'] is None
+    assert format_progress(snapshot).startswith("100% | 2/2 files")
+
+
+def test_files_are_weighed_as_they_report(tmp_path, monkeypatch):
+    weighed = []
+    monkeypatch.setattr(progress_module, 'file_weight', lambda path: weighed.append(path) or 100)
+    paths = [str(tmp_path / f"{index}.wav") for index in range(1000)]
+    
+    progress = BatchProgress(paths)
+    assert weighed == []
+    
+    progress.update(paths[0], 0.5)
+    progress.finish(paths[0])
+    assert weighed == [paths[0]]
+    assert progress.snapshot()['fraction'] == 0.001
+    # Finished files are no longer tracked by path
+    assert not progress._weights and not progress._fractions
+
+
+def test_fraction_never_goes_backwards(tmp_path):
+    small = tmp_path / "small.wav"
+    large = tmp_path / "large.wav"
+    small.write_bytes(b"x" * 100)
+    large.write_bytes(b"x" * 900)
+    progress = BatchProgress([str(small), str(large)])
+    
+    progress.finish(str(small))
+    assert progress.snapshot()['fraction'] == 0.5
+    progress.update(str(large), 0.0)
+    assert progress.snapshot()['fraction'] == 0.5
+    progress.update(str(large), 0.5)
+    assert progress.snapshot()['fraction'] == 0.55
+
+
+def test_updates_are_throttled(tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"x")
+    snapshots = []
+    progress = BatchProgress([str(path)], on_update=snapshots.append, update_interval=60)
+    
+    for fraction in (0.1, 0.2, 0.3):
+        progress.update(str(path), fraction)
+    assert len(snapshots) == 1
+    progress.finish(str(path))
+    assert len(snapshots) == 2
+
+
+def test_format_duration():
+    assert format_duration(None) == "--"
+    assert format_duration(42) == "42s"
+    assert format_duration(125) == "2m05s"
+    assert format_duration(3720) == "1h02m"
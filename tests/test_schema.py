@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+import pytest
+
+from converter import engine, schema
+from converter.schema import SchemaCache, compact_frame, csv_dtypes, header_signature, infer_schema
+
+
+@pytest.fixture
+def schema_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "schemas.sqlite")
+    monkeypatch.setattr(schema, 'DEFAULT_SCHEMA_PATH', path)
+    return path
+
+
+def _write_csv(path, rows):
+    lines = ["id,city,note,score"]
+    for row in range(rows):
+        lines.append(f"{row},{['Oslo', 'Lima', 'Pune'][row % 3]},note {row},{row / 2}")
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_header_signature(tmp_path):
+    first = _write_csv(tmp_path / "first.csv", 3)
+    second = _write_csv(tmp_path / "second.csv", 10)
+    other = tmp_path / "other.csv"
+    other.write_text("a,b\n1,2\n")
+    empty = tmp_path / "empty.csv"
+    empty.write_text("\n")
+    
+    assert header_signature(first) == header_signature(second)
+    assert header_signature(first) != header_signature(first, 'latin-1')
+    assert header_signature(first) != header_signature(str(other))
+    assert header_signature(str(empty)) is None
+
+
+def test_only_text_columns_are_fixed(tmp_path):
+    sample = pd.read_csv(_write_csv(tmp_path / "t.csv", 30))
+    sample['blank'] = None
+    
+    assert infer_schema(sample) == {'city': 'category', 'note': 'str'}
+
+
+def test_compact_frame_keeps_values(tmp_path):
+    data = pd.read_csv(_write_csv(tmp_path / "t.csv", 30))
+    expected = data.copy()
+    
+    compact = compact_frame(data)
+    
+    assert str(compact['id'].dtype) == 'int8'
+    assert str(compact['city'].dtype) == 'category'
+    assert compact.to_csv(index=False) == expected.to_csv(index=False)
+
+
+def test_schemas_are_reused_by_header(tmp_path):
+    path = str(tmp_path / "schemas.sqlite")
+    first = _write_csv(tmp_path / "first.csv", 30)
+    with SchemaCache(path) as schemas:
+        key, dtypes = csv_dtypes(first, None, schemas)
+        assert dtypes == {'city': 'category', 'note': 'str'}
+    
+    # Later files with the same header reuse it without sampling
+    later = tmp_path / "later.csv"
+    later.write_text("id,city,note,score\n1,Oslo,x,2\n")
+    with SchemaCache(path) as schemas:
+        assert csv_dtypes(str(later), None, schemas) == (key, dtypes)
+        assert csv_dtypes(str(later), None, schemas, compact=False) == (key, {'city': 'str', 'note': 'str'})
+
+
+@pytest.mark.parametrize("format", ["csv", "json", "jsonl", "xlsx"])
+def test_schema_cache_does_not_change_output(schema_path, tmp_path, job_options, format):
+    source = _write_csv(tmp_path / "daily.csv", 200)
+    plain = engine.convert(source, str(tmp_path / f"plain.{format}"), job_options(format=format))
+    cached = engine.convert(source, str(tmp_path / f"cached.{format}"), job_options(format=format, schema_cache=True))
+    again = engine.convert(source, str(tmp_path / f"again.{format}"), job_options(format=format, schema_cache=True))
+    
+    if format == "xlsx":
+        for path in (cached, again):
+            pd.testing.assert_frame_equal(pd.read_excel(path), pd.read_excel(plain))
+    else:
+        with open(plain, 'rb') as a, open(cached, 'rb') as b, open(again, 'rb') as c:
+            assert a.read() == b.read() == c.read()
+
+
+def test_schema_cache_is_opt_in(schema_path, tmp_path, job_options):
+    source = _write_csv(tmp_path / "daily.csv", 5)
+    
+    engine.convert(source, str(tmp_path / "out.json"), job_options(format="json"))
+    assert not os.path.exists(schema_path)
+    engine.convert(source, str(tmp_path / "out.json"), job_options(format="json", schema_cache=True))
+    assert os.path.exists(schema_path)
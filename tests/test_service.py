@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from converter.service import ConversionService, HTTPError, Job, parse_address, parse_job_options, safe_filename
+
+
+async def _request(socket_path, method, target, body=b''):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    head = f"{method} {target} HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(body)}\r\n\r\n"
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload
+
+
+def _serve(tmp_path, scenario, **kwargs):
+    async def main():
+        service = ConversionService(work_dir=str(tmp_path / "work"), workers=1, **kwargs)
+        socket_path = str(tmp_path / "service.sock")
+        await service.start([('unix', socket_path)])
+        try:
+            return await scenario(service, socket_path)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_upload_convert_and_download(tmp_path, make_image):
+    with open(make_image(size=(40, 30)), 'rb') as f:
+        upload = f.read()
+    
+    async def scenario(service, socket_path):
+        status, payload = await _request(socket_path, "POST", "/jobs?format=jpg&filename=photo.png", upload)
+        assert status == 202
+        job_id = json.loads(payload)['id']
+        status, payload = await _request(socket_path, "GET", f"/jobs/{job_id}?wait=60")
+        assert json.loads(payload)['state'] == 'done'
+        assert json.loads(payload)['outputs'] == ["photo.jpg"]
+        status, result = await _request(socket_path, "GET", f"/jobs/{job_id}/result")
+        assert status == 200
+        assert (await _request(socket_path, "DELETE", f"/jobs/{job_id}"))[0] == 204
+        assert (await _request(socket_path, "GET", f"/jobs/{job_id}"))[0] == 404
+        return result
+    
+    result = _serve(tmp_path, scenario)
+    output_file = tmp_path / "result.jpg"
+    output_file.write_bytes(result)
+    with Image.open(output_file) as img:
+        assert (img.format, img.size) == ("JPEG", (40, 30))
+
+
+def test_bad_requests(tmp_path):
+    async def scenario(service, socket_path):
+        assert (await _request(socket_path, "POST", "/jobs?filename=a.png", b"x"))[0] == 400
+        assert (await _request(socket_path, "POST", "/jobs?format=png", b"x"))[0] == 400
+        assert (await _request(socket_path, "GET", "/nowhere"))[0] == 404
+        status, payload = await _request(socket_path, "GET", "/health")
+        assert status == 200 and json.loads(payload)['status'] == 'ok'
+    
+    _serve(tmp_path, scenario)
+
+
+def test_jobs_survive_a_dead_worker_pool(tmp_path, make_image):
+    image = make_image()
+    
+    async def scenario(service, socket_path):
+        # A worker process that dies breaks the whole pool
+        broken = service.pool
+        with pytest.raises(BrokenProcessPool):
+            await asyncio.wrap_future(broken.submit(os._exit, 1))
+        
+        job_dir = tmp_path / "job"
+        job_dir.mkdir()
+        job = Job("job", str(job_dir), image, {'format': 'jpg'})
+        service.submit(job)
+        await asyncio.wait_for(job.done.wait(), 60)
+        assert (job.state, job.error) == ('done', None)
+        assert service.pool is not broken
+    
+    _serve(tmp_path, scenario)
+
+
+def test_parse_job_options():
+    query = {'format': ['png'], 'quality': ['70'], 'resize': ['20x10'], 'fast_path': ['no']}
+    
+    assert parse_job_options(query) == {'format': 'png', 'quality': 70, 'resize': True,
+                                        'dimensions': (20, 10), 'fast_path': False}
+    for bad in [{}, {'format': ['png'], 'quality': ['high']}, {'format': ['png'], 'resize': ['big']},
+                {'format': ['png'], 'category': ['Spreadsheets']}]:
+        with pytest.raises(HTTPError):
+            parse_job_options(bad)
+
+
+def test_addresses_and_filenames():
+    assert parse_address("unix:/run/converter.sock") == ('unix', "/run/converter.sock")
+    assert parse_address(":9000") == ('tcp', "127.0.0.1", 9000)
+    assert parse_address("0.0.0.0:80") == ('tcp', "0.0.0.0", 80)
+    with pytest.raises(ValueError):
+        parse_address("localhost:http")
+    assert safe_filename("../../etc/pass wd.csv") == "pass_wd.csv"
+    assert safe_filename("C:\\Users\\.hidden") == "hidden"
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from converter import engine
+from converter.streaming import can_stream, stream_document
+
+
+@pytest.fixture
+def drifting_csv(tmp_path):
+    # Columns whose types only settle late in the file: an integer column
+    # with a gap at row 3500 and one that turns from numbers to text
+    lines = ["id,score,code,name"]
+    for row in range(5000):
+        score = "" if row == 3500 else str(row * 3)
+        code = f"C{row}" if row >= 4200 else str(row)
+        lines.append(f"{row},{score},{code},name {row % 7}")
+    path = tmp_path / "drift.csv"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def _convert(input_file, output_file, options, **overrides):
+    return engine.convert(input_file, output_file, options(**overrides))
+
+
+@pytest.mark.parametrize("format", ["csv", "json", "jsonl", "txt"])
+def test_streamed_text_output_matches_whole_file(drifting_csv, tmp_path, job_options, format):
+    whole = _convert(drifting_csv, str(tmp_path / f"whole.{format}"), job_options, format=format)
+    streamed = _convert(drifting_csv, str(tmp_path / f"streamed.{format}"), job_options, format=format, chunk_size=1000)
+    
+    with open(whole, 'rb') as a, open(streamed, 'rb') as b:
+        expected, actual = a.read(), b.read()
+    if format == "txt":
+        # Column widths are computed per chunk, so only the values are compared
+        expected, actual = expected.split(), actual.split()
+    assert actual == expected
+
+
+@pytest.mark.parametrize("format", ["parquet", "xlsx"])
+def test_streamed_table_output_matches_whole_file(drifting_csv, tmp_path, job_options, format):
+    whole = _convert(drifting_csv, str(tmp_path / f"whole.{format}"), job_options, format=format)
+    streamed = _convert(drifting_csv, str(tmp_path / f"streamed.{format}"), job_options, format=format, chunk_size=1000)
+    
+    read = pd.read_parquet if format == "parquet" else pd.read_excel
+    pd.testing.assert_frame_equal(read(streamed), read(whole))
+
+
+def test_streamed_json_input_matches_whole_file(tmp_path, job_options):
+    source = tmp_path / "records.jsonl"
+    source.write_text("".join(
+        f'{{"id": {row}, "extra": {row}}}\n' if row % 3 == 0 else f'{{"id": {row}}}\n'
+        for row in range(2500)
+    ))
+    whole = _convert(str(source), str(tmp_path / "whole.csv"), job_options, format="csv")
+    streamed = _convert(str(source), str(tmp_path / "streamed.csv"), job_options, format="csv", chunk_size=400)
+    
+    with open(whole) as a, open(streamed) as b:
+        assert b.read() == a.read()
+
+
+def test_can_stream():
+    assert can_stream("a.csv", "parquet")
+    assert can_stream("a.txt", "csv")
+    assert not can_stream("a.txt", "json")
+    assert not can_stream("a.xlsx", "csv")
+
+
+@pytest.mark.parametrize("format", ["parquet", "csv"])
+def test_input_errors_are_not_hidden_by_the_writer(tmp_path, format):
+    corrupt = tmp_path / "corrupt.feather"
+    corrupt.write_bytes(b"ARROW1")
+    
+    with pytest.raises(Exception) as info:
+        stream_document(str(corrupt), str(tmp_path / f"out.{format}"), format, None, True, chunk_size=10)
+    
+    assert "without columns" not in str(info.value)
+    assert type(info.value).__name__ == "ArrowInvalid"
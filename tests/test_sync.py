@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from converter.executor import ConversionExecutor
+from converter.sync import DirectorySync
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / "src"
+    (source / "nested").mkdir(parents=True)
+    (source / "a.csv").write_text("x\n1\n")
+    (source / "nested" / "b.csv").write_text("x\n2\n")
+    (source / "notes.md").write_text("skipped")
+    return source
+
+
+def _sync(source_dir, tmp_path, job_options, **options):
+    return DirectorySync(str(source_dir), str(tmp_path / "out"), "Documents", job_options(**options),
+                         ConversionExecutor(max_workers=1), prune=True, settle=0)
+
+
+def _counts(summary):
+    return {name: count for name, count in summary.items() if count}
+
+
+def test_only_changed_files_are_converted(source_dir, tmp_path, job_options):
+    sync = _sync(source_dir, tmp_path, job_options, format="json")
+    
+    assert _counts(sync.run()) == {'converted': 2}
+    assert os.path.exists(tmp_path / "out" / "nested" / "b.json")
+    assert _counts(sync.run()) == {'unchanged': 2}
+    
+    # A new mtime with the same content is settled by the hash
+    stat = os.stat(source_dir / "a.csv")
+    os.utime(source_dir / "a.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    assert _counts(sync.run()) == {'unchanged': 2}
+    
+    (source_dir / "a.csv").write_text("x\n3\n")
+    assert _counts(sync.run()) == {'converted': 1, 'unchanged': 1}
+    assert (tmp_path / "out" / "a.json").read_text() == '[{"x":3}]'
+    sync.close()
+
+
+def test_deleted_sources_are_pruned(source_dir, tmp_path, job_options):
+    sync = _sync(source_dir, tmp_path, job_options, format="json")
+    sync.run()
+    
+    os.remove(source_dir / "nested" / "b.csv")
+    assert _counts(sync.run()) == {'unchanged': 1, 'deleted': 1, 'pruned': 1}
+    assert not os.path.exists(tmp_path / "out" / "nested")
+    sync.close()
+
+
+def test_missing_outputs_and_new_options_reconvert(source_dir, tmp_path, job_options):
+    sync = _sync(source_dir, tmp_path, job_options, format="json")
+    sync.run()
+    os.remove(tmp_path / "out" / "a.json")
+    assert _counts(sync.run()) == {'converted': 1, 'unchanged': 1}
+    sync.close()
+    
+    sync = _sync(source_dir, tmp_path, job_options, format="json", headers=False)
+    assert _counts(sync.run()) == {'converted': 2}
+    sync.close()
+
+
+def test_recently_modified_files_wait(source_dir, tmp_path, job_options):
+    sync = DirectorySync(str(source_dir), str(tmp_path / "out"), "Documents", job_options(format="json"),
+                         ConversionExecutor(max_workers=1), settle=3600)
+    
+    assert _counts(sync.run()) == {'waiting': 2}
+    sync.close()
+
+
+class EditingRunner:
+    # Rewrites a.csv with same-size content while its conversion runs
+    def __init__(self, runner, path):
+        self.runner = runner
+        self.path = path
+    
+    def run(self, category, jobs, options, progress=None):
+        for input_file, output, error in self.runner.run(category, jobs, options, progress):
+            if input_file == str(self.path):
+                stat = os.stat(self.path)
+                self.path.write_text("x\n9\n")
+                os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+            yield input_file, output, error
+
+
+def test_files_edited_during_conversion_are_converted_again(source_dir, tmp_path, job_options):
+    sync = _sync(source_dir, tmp_path, job_options, format="json")
+    runner = sync.runner
+    sync.runner = EditingRunner(runner, source_dir / "a.csv")
+    
+    assert _counts(sync.run()) == {'converted': 2}
+    sync.runner = runner
+    assert _counts(sync.run()) == {'converted': 1, 'unchanged': 1}
+    assert (tmp_path / "out" / "a.json").read_text() == '[{"x":9}]'
+    sync.close()
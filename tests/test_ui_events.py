@@ -0,0 +1,91 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+file_converter = pytest.importorskip("file_converter")
+UIEventBus = file_converter.UIEventBus
+
+
+class FakeRoot:
+    # Records after() callbacks instead of running a Tk main loop
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, interval, callback):
+        self.scheduled.append(callback)
+
+    def tick(self):
+        self.scheduled.pop(0)()
+
+
+def test_events_are_applied_in_order_on_the_tick():
+    root = FakeRoot()
+    bus = UIEventBus(root)
+    applied = []
+    
+    bus.post(applied.append, "status")
+    for percent in range(100):
+        bus.post_latest('progress', applied.append, percent)
+    bus.post(applied.append, "done")
+    assert applied == []
+    
+    root.tick()
+    assert applied == ["status", 99, "done"]
+    # The next tick is always scheduled
+    assert len(root.scheduled) == 1
+
+
+def test_posts_from_many_threads_coalesce():
+    root = FakeRoot()
+    bus = UIEventBus(root)
+    applied = []
+    
+    def worker(index):
+        for percent in range(1000):
+            bus.post_latest('progress', applied.append, (index, percent))
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    root.tick()
+    
+    assert len(applied) == 1 and applied[0][1] == 999
+
+
+def test_a_failing_handler_does_not_stop_the_tick():
+    root = FakeRoot()
+    bus = UIEventBus(root)
+    applied = []
+    
+    bus.post(lambda: 1 / 0)
+    bus.post(applied.append, "after")
+    root.tick()
+    
+    assert applied == ["after"]
+    assert len(root.scheduled) == 1
+
+
+def test_failed_batch_is_reported_to_the_window(monkeypatch):
+    root = FakeRoot()
+    shown = []
+    monkeypatch.setattr(file_converter.messagebox, 'showerror', lambda *args: shown.append(args))
+    progress = []
+    status = []
+    
+    def broken_batch(*args):
+        raise RuntimeError("journal is locked")
+    app = SimpleNamespace(
+        events=UIEventBus(root),
+        progress_var=SimpleNamespace(set=progress.append),
+        status_label=SimpleNamespace(config=lambda options: status.append(options['text'])),
+        _convert_batch=broken_batch,
+    )
+    
+    file_converter.ModernFileConverterApp._convert_files_thread(app, "Images", [], "out", {}, 1)
+    root.tick()
+    
+    assert progress == [0]
+    assert status == ["Conversion failed: RuntimeError: journal is locked"]
+    assert shown == [("Conversion Failed", "RuntimeError: journal is locked")]
@@ -0,0 +1,160 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from converter.workqueue import JobQueue, QueueRunner, QueueWorker, RemoteJobError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"))
+    yield queue
+    queue.close()
+
+
+def _jobs(tmp_path, count):
+    return [(str(tmp_path / f"in{index}.csv"), str(tmp_path / f"in{index}.json")) for index in range(count)]
+
+
+def test_jobs_are_leased_once_in_order(queue, tmp_path):
+    batch_id = queue.submit("Documents", _jobs(tmp_path, 2), {'format': 'json'})
+    
+    first = queue.lease("a")
+    second = queue.lease("b")
+    
+    assert (first['seq'], first['attempt'], first['options']) == (0, 1, {'format': 'json'})
+    assert second['seq'] == 1
+    assert queue.lease("c") is None
+    assert queue.counts(batch_id)['leased'] == 2
+
+
+def test_expired_lease_goes_to_another_worker(queue, tmp_path):
+    batch_id = queue.submit("Documents", _jobs(tmp_path, 1), {})
+    stale = queue.lease("a", lease_seconds=-1)
+    
+    job = queue.lease("b")
+    
+    assert (job['seq'], job['attempt']) == (stale['seq'], 2)
+    assert queue.renew("a", {(batch_id, 0): 0.5}) == {(batch_id, 0)}
+    assert queue.renew("b", {(batch_id, 0): 0.5}) == set()
+    assert queue.running(batch_id) == [(0, 0.5)]
+    # The first worker's late result is discarded
+    assert not queue.complete("a", batch_id, 0, error="too late")
+    assert queue.complete("b", batch_id, 0, outputs=["out.json"])
+    assert queue.results(batch_id) == [(1, 0, *_jobs(tmp_path, 1)[0], ["out.json"], None)]
+
+
+def test_jobs_fail_after_their_last_attempt(queue, tmp_path):
+    batch_id = queue.submit("Documents", _jobs(tmp_path, 1), {}, max_attempts=2)
+    queue.lease("a", lease_seconds=-1)
+    queue.lease("b", lease_seconds=-1)
+    
+    assert queue.lease("c") is None
+    [(_, _, _, _, outputs, error)] = queue.results(batch_id)
+    assert outputs is None
+    assert error.startswith("LeaseExpired: no result after 2 attempts; last worker b")
+
+
+def test_released_jobs_keep_their_attempts(queue, tmp_path):
+    batch_id = queue.submit("Documents", _jobs(tmp_path, 1), {})
+    queue.lease("a")
+    queue.release("a", [(batch_id, 0)])
+    
+    assert queue.lease("b")['attempt'] == 1
+
+
+def test_leases_are_limited_to_categories(queue, tmp_path):
+    queue.submit("Audio", [(str(tmp_path / "a.wav"), str(tmp_path / "a.mp3"))], {})
+    queue.submit("Documents", _jobs(tmp_path, 1), {})
+    
+    assert queue.lease("a", ["Images", "Documents"])['category'] == "Documents"
+    assert queue.lease("a", ["Images"]) is None
+    [audio, documents] = sorted(queue.batches(), key=lambda batch: batch['category'])
+    assert (audio['queued'], documents['leased'], documents['workers']) == (1, 1, ["a"])
+
+
+def test_worker_converts_a_submitted_batch(tmp_path):
+    jobs = _jobs(tmp_path, 3)
+    for index, (input_file, _) in enumerate(jobs[:2]):
+        with open(input_file, 'w') as f:
+            f.write(f"a\n{index}\n")
+    # Submitter and worker open the queue file separately, as on two hosts
+    submitter = JobQueue(str(tmp_path / "queue.sqlite"))
+    batch_id = submitter.submit("Documents", jobs, {'format': 'json'}, max_attempts=1)
+    
+    worker_queue = JobQueue(str(tmp_path / "queue.sqlite"))
+    finished = []
+    worker = QueueWorker(worker_queue, worker_id="w", workers=1, categories=["Documents"], poll_interval=0.05,
+                         on_result=lambda job, outputs, error: finished.append(job['seq']))
+    worker.run(exit_when_idle=True)
+    worker_queue.close()
+    
+    results = list(QueueRunner(submitter, poll_interval=0.05).collect(batch_id, jobs))
+    submitter.close()
+    
+    assert sorted(finished) == [0, 1, 2]
+    errors = {input_file: error for input_file, _, error in results}
+    assert errors[jobs[0][0]] is None and errors[jobs[1][0]] is None
+    assert isinstance(errors[jobs[2][0]], RemoteJobError)
+    with open(jobs[1][1]) as f:
+        assert json.load(f) == [{'a': 1}]
+
+
+def test_retried_jobs_fail_after_their_last_attempt(queue, tmp_path):
+    batch_id = queue.submit("Documents", _jobs(tmp_path, 1), {}, max_attempts=2)
+    queue.lease("a")
+    
+    assert queue.retry("a", batch_id, 0, "BrokenProcessPool: crashed")
+    assert not queue.retry("a", batch_id, 0, "BrokenProcessPool: crashed")
+    assert queue.lease("b")['attempt'] == 2
+    assert queue.retry("b", batch_id, 0, "BrokenProcessPool: crashed")
+    assert queue.lease("c") is None
+    [(_, _, _, _, _, error)] = queue.results(batch_id)
+    assert error == "BrokenProcessPool: crashed"
+
+
+def _crashing_worker(queue, crashes):
+    # A worker whose pool process for seq 0 dies abruptly on its first
+    # crashes attempts, as if it were OOM-killed
+    worker = QueueWorker(queue, worker_id="w", workers=1, categories=["Documents"], poll_interval=0.05)
+    submit = worker._submit
+    
+    def crashing_submit(job):
+        if job['seq'] == 0 and job['attempt'] <= crashes:
+            if worker.pool is None:
+                worker.pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            crash = worker.pool.submit(os._exit, 1)
+            worker._pools[crash] = worker.pool
+            return crash
+        return submit(job)
+    
+    worker._submit = crashing_submit
+    return worker
+
+
+def _write_inputs(jobs):
+    for index, (input_file, _) in enumerate(jobs):
+        with open(input_file, 'w') as f:
+            f.write(f"a\n{index}\n")
+
+
+@pytest.mark.parametrize("crashes, failed", [(1, 0), (3, 1)])
+def test_worker_survives_a_crashed_pool(queue, tmp_path, crashes, failed):
+    jobs = _jobs(tmp_path, 4)
+    _write_inputs(jobs)
+    batch_id = queue.submit("Documents", jobs, {'format': 'json'})
+    
+    _crashing_worker(queue, crashes).run(exit_when_idle=True)
+    
+    counts = queue.counts(batch_id)
+    assert (counts['done'], counts['failed']) == (4 - failed, failed)
+    errors = {seq: error for _, seq, _, _, _, error in queue.results(batch_id)}
+    # Only the job that crashed every time fails; the rest run on a new pool
+    assert all(errors[seq] is None for seq in range(1, 4))
+    if failed:
+        assert errors[0].startswith("BrokenProcessPool")
+    for _, output_file in jobs[1:]:
+        assert os.path.exists(output_file)